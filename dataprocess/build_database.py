@@ -0,0 +1,543 @@
+"""
+Build static/database.parquet, the table the atlas loads into DuckDB.
+
+Scripted version of dataProcess-oneScenario.ipynb: the same transforms, without the display cells,
+for any number of scenarios. The SEF table and LAD mapping are prepared once; scenarios are built
+in parallel worker processes.
+
+Inputs:
+- scenario CSVs: one row per LSOA/DZ and co-benefit (Lookup.Value, Coben, 2025..2050, Sum), £m per year
+- SEF CSV: socio-economic factors per LSOA/DZ (LSOA.DZ.CD, LSOA.DZ.NM, HH, Population, ...)
+- LAD lookups: static/LAD/Eng_Wales_LSOA_LADs.csv, NI_DZ_LAD.csv, Scotland_DZ_LA.csv
+
+Outputs:
+- a parquet dataset partitioned by scenario (staticNotDeployed/database/scenario=<name>/part-0.parquet);
+  a build replaces the partitions of the scenarios it is given and removes the others, unless
+  --keep-other-scenarios is set
+- database.parquet: every partition of the dataset in one file, with the scenario column, for the app:
+  scenario rows joined to their SEF row, with LAD, Nation, total and 5-year window sums
+- optionally the NI-only development subset (database_onlyIreland.parquet)
+- rollups/*.parquet: pre-aggregated tables of database.parquet for the overview pages (see build_rollups.py)
+
+Usage:
+  python dataprocess/build_database.py --scenario data/Final_hassle_fix.csv --sef data/sef.csv
+  python dataprocess/build_database.py --scenario BNZ=data/bnz.csv --scenario Tailwinds=data/tailwinds.csv \\
+      --sef data/sef.csv --ni-out static/database_onlyIreland.parquet
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from build_rollups import DEFAULT_ROLLUPS_DIR, DEFAULT_SEF_DEFINITIONS, write_rollups
+
+LAD_DIR = os.path.join("static", "LAD")
+DEFAULT_LAD_ENG_WALES = os.path.join(LAD_DIR, "Eng_Wales_LSOA_LADs.csv")
+DEFAULT_LAD_NI = os.path.join(LAD_DIR, "NI_DZ_LAD.csv")
+DEFAULT_LAD_SCOTLAND = os.path.join(LAD_DIR, "Scotland_DZ_LA.csv")
+DEFAULT_OUT = os.path.join("static", "database.parquet")
+DEFAULT_DATASET = os.path.join("staticNotDeployed", "database")
+
+# Partition layout of the dataset: <dataset>/scenario=<name>/part-0.parquet, the scenario column left out.
+PARTITION_KEY = "scenario"
+PARTITION_FILE = "part-0.parquet"
+# Rows per batch when streaming the partitions into database.parquet.
+COMBINE_BATCH_ROWS = 262_144
+
+# The app's queries filter on this scenario name; used for a single unnamed --scenario.
+DEFAULT_SCENARIO_NAME = "BNZ"
+
+YEARS: Tuple[int, ...] = tuple(range(2025, 2051))
+YEAR_COLUMNS: Tuple[str, ...] = tuple(str(y) for y in YEARS)
+# Summed windows replacing the per-year columns; the last one also takes 2050.
+TIME_WINDOWS: Tuple[Tuple[int, int], ...] = ((2025, 2029), (2030, 2034), (2035, 2039), (2040, 2044), (2045, 2050))
+WINDOW_COLUMNS: Tuple[str, ...] = tuple(f"Y{first}_{last}" for first, last in TIME_WINDOWS)
+
+# Scenario CSV rows reduced at a time; bounds the ingest's peak memory.
+SCENARIO_CHUNK_ROWS = 100_000
+# Bytes of the scenario CSV the reader parses per batch; batches are gathered into chunks of SCENARIO_CHUNK_ROWS.
+SCENARIO_BLOCK_BYTES = 4 << 20
+# Name of the co-benefit column in the scenario CSV, depending on the model drop.
+CO_BENEFIT_COLUMNS: Tuple[str, ...] = ("Coben", "co_benefit_type")
+
+# Spreadsheet error value some model drops contain.
+DIV0 = "#DIV/0!"
+# pandas' default NA strings, which the notebook's read_csv parsed as missing.
+NA_VALUES: Tuple[str, ...] = (
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+)
+
+# LSOA/DZ code prefix -> Nation.
+NATIONS: Dict[str, str] = {"E": "England", "W": "Wales", "N": "NI", "S": "Scotland"}
+
+# SEF columns with stray text codes ('d', 'e', 'Y') among their numbers; those become NA.
+SEF_CODED_COLUMNS: Tuple[str, ...] = ("EPC", "Gas_flag")
+
+CO_BENEFIT_RENAMES: Dict[str, str] = {"Hassle costs": "Longer travel times"}
+
+
+@contextmanager
+def step(name: str) -> Iterator[None]:
+    started = time.monotonic()
+    yield
+    print(f"[build] {name}: {time.monotonic() - started:.2f}s", file=sys.stderr)
+
+
+def clean_column_names(columns: pd.Index) -> pd.Index:
+    """
+    'Lookup.Value' -> 'Lookup_Value', '2025 (£m)' -> '2025'; DuckDB queries use the bare names.
+    """
+    return columns.str.replace(" (£m)", "", regex=False).str.replace(" ", "_", regex=False).str.replace(".", "_", regex=False)
+
+
+def load_sef(path: str) -> pd.DataFrame:
+    """
+    Reads the SEF CSV: drops the spreadsheet's empty trailing columns and incomplete rows, and types EPC/Gas_flag as Int16.
+    """
+    df = pd.read_csv(path, low_memory=False)  # EPC/Gas_flag mix numbers and codes
+    df = df.drop(columns=[c for c in df.columns if c.startswith("Unnamed:")])
+    df = df.dropna().convert_dtypes()
+    df.columns = clean_column_names(df.columns)
+    for col in SEF_CODED_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int16")
+    return df
+
+
+def load_lad_index(eng_wales_path: str, ni_path: str, scotland_path: str) -> pd.Series:
+    """
+    One code -> LAD code index over LSOA11 and LSOA21 (England/Wales), DZ2021 (NI) and DZ2011 (Scotland) codes.
+
+    A code listed twice in one file keeps its last row (a few LSOA11s split across LADs); across
+    files the earlier source wins, so LSOA 2011 codes take precedence over 2021 ones.
+    """
+    eng = pd.read_csv(eng_wales_path, usecols=["LSOA11CD", "LSOA21CD", "LAD22CD"], dtype=str)
+    ni = pd.read_csv(ni_path, usecols=["DZ2021_code", "LGD2014_code"], dtype=str)
+    sco = pd.read_csv(scotland_path, usecols=["DZ2011_Code", "LA_Code"], dtype=str, encoding="latin1")
+    sources = (
+        (eng, "LSOA11CD", "LAD22CD"),
+        (eng, "LSOA21CD", "LAD22CD"),
+        (ni, "DZ2021_code", "LGD2014_code"),
+        (sco, "DZ2011_Code", "LA_Code"),
+    )
+    parts = []
+    for df, code, lad in sources:
+        df = df.dropna(subset=[code, lad]).drop_duplicates(subset=[code], keep="last")
+        parts.append(pd.Series(df[lad].to_numpy(), index=df[code].to_numpy()))
+    index = pd.concat(parts)
+    return index[~index.index.duplicated(keep="first")]
+
+
+def attach_lad(df_socio: pd.DataFrame, lad_index: pd.Series) -> pd.DataFrame:
+    """
+    Sets LAD (looked up in `lad_index`) and Nation (from the code prefix) on the SEF table. Like the notebook,
+    a code without a match keeps the SEF CSV's own LAD/Nation value if it has one, and is NA otherwise.
+    """
+    codes = df_socio["LSOA_DZ_CD"]
+    for col, values in (("LAD", codes.map(lad_index)), ("Nation", codes.str[:1].map(NATIONS))):
+        df_socio[col] = values.fillna(df_socio[col]) if col in df_socio.columns else values
+    return df_socio
+
+
+def report_unmatched(df_socio: pd.DataFrame, path: Optional[str] = None, *, sample: int = 10) -> int:
+    """
+    Logs the SEF codes attach_lad() found no LAD for, per nation, and optionally writes them all to a CSV.
+    """
+    unmatched = df_socio.loc[df_socio["LAD"].isna(), ["LSOA_DZ_CD", "LSOA_DZ_NM", "Nation"]]
+    if path:
+        unmatched.to_csv(path, index=False)
+    if len(unmatched):
+        by_nation = ", ".join(f"{nation}: {n}" for nation, n in unmatched["Nation"].fillna("unknown prefix").value_counts().items())
+        codes = ", ".join(unmatched["LSOA_DZ_CD"].head(sample))
+        more = " ..." if len(unmatched) > sample else ""
+        print(f"[build] {len(unmatched)} SEF codes without a LAD ({by_nation}): {codes}{more}", file=sys.stderr)
+    return len(unmatched)
+
+
+def scenario_schema(path: str) -> Tuple[Dict[str, str], Dict[str, pa.DataType]]:
+    """
+    Raw -> clean names and read types for the scenario CSV columns the build uses: Lookup_Value and
+    co_benefit_type dictionary-encoded, the years (and Sum, only checked for DIV0) as strings.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    raw = dict(zip(clean_column_names(header), header))
+    co_benefit = next((c for c in CO_BENEFIT_COLUMNS if c in raw), None)
+    missing = [c for c in ("Lookup_Value", *YEAR_COLUMNS) if c not in raw] + ([] if co_benefit else ["Coben"])
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+    names = {raw["Lookup_Value"]: "Lookup_Value", raw[co_benefit]: "co_benefit_type"}
+    types: Dict[str, pa.DataType] = {raw["Lookup_Value"]: pa.dictionary(pa.int32(), pa.string())}
+    types[raw[co_benefit]] = pa.dictionary(pa.int32(), pa.string())
+    for col in (*YEAR_COLUMNS, "Sum"):
+        if col in raw:
+            names[raw[col]] = col
+            types[raw[col]] = pa.string()
+    return names, types
+
+
+def read_scenario_chunks(path: str, types: Dict[str, pa.DataType], *, chunk_rows: int = SCENARIO_CHUNK_ROWS) -> Iterator[pa.Table]:
+    """
+    Streams the columns of `types` from a scenario CSV in tables of at least `chunk_rows` rows (the last
+    one shorter), with NA_VALUES read as null.
+    """
+    convert = pacsv.ConvertOptions(
+        include_columns=list(types), column_types=types, null_values=list(NA_VALUES), strings_can_be_null=True
+    )
+    batches: List[pa.RecordBatch] = []
+    rows = 0
+    with pacsv.open_csv(path, read_options=pacsv.ReadOptions(block_size=SCENARIO_BLOCK_BYTES), convert_options=convert) as reader:
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_rows:
+                yield pa.Table.from_batches(batches)
+                batches, rows = [], 0
+    if batches:
+        yield pa.Table.from_batches(batches)
+
+
+def reduce_scenario_chunk(chunk: pa.Table) -> Tuple[pd.DataFrame, int, int]:
+    """
+    Drops the rows holding DIV0 in any column and replaces the years (and Sum, which is the same as total)
+    with total and the TIME_WINDOWS sums. Blank year cells count as 0, as in the notebook's float sums.
+
+    Returns the reduced chunk, the rows dropped for DIV0 and the rows kept with a blank year cell.
+    """
+    div0 = None
+    for col in chunk.column_names:
+        values = chunk[col].cast(pa.string()) if pa.types.is_dictionary(chunk.schema.field(col).type) else chunk[col]
+        mask = pc.fill_null(pc.equal(values, DIV0), False)
+        div0 = mask if div0 is None else pc.or_(div0, mask)
+    kept = chunk.filter(pc.invert(div0))
+    # Through float64 like pandas' parser, so the float32 values round the same way.
+    years = pa.table({c: kept[c].cast(pa.float64()).cast(pa.float32()) for c in YEAR_COLUMNS}).to_pandas()
+    out = kept.select(["Lookup_Value", "co_benefit_type"]).to_pandas()
+    out["total"] = years.sum(axis=1)
+    for (first, last), col in zip(TIME_WINDOWS, WINDOW_COLUMNS):
+        out[col] = years[[str(y) for y in range(first, last + 1)]].sum(axis=1)
+    return out, len(chunk) - len(kept), int(years.isna().any(axis=1).sum())
+
+
+def concat_categorical(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    pd.concat that keeps categorical columns categorical; it falls back to object when the frames' categories differ.
+    """
+    for col in frames[0].select_dtypes("category").columns:
+        categories = union_categoricals([f[col] for f in frames]).categories
+        for f in frames:
+            f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_scenario(path: str, scenario_name: str = DEFAULT_SCENARIO_NAME, *, chunk_rows: int = SCENARIO_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Reads a scenario CSV in chunks of `chunk_rows`, reducing each (see reduce_scenario_chunk) before concatenating.
+
+    Returns Lookup_Value, co_benefit_type, scenario (categoricals), total and the window sums (float32).
+    """
+    names, types = scenario_schema(path)
+    chunks = []
+    dropped = blank = 0
+    for chunk in read_scenario_chunks(path, types, chunk_rows=chunk_rows):
+        reduced, chunk_dropped, chunk_blank = reduce_scenario_chunk(chunk.rename_columns([names[c] for c in chunk.column_names]))
+        chunks.append(reduced)
+        dropped += chunk_dropped
+        blank += chunk_blank
+    if not chunks:
+        raise ValueError(f"{path}: no rows")
+    if dropped or blank:
+        print(f"[build] {path}: dropped {dropped} rows holding {DIV0}; {blank} rows with blank years summed as 0", file=sys.stderr)
+    df = concat_categorical(chunks)
+    df.insert(2, "scenario", pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[scenario_name]))
+    return df
+
+
+def rename_values(s: pd.Series, mapping: Dict[str, str]) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.rename_categories(lambda c: mapping.get(c, c))
+    return s.replace(mapping)
+
+
+def downcast_ints(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    64-bit integer columns to 32-bit (INTEGER rather than BIGINT in DuckDB); halves their size in the browser.
+
+    The notebook's select_dtypes(np.int64) also matches the nullable Int64 SEF columns, so it turns them into
+    int32 as well. Here an Int64 column becomes nullable Int32, so a column holding NA (a scenario code without
+    a SEF row, on which the notebook's cast fails) stays nullable.
+    """
+    for col in df.columns:
+        dtype = df[col].dtype
+        if dtype == np.int64:
+            df[col] = df[col].astype(np.int32)
+        elif dtype == "Int64":
+            df[col] = df[col].astype("Int32")
+    return df
+
+
+def build_database(df: pd.DataFrame, df_socio: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins a loaded scenario to the SEF table (with LAD) and applies the app-facing transforms.
+    """
+    # Giving the SEF codes the scenario's categories joins on category codes and keeps Lookup_Value categorical.
+    keys = df["Lookup_Value"].cat.categories
+    socio = df_socio[df_socio["LSOA_DZ_CD"].isin(keys)]
+    socio = socio.assign(LSOA_DZ_CD=pd.Categorical(socio["LSOA_DZ_CD"], categories=keys))
+    df = df.merge(socio, left_on="Lookup_Value", right_on="LSOA_DZ_CD", how="left")
+    df = df[[c for c in df.columns if c not in WINDOW_COLUMNS] + list(WINDOW_COLUMNS)]
+    df = downcast_ints(df)
+    df["co_benefit_type"] = rename_values(df["co_benefit_type"], CO_BENEFIT_RENAMES)
+    return df
+
+
+def write_parquet(df: pd.DataFrame, path: str) -> None:
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = f"{path}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+_worker_socio: Optional[pd.DataFrame] = None
+
+
+def _init_worker(df_socio: pd.DataFrame) -> None:
+    # Each pool worker receives the prepared SEF table once, not once per scenario.
+    global _worker_socio
+    _worker_socio = df_socio
+
+
+def partition_path(dataset: str, scenario_name: str) -> str:
+    return os.path.join(dataset, f"{PARTITION_KEY}={quote(scenario_name, safe='')}", PARTITION_FILE)
+
+
+def build_scenario(
+    path: str,
+    scenario_name: str,
+    dataset: str,
+    *,
+    chunk_rows: int = SCENARIO_CHUNK_ROWS,
+    df_socio: Optional[pd.DataFrame] = None,
+) -> Tuple[str, int, float]:
+    """
+    Builds one scenario and writes it as its dataset partition. Returns (name, rows, seconds).
+
+    Without `df_socio` the table handed to the pool worker is used.
+    """
+    started = time.monotonic()
+    df_socio = _worker_socio if df_socio is None else df_socio
+    assert df_socio is not None
+    df = build_database(load_scenario(path, scenario_name, chunk_rows=chunk_rows), df_socio)
+    write_parquet(df.drop(columns=[PARTITION_KEY]), partition_path(dataset, scenario_name))
+    return scenario_name, len(df), time.monotonic() - started
+
+
+def build_scenarios(
+    scenarios: List[Tuple[str, str]],
+    df_socio: pd.DataFrame,
+    dataset: str,
+    *,
+    jobs: int,
+    chunk_rows: int = SCENARIO_CHUNK_ROWS,
+) -> Iterator[Tuple[str, int, float]]:
+    """
+    build_scenario() for each (name, path), on up to `jobs` worker processes; yields results as scenarios finish.
+    """
+    if jobs <= 1 or len(scenarios) <= 1:
+        for name, path in scenarios:
+            yield build_scenario(path, name, dataset, chunk_rows=chunk_rows, df_socio=df_socio)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(df_socio,)) as pool:
+        futures = [pool.submit(build_scenario, path, name, dataset, chunk_rows=chunk_rows) for name, path in scenarios]
+        for fut in as_completed(futures):
+            yield fut.result()
+
+
+def dataset_partitions(dataset: str) -> List[Tuple[str, str]]:
+    """
+    (scenario, file) for every partition in the dataset, by scenario name.
+    """
+    if not os.path.isdir(dataset):
+        return []
+    prefix = f"{PARTITION_KEY}="
+    parts = []
+    for entry in os.listdir(dataset):
+        path = os.path.join(dataset, entry, PARTITION_FILE)
+        if entry.startswith(prefix) and os.path.isfile(path):
+            parts.append((unquote(entry[len(prefix) :]), path))
+    return sorted(parts)
+
+
+def remove_partitions(dataset: str, keep: Set[str]) -> List[str]:
+    """
+    Deletes the partitions of the scenarios not in `keep` from the dataset. Returns their names.
+    """
+    removed = []
+    for name, path in dataset_partitions(dataset):
+        if name not in keep:
+            shutil.rmtree(os.path.dirname(path))
+            removed.append(name)
+    return removed
+
+
+def _plain_type(t: pa.DataType) -> pa.DataType:
+    # Categorical codes are sized per scenario (int8/int16/int32); strings are dictionary-encoded in the file either way.
+    if pa.types.is_dictionary(t):
+        t = t.value_type
+    return pa.string() if pa.types.is_large_string(t) else t
+
+
+def write_combined(dataset: str, path: str, *, ni_path: Optional[str] = None) -> int:
+    """
+    Streams every partition of the dataset into one parquet file with the scenario column restored (and,
+    with `ni_path`, the NI rows into another). Returns the number of rows written to `path`.
+    """
+    parts = dataset_partitions(dataset)
+    if not parts:
+        raise ValueError(f"{dataset}: no scenario partitions")
+    first = pq.read_schema(parts[0][1])
+    fields = [pa.field(f.name, _plain_type(f.type)) for f in first]
+    fields.insert(min(2, len(fields)), pa.field(PARTITION_KEY, pa.string()))
+    schema = pa.schema(fields)
+
+    paths = [path] + ([ni_path] if ni_path else [])
+    for p in paths:
+        parent = os.path.dirname(p)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+    writer = pq.ParquetWriter(f"{path}.tmp", schema)
+    ni_writer = pq.ParquetWriter(f"{ni_path}.tmp", schema) if ni_path else None
+    count = 0
+    try:
+        for name, part in parts:
+            pf = pq.ParquetFile(part)
+            if pf.schema_arrow.names != first.names:
+                raise ValueError(f"{part}: columns differ from {parts[0][1]}; rebuild scenario {name!r}")
+            for batch in pf.iter_batches(batch_size=COMBINE_BATCH_ROWS):
+                table = pa.Table.from_batches([batch])
+                table = table.add_column(schema.get_field_index(PARTITION_KEY), PARTITION_KEY, pa.array([name] * len(table), pa.string()))
+                table = table.cast(schema)
+                writer.write_table(table)
+                count += len(table)
+                if ni_writer is not None:
+                    ni_writer.write_table(table.filter(pc.equal(table["Nation"], "NI")))
+    except BaseException:
+        for w, p in ((writer, path), (ni_writer, ni_path)):
+            if w is not None:
+                w.close()
+                os.remove(f"{p}.tmp")
+        raise
+    for w, p in ((writer, path), (ni_writer, ni_path)):
+        if w is not None:
+            w.close()
+            os.replace(f"{p}.tmp", p)
+    return count
+
+
+def parse_scenarios(values: List[str], default_name: str) -> List[Tuple[str, str]]:
+    """
+    --scenario values as (name, path). NAME=PATH names a scenario; a bare PATH is `default_name`
+    when it is the only scenario, otherwise it is named after its file.
+    """
+    scenarios = []
+    for v in values:
+        name, sep, path = v.partition("=")
+        if not sep:
+            name, path = (default_name if len(values) == 1 else os.path.splitext(os.path.basename(v))[0]), v
+        scenarios.append((name, path))
+    names = [name for name, _ in scenarios]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        raise ValueError(f"scenario name(s) given more than once: {', '.join(dupes)}")
+    return scenarios
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Build the atlas database parquet from scenario CSVs, the SEF CSV and the LAD lookups.")
+    p.add_argument(
+        "--scenario",
+        action="append",
+        required=True,
+        metavar="[NAME=]PATH",
+        help="Scenario CSV (Lookup.Value, Coben, 2025..2050, Sum); repeat for several scenarios.",
+    )
+    p.add_argument("--sef", required=True, help="Socio-economic factors CSV (LSOA.DZ.CD, ...).")
+    p.add_argument("--scenario-name", default=DEFAULT_SCENARIO_NAME, help=f"Name of a single unnamed --scenario (default: {DEFAULT_SCENARIO_NAME}).")
+    p.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=SCENARIO_CHUNK_ROWS,
+        help=f"Scenario CSV rows reduced at a time (default: {SCENARIO_CHUNK_ROWS}).",
+    )
+    p.add_argument("--lad-eng-wales", default=DEFAULT_LAD_ENG_WALES, help=f"LSOA -> LAD lookup (default: {DEFAULT_LAD_ENG_WALES}).")
+    p.add_argument("--lad-ni", default=DEFAULT_LAD_NI, help=f"NI DZ -> LGD lookup (default: {DEFAULT_LAD_NI}).")
+    p.add_argument("--lad-scotland", default=DEFAULT_LAD_SCOTLAND, help=f"Scotland DZ -> LA lookup (default: {DEFAULT_LAD_SCOTLAND}).")
+    p.add_argument("--unmatched-out", default=None, help="Write the SEF codes with no LAD to this CSV.")
+    p.add_argument(
+        "--dataset",
+        default=DEFAULT_DATASET,
+        help=f"Parquet dataset partitioned by scenario (default: {DEFAULT_DATASET}).",
+    )
+    p.add_argument(
+        "--keep-other-scenarios",
+        action="store_true",
+        help="Keep the dataset's partitions of scenarios not given with --scenario, and combine them into --out too.",
+    )
+    p.add_argument("--jobs", type=int, default=None, help="Scenarios built in parallel (default: one per scenario, up to the CPU count).")
+    p.add_argument("--out", default=DEFAULT_OUT, help=f"Combined parquet of every scenario in the dataset (default: {DEFAULT_OUT}).")
+    p.add_argument("--ni-out", default=None, help="Also write the NI-only development subset here.")
+    p.add_argument("--rollups-dir", default=DEFAULT_ROLLUPS_DIR, help=f"Directory for the rollup parquet files (default: {DEFAULT_ROLLUPS_DIR}).")
+    p.add_argument("--no-rollups", action="store_true", help="Do not write the rollup parquet files.")
+    p.add_argument(
+        "--sef-definitions",
+        default=DEFAULT_SEF_DEFINITIONS,
+        help=f"The app's SEF definitions, for the rollups (default: {DEFAULT_SEF_DEFINITIONS}).",
+    )
+    args = p.parse_args(argv)
+    try:
+        scenarios = parse_scenarios(args.scenario, args.scenario_name)
+    except ValueError as e:
+        p.error(str(e))
+    jobs = args.jobs or min(len(scenarios), os.cpu_count() or 1)
+
+    with step("sef"):
+        df_socio = load_sef(args.sef)
+        lad_index = load_lad_index(args.lad_eng_wales, args.lad_ni, args.lad_scotland)
+        df_socio = attach_lad(df_socio, lad_index)
+    report_unmatched(df_socio, args.unmatched_out)
+    if not args.keep_other_scenarios:
+        # A partition left from an earlier build would otherwise end up in --out.
+        for name in remove_partitions(args.dataset, {name for name, _ in scenarios}):
+            print(f"[build] removed scenario {name!r} from {args.dataset} (see --keep-other-scenarios)", file=sys.stderr)
+    with step(f"scenarios ({len(scenarios)}, {jobs} jobs)"):
+        for name, rows, seconds in build_scenarios(scenarios, df_socio, args.dataset, jobs=jobs, chunk_rows=args.chunk_rows):
+            print(f"[build] {name}: {rows} rows in {seconds:.2f}s", file=sys.stderr)
+    with step("combine"):
+        count = write_combined(args.dataset, args.out, ni_path=args.ni_out)
+    if not args.no_rollups:
+        with step("rollups"):
+            write_rollups(args.out, args.rollups_dir, sef_definitions=args.sef_definitions)
+
+    print(f"[done] {count} rows ({len(dataset_partitions(args.dataset))} scenarios) -> {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
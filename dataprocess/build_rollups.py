@@ -0,0 +1,197 @@
+"""
+Pre-aggregated rollups of static/database.parquet for the app's overview pages.
+
+The atlas runs its GROUP BY LAD / co_benefit_type / Nation aggregations in DuckDB-WASM over the
+full zone-level table on every page load. These small parquet files hold the same kinds of aggregates,
+computed with DuckDB at build time.
+
+Values keep the database's units: total and the window sums are £m, and every per-capita column is £m per
+person. The app's queries scale per-capita values differently (getTopLADs and getAggregationPerCapitaPerBenefit
+multiply by 1e6 for £ per person, getTotalAggregation and getTotalLAD by 1000), so a page reading a rollup
+applies its own factor:
+
+- lad_cobenefit.parquet: scenario x LAD x co-benefit sums of total and the time windows, with zones,
+  population and households; <column>_per_capita = SUM(column) / SUM(Population) over the zones with a
+  population (the app's per-capita formula, unscaled)
+- nation_cobenefit.parquet: the same per Nation, plus Nation = 'UK' for all nations together
+- lad_sef.parquet: per scenario and LAD, over the 'Total' rows (one per zone), the mean of each numeric SEF
+  (unscaled; the app shows Under_35, Over_65 and Unemployment x 100) and the mode of each categorical one,
+  with total_mean = AVG(total) and total_per_capita = AVG(total) / AVG(Population), as
+  getAverageSEFGroupedByLAD computes them
+- sef_buckets.parquet: per scenario, co-benefit and SEF, over the zones in each SEF bucket (a categorical
+  SEF's levels, or deciles of the zones for a numeric one), total_mean = AVG(total) and
+  total_per_capita_mean = AVG(total / Population), the mean of the zones' per-capita values
+
+SEF names and types come from the app's src/lib/definitions/se-factor.json.
+
+Usage:
+  python dataprocess/build_rollups.py --database static/database.parquet --outdir static/rollups
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import duckdb
+
+DEFAULT_DATABASE = os.path.join("static", "database.parquet")
+DEFAULT_ROLLUPS_DIR = os.path.join("static", "rollups")
+DEFAULT_SEF_DEFINITIONS = os.path.join("src", "lib", "definitions", "se-factor.json")
+
+TOTAL_CO_BENEFIT = "Total"
+VALUE_COLUMNS: Tuple[str, ...] = ("total", "Y2025_2029", "Y2030_2034", "Y2035_2039", "Y2040_2044", "Y2045_2050")
+# Buckets a numeric SEF is split into for sef_buckets.parquet.
+SEF_BUCKETS = 10
+
+
+def _sql_str(v: str) -> str:
+    return "'" + v.replace("'", "''") + "'"
+
+
+def _ident(v: str) -> str:
+    return '"' + v.replace('"', '""') + '"'
+
+
+def load_sef_definitions(path: str) -> List[Tuple[str, bool]]:
+    """
+    (SEF column, is categorical) pairs from the app's se-factor.json.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [(d["id"], d.get("type") == "categorical") for d in json.load(f)]
+
+
+def _value_measures() -> str:
+    # Per-capita values only count zones with a population, like the app's per-capita queries; £m per person.
+    sums = [f"SUM({_ident(c)}) AS {_ident(c)}" for c in VALUE_COLUMNS]
+    per_capita = [
+        f"SUM({_ident(c)}) FILTER (WHERE Population IS NOT NULL) / NULLIF(SUM(Population), 0) AS {_ident(c + '_per_capita')}"
+        for c in VALUE_COLUMNS
+    ]
+    counts = ["COUNT(*) AS zones", "CAST(SUM(Population) AS BIGINT) AS population", "CAST(SUM(HH) AS BIGINT) AS households"]
+    return ",\n       ".join([*counts, *sums, *per_capita])
+
+
+def lad_cobenefit_sql() -> str:
+    return f"""
+SELECT scenario, LAD, Nation, co_benefit_type,
+       {_value_measures()}
+FROM db
+GROUP BY scenario, LAD, Nation, co_benefit_type
+ORDER BY scenario, LAD, co_benefit_type
+"""
+
+
+def nation_cobenefit_sql() -> str:
+    return f"""
+SELECT scenario,
+       CASE WHEN GROUPING(Nation) = 1 THEN 'UK' ELSE Nation END AS Nation,
+       co_benefit_type,
+       {_value_measures()}
+FROM db
+GROUP BY GROUPING SETS ((scenario, Nation, co_benefit_type), (scenario, co_benefit_type))
+ORDER BY scenario, Nation, co_benefit_type
+"""
+
+
+def lad_sef_sql(sefs: List[Tuple[str, bool]]) -> str:
+    # MODE() WITHIN GROUP (ORDER BY ...) breaks ties like the app's queries do.
+    measures = [
+        f"MODE() WITHIN GROUP (ORDER BY {_ident(sef)}) AS {_ident(sef)}" if categorical else f"AVG({_ident(sef)}) AS {_ident(sef)}"
+        for sef, categorical in sefs
+    ]
+    sef_measures = ",\n       ".join(measures)
+    return f"""
+SELECT scenario, LAD, Nation,
+       COUNT(*) AS zones,
+       CAST(SUM(Population) AS BIGINT) AS population,
+       AVG(total) AS total_mean,
+       AVG(total) / AVG(Population) AS total_per_capita,
+       {sef_measures}
+FROM db
+WHERE co_benefit_type = {_sql_str(TOTAL_CO_BENEFIT)}
+GROUP BY scenario, LAD, Nation
+ORDER BY scenario, LAD
+"""
+
+
+def sef_buckets_sql(sefs: List[Tuple[str, bool]]) -> str:
+    # SEF values belong to the zone, so zones are bucketed once per SEF (deciles over zones, not rows)
+    # and the buckets joined back to every scenario and co-benefit row.
+    buckets = []
+    for sef, categorical in sefs:
+        bucket = "CAST(v AS INTEGER)" if categorical else f"NTILE({SEF_BUCKETS}) OVER (ORDER BY v)"
+        buckets.append(
+            f"SELECT Lookup_Value, {_sql_str(sef)} AS sef, v, {bucket} AS bucket\n"
+            f"      FROM (SELECT DISTINCT Lookup_Value, CAST({_ident(sef)} AS DOUBLE) AS v FROM db WHERE {_ident(sef)} IS NOT NULL)"
+        )
+    zone_buckets = "\n      UNION ALL\n      ".join(buckets)
+    return f"""
+WITH buckets AS (
+      {zone_buckets})
+SELECT b.sef, d.scenario, d.co_benefit_type, b.bucket,
+       MIN(b.v) AS sef_min,
+       MAX(b.v) AS sef_max,
+       COUNT(*) AS zones,
+       CAST(SUM(d.Population) AS BIGINT) AS population,
+       AVG(d.total) AS total_mean,
+       AVG(d.total / NULLIF(d.Population, 0)) AS total_per_capita_mean
+FROM db AS d
+JOIN buckets AS b USING (Lookup_Value)
+GROUP BY b.sef, d.scenario, d.co_benefit_type, b.bucket
+ORDER BY b.sef, d.scenario, d.co_benefit_type, b.bucket
+"""
+
+
+def write_rollups(database: str, outdir: str, *, sef_definitions: str = DEFAULT_SEF_DEFINITIONS) -> Dict[str, int]:
+    """
+    Writes the rollup parquet files for `database` into `outdir`. Returns rows per file.
+    """
+    sefs = load_sef_definitions(sef_definitions)
+    rollups = {
+        "lad_cobenefit.parquet": lad_cobenefit_sql(),
+        "nation_cobenefit.parquet": nation_cobenefit_sql(),
+        "lad_sef.parquet": lad_sef_sql(sefs),
+        "sef_buckets.parquet": sef_buckets_sql(sefs),
+    }
+    os.makedirs(outdir, exist_ok=True)
+    counts: Dict[str, int] = {}
+    con = duckdb.connect()
+    try:
+        con.execute(f"CREATE VIEW db AS SELECT * FROM read_parquet({_sql_str(database)})")
+        for name, sql in rollups.items():
+            path = os.path.join(outdir, name)
+            tmp = f"{path}.tmp"
+            con.execute(f"COPY ({sql}) TO {_sql_str(tmp)} (FORMAT PARQUET)")
+            os.replace(tmp, path)
+            counts[name] = con.execute(f"SELECT COUNT(*) FROM read_parquet({_sql_str(path)})").fetchone()[0]
+    finally:
+        con.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Write pre-aggregated rollup parquet files of the atlas database.")
+    p.add_argument("--database", default=DEFAULT_DATABASE, help=f"Zone-level database parquet (default: {DEFAULT_DATABASE}).")
+    p.add_argument("--outdir", default=DEFAULT_ROLLUPS_DIR, help=f"Output directory (default: {DEFAULT_ROLLUPS_DIR}).")
+    p.add_argument(
+        "--sef-definitions",
+        default=DEFAULT_SEF_DEFINITIONS,
+        help=f"The app's SEF definitions, for SEF names and types (default: {DEFAULT_SEF_DEFINITIONS}).",
+    )
+    args = p.parse_args(argv)
+
+    started = time.monotonic()
+    counts = write_rollups(args.database, args.outdir, sef_definitions=args.sef_definitions)
+    for name, n in counts.items():
+        print(f"[rollups] {name}: {n} rows", file=sys.stderr)
+    print(f"[done] {len(counts)} rollups -> {args.outdir} in {time.monotonic() - started:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
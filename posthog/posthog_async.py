@@ -0,0 +1,265 @@
+"""
+Optional asyncio transport for the events list (--transport async; needs httpx, h2 for HTTP/2).
+
+Every stream (event name, time slice or cached-day run) is a coroutine on one event loop running
+in a background thread, and all of them multiplex over a few HTTP/2 connections of a single
+httpx.AsyncClient, instead of a worker thread and a pooled connection each. Paging, page sizing,
+checkpoints, retries and the process-wide RateLimiter are the ones posthog_client uses, so
+outputs are the same as with the default `requests` transport.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Deque, Dict, Iterator, List, Optional
+
+from posthog_client import (
+    POOL_CONNECTIONS,
+    RETRY_STATUSES,
+    EventsCursor,
+    PostHogConfig,
+    RateLimiter,
+    RequestObserver,
+    _backoff_s,
+    _client_error,
+    _retry_wait,
+    _SOURCE_DONE,
+    _SourceError,
+    get_metrics,
+    get_rate_limiter,
+)
+
+# Connections the client may open; HTTP/2 streams multiplex many requests over each.
+ASYNC_MAX_CONNECTIONS = POOL_CONNECTIONS
+# Pages buffered between the event loop and the consumer before streams wait.
+ASYNC_QUEUE_PAGES = 64
+
+
+def _import_httpx() -> Any:
+    try:
+        import httpx
+    except ImportError as e:
+        raise SystemExit("--transport async needs httpx (pip install 'httpx[http2]')") from e
+    return httpx
+
+
+async def _acquire(limiter: RateLimiter) -> None:
+    delay = limiter.reserve()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    while True:
+        delay = limiter.resume_in()
+        if delay <= 0:
+            return
+        await asyncio.sleep(delay)
+
+
+class AsyncTransport:
+    """
+    Event loop thread plus shared httpx.AsyncClient. Use as a context manager, or close() it.
+
+    HTTP/2 is negotiated when the h2 package is installed and the server offers it (TLS/ALPN);
+    otherwise the same client falls back to pooled HTTP/1.1 keep-alive connections.
+    """
+
+    def __init__(self, cfg: PostHogConfig, *, max_connections: int = ASYNC_MAX_CONNECTIONS) -> None:
+        httpx = _import_httpx()
+        self._httpx = httpx
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="posthog-async", daemon=True)
+        self._thread.start()
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=limits,
+            timeout=httpx.Timeout(cfg.timeout_s, pool=None),  # streams queue for a connection untimed
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+
+    def __enter__(self) -> "AsyncTransport":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _submit(self, coro: Coroutine[Any, Any, Any]) -> "Future[Any]":
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._submit(self._client.aclose()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def request_json(
+        self,
+        url: str,
+        *,
+        headers: Dict[str, str],
+        params: Optional[Dict[str, Any]] = None,
+        timeout_s: int = 30,
+        max_retries: int = 6,
+        backoff_s: float = 1.0,
+        verbose: bool = False,
+        limiter: Optional[RateLimiter] = None,
+        observer: Optional[RequestObserver] = None,
+    ) -> Dict[str, Any]:
+        """
+        posthog_client.request_json() for GET requests on this transport.
+        """
+        httpx = self._httpx
+        limiter = limiter or get_rate_limiter()
+        observer = observer or RequestObserver()
+        metrics = get_metrics()
+        last_err: Optional[BaseException] = None
+        for attempt in range(max_retries + 1):
+            await _acquire(limiter)
+            status: Optional[int] = None
+            started = time.monotonic()
+            try:
+                # httpx's params= replaces the URL's query; `next` URLs carry theirs, so merge like requests.
+                target = httpx.URL(url).copy_merge_params(params or {})
+                resp = await self._client.get(target, headers=headers, timeout=httpx.Timeout(timeout_s, pool=None))
+                status = resp.status_code
+                elapsed_s = time.monotonic() - started
+                metrics.response(status, len(resp.content), elapsed_s)
+                limiter.observe(resp)
+                observer.response(resp, elapsed_s)
+
+                if 400 <= resp.status_code < 500 and resp.status_code != 429:
+                    raise _client_error(resp)
+
+                if resp.status_code in RETRY_STATUSES and attempt < max_retries:
+                    await asyncio.sleep(_retry_wait(resp, attempt, backoff_s=backoff_s, limiter=limiter, verbose=verbose))
+                    metrics.retry(resp.status_code)
+                    observer.retry(resp.status_code)
+                    continue
+                resp.raise_for_status()
+                return resp.json()
+            except (httpx.HTTPError, ValueError) as e:
+                last_err = e
+                if status is None:
+                    metrics.response(None, 0, time.monotonic() - started)
+                if attempt >= max_retries:
+                    break
+                wait = _backoff_s(backoff_s, attempt)
+                if verbose:
+                    print(f"[posthog] request error; retrying in {wait:.1f}s: {e!r}", file=sys.stderr)
+                await asyncio.sleep(wait)
+                metrics.retry(status)
+                observer.retry(status)
+        raise RuntimeError(f"PostHog request failed after retries: {last_err}")
+
+    async def _pages(self, cfg: PostHogConfig, stream: Dict[str, Any]) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        posthog_client.iter_events() as an async generator of pages; `stream` holds its keyword arguments.
+
+        The cursor's checkpoint reads and writes run in worker threads, off the event loop, so the
+        other streams keep their requests going meanwhile.
+        """
+        cursor = EventsCursor(cfg, **stream)
+        replayed = await asyncio.to_thread(lambda: list(cursor.resume()))
+        if replayed:
+            yield replayed
+        while cursor.url:
+            data = await self.request_json(
+                cursor.url,
+                headers=cfg.headers,
+                params=cursor.params,
+                timeout_s=cfg.timeout_s,
+                max_retries=cfg.max_retries,
+                backoff_s=cfg.backoff_s,
+                verbose=cursor.verbose,
+                observer=cursor.sizer,
+            )
+            yield await asyncio.to_thread(cursor.advance, data)
+
+    def iter_streams(self, cfg: PostHogConfig, streams: List[Dict[str, Any]], concurrency: int) -> Iterator[Dict[str, Any]]:
+        """
+        Pages up to `concurrency` streams at a time and yields events as they arrive
+        (stream by stream, in order, when concurrency is 1).
+
+        The hand-off queue is bounded, so a slow consumer applies back-pressure to the streams.
+        """
+        q: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=ASYNC_QUEUE_PAGES)
+
+        async def run_all() -> None:
+            slots = asyncio.Semaphore(max(1, concurrency))
+
+            async def run(stream: Dict[str, Any]) -> None:
+                async with slots:
+                    async for items in self._pages(cfg, stream):
+                        await q.put(items)
+
+            tasks = [asyncio.ensure_future(run(stream)) for stream in streams]
+            try:
+                await asyncio.gather(*tasks)
+            except Exception as e:
+                # gather() leaves the other streams running (and blocked on the full queue once the
+                # consumer stops reading), so stop them before reporting the error.
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await q.put(_SourceError(e))
+            await q.put(_SOURCE_DONE)
+
+        done = self._submit(run_all())
+        try:
+            while True:
+                item = self._submit(q.get()).result()
+                if item is _SOURCE_DONE:
+                    break
+                if isinstance(item, _SourceError):
+                    raise item.error
+                yield from item
+        finally:
+            # A consumer that stops early leaves run_all() awaiting gather(); cancelling it cancels
+            # every stream still running. After a stream error they were already cancelled there.
+            done.cancel()
+
+    def map_streams(self, cfg: PostHogConfig, streams: List[Dict[str, Any]], concurrency: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields each stream's events as one list, in `streams` order, keeping at most
+        2 * `concurrency` streams pending so memory stays bounded.
+        """
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def collect(stream: Dict[str, Any]) -> List[Dict[str, Any]]:
+            async with slots:
+                events: List[Dict[str, Any]] = []
+                async for items in self._pages(cfg, stream):
+                    events.extend(items)
+                return events
+
+        lookahead = max(1, concurrency) * 2
+        pending: Deque["Future[List[Dict[str, Any]]]"] = deque()
+        todo = iter(streams)
+        try:
+            for stream in todo:
+                pending.append(self._submit(collect(stream)))
+                if len(pending) >= lookahead:
+                    break
+            while pending:
+                events = pending.popleft().result()
+                for stream in todo:
+                    pending.append(self._submit(collect(stream)))
+                    break
+                yield events
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+    def iter_events(self, cfg: PostHogConfig, **stream: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Drop-in for posthog_client.iter_events() that pages over this transport.
+        """
+        return self.iter_streams(cfg, [stream], 1)
@@ -0,0 +1,215 @@
+"""
+Offline benchmark of the exporters against posthog_mock_server.py.
+
+For each size (10k, 1m, 10m events by default) a mock server is started with that many synthetic
+events, and each exporter runs end to end against it with --stable-names (no --cache). Per run it
+reports wall time, events/s, requests, retries, peak RSS and the fetch/flatten/write split (from
+the exporter's own *_metrics.json).
+
+The mock advertises a generous quota by default so the pipeline, not the rate limiter, is measured;
+pass --mock-quota 240 --mock-quota-window 60 to model a real PostHog project instead.
+
+Usage:
+  python posthog/posthog_benchmark.py --sizes 10k,1m --json bench.json
+  python posthog/posthog_benchmark.py --sizes 1m --exporters badge_interactions -- --transport async --concurrency 6
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.request import urlopen
+
+from posthog_mock_server import MOCK_END, MOCK_START, parse_count
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# exporter -> (script, metrics file it writes with --stable-names)
+EXPORTERS: Dict[str, Tuple[str, str]] = {
+    "badge_interactions": ("posthog_export_badge_interactions.py", "badge_interactions_metrics.json"),
+    "survey": ("posthog_export_survey.py", "badge_survey_metrics.json"),
+    "export_all": ("posthog_export_all.py", "export_all_metrics.json"),
+}
+DEFAULT_SIZES = "10k,1m,10m"
+DEFAULT_EXPORTERS = "badge_interactions,survey"
+RESULT_FIELDS = (
+    "events_total",
+    "exporter",
+    "events",
+    "wall_s",
+    "events_per_s",
+    "requests",
+    "retries",
+    "received_mb",
+    "peak_rss_mb",
+    "fetch_s",
+    "flatten_s",
+    "write_s",
+    "status",
+)
+
+
+def start_mock(events: int, args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    cmd = [
+        sys.executable,
+        os.path.join(HERE, "posthog_mock_server.py"),
+        "--port",
+        "0",
+        "--events",
+        str(events),
+        "--seed",
+        str(args.seed),
+        "--latency-ms",
+        str(args.mock_latency_ms),
+        "--fail-429",
+        str(args.mock_fail_429),
+        "--fail-5xx",
+        str(args.mock_fail_5xx),
+        "--quota",
+        str(args.mock_quota),
+        "--quota-window",
+        str(args.mock_quota_window),
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    assert proc.stdout is not None
+    url = proc.stdout.readline().strip()
+    if not url.startswith("http://"):
+        proc.kill()
+        raise SystemExit(f"mock server failed to start (exit {proc.wait()})")
+    return proc, url
+
+
+def mock_stats(url: str) -> Dict[str, Any]:
+    with urlopen(f"{url}/_mock/stats", timeout=10) as resp:
+        return json.load(resp)
+
+
+def run_exporter(name: str, url: str, outdir: str, extra: List[str]) -> Dict[str, Any]:
+    script, metrics_name = EXPORTERS[name]
+    cmd = [
+        sys.executable,
+        os.path.join(HERE, script),
+        "--after",
+        MOCK_START,
+        "--before",
+        MOCK_END,
+        "--host",
+        url,
+        "--project-id",
+        "1",
+        "--api-key",
+        "phx_mock",
+        "--outdir",
+        outdir,
+        "--stable-names",
+        *extra,
+    ]
+    started = time.monotonic()
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall_s = time.monotonic() - started
+    if proc.returncode != 0:
+        print(f"[bench] {name} failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}", file=sys.stderr)
+    metrics_path = os.path.join(outdir, metrics_name)
+    metrics: Dict[str, Any] = {}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, "r", encoding="utf-8") as f:
+            metrics = json.load(f)
+    events = sum(s["events"] for s in (metrics.get("streams") or {}).values())
+    phases = metrics.get("phase_seconds") or {}
+    rss = metrics.get("peak_rss_bytes")
+    return {
+        "exporter": name,
+        "events": events,
+        "wall_s": round(wall_s, 2),
+        "events_per_s": round(events / wall_s) if wall_s > 0 else None,
+        "requests": metrics.get("requests"),
+        "retries": sum((metrics.get("retries_by_status") or {}).values()),
+        "received_mb": round(metrics.get("bytes_received", 0) / 1e6, 1),
+        "peak_rss_mb": round(rss / 2**20, 1) if rss else None,
+        "fetch_s": phases.get("fetch"),
+        "flatten_s": phases.get("flatten"),
+        "write_s": phases.get("write"),
+        "status": "ok" if proc.returncode == 0 else f"exit {proc.returncode}",
+    }
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    rows = [[str(r.get(k, "")) for k in RESULT_FIELDS] for r in results]
+    widths = [max(len(k), *(len(row[i]) for row in rows)) for i, k in enumerate(RESULT_FIELDS)]
+    print("  ".join(k.rjust(w) for k, w in zip(RESULT_FIELDS, widths)))
+    for row in rows:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(
+        description="Benchmark the exporters end to end against the offline mock PostHog server.",
+        epilog="Arguments after '--' are passed to every exporter run (e.g. -- --transport async --concurrency 6).",
+    )
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated event counts (default: {DEFAULT_SIZES}).")
+    p.add_argument(
+        "--exporters",
+        default=DEFAULT_EXPORTERS,
+        help=f"Comma-separated exporters from {', '.join(EXPORTERS)} (default: {DEFAULT_EXPORTERS}).",
+    )
+    p.add_argument("--repeat", type=int, default=1, help="Runs per exporter and size (default: 1).")
+    p.add_argument("--seed", type=int, default=1, help="Mock data seed (default: 1).")
+    p.add_argument("--mock-latency-ms", type=float, default=0.0, help="Mean latency the mock adds per request (default: 0).")
+    p.add_argument("--mock-fail-429", type=float, default=0.0, help="Fraction of mock requests answered 429 (default: 0).")
+    p.add_argument("--mock-fail-5xx", type=float, default=0.0, help="Fraction of mock requests answered 5xx (default: 0).")
+    p.add_argument("--mock-quota", type=int, default=100_000, help="Requests per quota window the mock allows (default: 100000).")
+    p.add_argument("--mock-quota-window", type=float, default=60.0, help="Mock quota window in seconds (default: 60).")
+    p.add_argument("--workdir", default=None, help="Keep exporter outputs here instead of a deleted temp directory.")
+    p.add_argument("--json", default=None, help="Also write the results to this JSON file.")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    extra: List[str] = []
+    if "--" in argv:
+        i = argv.index("--")
+        argv, extra = argv[:i], argv[i + 1 :]
+    args = p.parse_args(argv)
+
+    sizes = [parse_count(v) for v in args.sizes.split(",") if v.strip()]
+    exporters = [v.strip() for v in args.exporters.split(",") if v.strip()]
+    unknown = [v for v in exporters if v not in EXPORTERS]
+    if unknown:
+        p.error(f"unknown exporter(s): {', '.join(unknown)}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="posthog_bench_")
+    results: List[Dict[str, Any]] = []
+    try:
+        for size in sizes:
+            proc, url = start_mock(size, args)
+            try:
+                for name in exporters:
+                    for run in range(args.repeat):
+                        outdir = os.path.join(workdir, f"{size}_{name}_{run}")
+                        shutil.rmtree(outdir, ignore_errors=True)
+                        before = mock_stats(url)
+                        print(f"[bench] {name}: {size} events (run {run + 1}/{args.repeat})", file=sys.stderr)
+                        result = {"events_total": size, **run_exporter(name, url, outdir, extra)}
+                        result["mock_requests"] = mock_stats(url)["requests"] - before["requests"]
+                        results.append(result)
+            finally:
+                proc.terminate()
+                proc.wait()
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": extra, "results": results}, f, indent=2)
+            f.write("\n")
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
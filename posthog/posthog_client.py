@@ -0,0 +1,2083 @@
+"""
+Shared PostHog client used by the export scripts in this directory.
+
+Holds the API config, the pooled HTTP session, request/retry handling, the pagination
+strategies (events list, time slices, HogQL queries) and the output/state helpers
+(atomic writes, checkpoints, incremental high-water marks).
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import csv
+import gzip
+import hashlib
+import importlib.util
+import itertools
+import json
+import math
+import os
+import queue
+import random
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import IO, TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from posthog_async import AsyncTransport
+
+
+# Connection pool sizing for the shared session. pool_maxsize must cover the worker threads
+# (--concurrency), otherwise surplus connections are discarded instead of kept alive.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide pooled session, so keep-alive connections (and their TLS handshakes) are reused
+    across event names, time slices and every exporter running in the same process.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            _session = session
+        return _session
+
+
+def iso_now_utc() -> str:
+    return datetime.now(tz=timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def normalize_host(host: str) -> str:
+    host = (host or "").strip()
+    if not host:
+        return "https://eu.posthog.com"
+    return host.rstrip("/")
+
+
+def ensure_dir(path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+
+
+def to_iso8601(value: str) -> str:
+    """
+    Accepts YYYY-MM-DD or ISO timestamp.
+    Produces an ISO8601 string in UTC with Z suffix.
+    """
+    value = value.strip()
+    if not value:
+        raise ValueError("empty datetime")
+    # Allow date-only for convenience.
+    if len(value) == 10 and value[4] == "-" and value[7] == "-":
+        return f"{value}T00:00:00Z"
+    # If user provided a Z timestamp, keep it.
+    if value.endswith("Z"):
+        return value
+    # Try parsing as ISO and ensure timezone.
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+
+
+def parse_iso8601(value: str) -> datetime:
+    dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def format_iso8601(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def split_window(after: str, before: Optional[str], slices: int) -> List[Tuple[str, str]]:
+    """
+    Splits [after, before) into `slices` contiguous sub-windows of equal length (whole seconds).
+    An open-ended window is closed at the current time.
+    """
+    start = parse_iso8601(after)
+    end = parse_iso8601(before) if before else datetime.now(tz=timezone.utc).replace(microsecond=0)
+    total_s = int((end - start).total_seconds())
+    slices = max(1, min(int(slices), total_s)) if total_s > 0 else 1
+    step_s = total_s // slices if total_s > 0 else 0
+    edges = [start + timedelta(seconds=step_s * i) for i in range(slices)] + [end]
+    return [(format_iso8601(lo), format_iso8601(hi)) for lo, hi in zip(edges, edges[1:])]
+
+
+def json_dumps(v: Any) -> str:
+    return json.dumps(v, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+@dataclass(frozen=True)
+class PostHogConfig:
+    host: str
+    project_id: str
+    personal_api_key: str
+    timeout_s: int = 30
+    max_retries: int = 6
+    backoff_s: float = 1.0
+    # Bounds for the adaptive events-list page size (see PageSizer).
+    min_limit: int = 50
+    max_limit: int = 1000
+
+    @property
+    def events_url(self) -> str:
+        return f"{self.host}/api/projects/{self.project_id}/events/"
+
+    @property
+    def query_url(self) -> str:
+        return f"{self.host}/api/projects/{self.project_id}/query/"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.personal_api_key}"}
+
+
+# Request pacing. PostHog's private API allows 240 requests/minute and 1200 requests/hour on the
+# analytics endpoints. Until the responses advertise a quota, the shared limiter models both: it
+# paces at the per-minute rate and never lets more than RATE_LIMIT_HOURLY slots into any hour, so a
+# long header-less export settles at 1200/h instead of running into 429s after five minutes.
+RATE_LIMIT_RPS = 4.0
+RATE_LIMIT_HOURLY = 1200
+RATE_LIMIT_MIN_RPS = 0.1
+RATE_LIMIT_BURST = 4
+# Share of an advertised quota actually used, and the per-success recovery after a 429 while none is advertised.
+RATE_LIMIT_HEADROOM = 0.9
+RATE_LIMIT_STEP_RPS = 0.05
+# Waits are stretched by up to this fraction at random so parallel runs don't retry in lockstep.
+RETRY_JITTER = 0.25
+BACKOFF_MAX_S = 30.0
+
+
+def _header_number(value: Optional[str]) -> Optional[float]:
+    """
+    Leading number of a rate-limit header ("240", "240;w=60", "12, 240;w=60" -> first entry).
+    """
+    if not value:
+        return None
+    head = value.split(",")[0].split(";")[0].strip()
+    try:
+        return float(head)
+    except ValueError:
+        return None
+
+
+def _header_window_s(value: Optional[str]) -> Optional[float]:
+    for part in (value or "").split(",")[0].split(";")[1:]:
+        key, _, v = part.strip().partition("=")
+        if key == "w":
+            with suppress(ValueError):
+                return float(v)
+    return None
+
+
+def retry_after_s(resp: requests.Response) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP date), if present.
+    """
+    value = (resp.headers.get("Retry-After") or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+def jittered(wait_s: float) -> float:
+    return wait_s * random.uniform(1.0, 1.0 + RETRY_JITTER)
+
+
+class RateLimiter:
+    """
+    Adaptive token bucket shared by every request of the process (see get_rate_limiter()).
+
+    acquire() hands out request slots at the current rate, with a small burst, so streams are
+    spaced out up front instead of bursting into 429s. The rate follows the responses:
+    - RateLimit-*/X-RateLimit-* headers pin it just under the advertised quota (or pace the
+      remaining quota over the time left until the reset),
+    - a 429 halves it and pauses every stream until its Retry-After (plus jitter),
+    - while no quota is advertised, each clean response raises it by a small step, back up to
+      `max_rate` (the documented per-minute quota) but never beyond it, and at most `hourly`
+      slots are handed out in any sliding hour (the documented hourly quota; 0 disables).
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_RPS,
+        *,
+        burst: int = RATE_LIMIT_BURST,
+        min_rate: float = RATE_LIMIT_MIN_RPS,
+        max_rate: float = RATE_LIMIT_RPS,
+        hourly: int = RATE_LIMIT_HOURLY,
+    ) -> None:
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.advertised = False
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        # Start times of the last `hourly` slots, in order.
+        self._hour_slots: Deque[float] = deque(maxlen=max(hourly, 0))
+        self.hourly = hourly
+
+    def _set_rate(self, rate: float, *, cap: bool = True) -> None:
+        self.rate = max(self.min_rate, min(self.max_rate, rate) if cap else rate)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(float(self.burst), self._tokens + max(0.0, now - self._updated) * self.rate)
+        self._updated = max(self._updated, now)
+
+    def reserve(self) -> float:
+        """
+        Reserves a request slot and returns how long to wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A negative balance is this caller's place in the queue.
+            self._tokens -= 1.0
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if self.hourly > 0 and not self.advertised:
+                slots = self._hour_slots
+                start = now + delay
+                if slots:
+                    start = max(start, slots[-1])
+                if len(slots) == self.hourly:
+                    start = max(start, slots[0] + 3600.0)
+                slots.append(start)
+                delay = start - now
+            return delay
+
+    def resume_in(self) -> float:
+        """
+        Seconds until a pause() ends (<= 0 when not paused).
+        """
+        with self._lock:
+            return self._resume_at - time.monotonic()
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        while True:
+            delay = self.resume_in()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, wait_s: float) -> None:
+        """
+        Holds every stream for `wait_s`; no burst builds up meanwhile.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._resume_at = max(self._resume_at, now + wait_s)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = max(self._updated, self._resume_at)
+
+    def throttled(self, wait_s: float) -> None:
+        with self._lock:
+            self._set_rate(self.rate / 2)
+        self.pause(wait_s)
+
+    def observe(self, resp: requests.Response) -> None:
+        h = resp.headers
+        limit_header = h.get("RateLimit-Limit") or h.get("X-RateLimit-Limit")
+        limit = _header_number(limit_header)
+        remaining = _header_number(h.get("RateLimit-Remaining") or h.get("X-RateLimit-Remaining"))
+        reset = _header_number(h.get("RateLimit-Reset") or h.get("X-RateLimit-Reset"))
+        if reset is not None and reset > 1e9:
+            reset -= time.time()  # epoch seconds rather than delta-seconds
+        with self._lock:
+            if remaining is not None and reset is not None and reset > 0:
+                self.advertised = True
+                if remaining <= 0:
+                    wait_s = reset
+                else:
+                    self._set_rate(RATE_LIMIT_HEADROOM * remaining / reset, cap=False)
+                    return
+            elif limit is not None and limit > 0:
+                self.advertised = True
+                window_s = _header_window_s(limit_header) or 60.0
+                self._set_rate(RATE_LIMIT_HEADROOM * limit / window_s, cap=False)
+                return
+            else:
+                if not self.advertised and resp.status_code < 400:
+                    self._set_rate(self.rate + RATE_LIMIT_STEP_RPS)
+                return
+        self.pause(jittered(wait_s))
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Process-wide limiter, so every stream and exporter of the process shares one request rate.
+    """
+    global _rate_limiter
+    with _session_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
+
+
+# Items RunMetrics.timed() pulls per phase switch.
+TIMED_CHUNK_ITEMS = 256
+# Upper bounds (seconds) of the request latency histogram, Prometheus-style (cumulative, plus +Inf).
+LATENCY_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024  # bytes on macOS, KiB elsewhere
+
+
+class RunMetrics:
+    """
+    Counters for one export run, shared by every request and stream of the process (see get_metrics()).
+
+    Phase times are exclusive: nested phase()/timed() sections charge the innermost phase, so the
+    pipeline's interleaved generators still split wall time into fetch vs flatten vs write (+ other).
+    Phases are tracked on the consumer thread only; the counters are thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started_at = iso_now_utc()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.bytes_received = 0
+        self.by_status: Dict[str, int] = {}
+        self.retries: Dict[str, int] = {}
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS_S) + 1)
+        self.latency_sum_s = 0.0
+        self.streams: Dict[str, Dict[str, float]] = {}
+        self.phases: Dict[str, float] = {}
+        self._phase_stack: List[str] = []
+        self._phase_since = self.started
+
+    def response(self, status: Optional[int], n_bytes: int, elapsed_s: float) -> None:
+        """
+        One request attempt: its HTTP status (None for network errors/timeouts), body size and latency.
+        """
+        key = str(status) if status is not None else "error"
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += n_bytes
+            self.by_status[key] = self.by_status.get(key, 0) + 1
+            self.latency_counts[bisect.bisect_left(LATENCY_BUCKETS_S, elapsed_s)] += 1
+            self.latency_sum_s += elapsed_s
+
+    def retry(self, status: Optional[int]) -> None:
+        key = str(status) if status is not None else "error"
+        with self._lock:
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+    def page(self, stream: str, n_events: int, elapsed_s: float) -> None:
+        """
+        One page of `stream` (an event name): `elapsed_s` is the stream's time since its previous page.
+        """
+        with self._lock:
+            entry = self.streams.setdefault(stream, {"events": 0, "pages": 0, "seconds": 0.0})
+            entry["events"] += n_events
+            entry["pages"] += 1
+            entry["seconds"] += elapsed_s
+
+    def _switch(self) -> None:
+        now = time.monotonic()
+        if self._phase_stack:
+            top = self._phase_stack[-1]
+            self.phases[top] = self.phases.get(top, 0.0) + (now - self._phase_since)
+        self._phase_since = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self._switch()
+        self._phase_stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            self._phase_stack.pop()
+
+    def timed(self, name: str, items: Iterable[Any], *, chunk: int = TIMED_CHUNK_ITEMS) -> Iterator[Any]:
+        """
+        Yields from `items`, charging the time spent producing them to phase `name`.
+        Items are pulled `chunk` at a time so the bookkeeping stays off the per-event path.
+        """
+        it = iter(items)
+        while True:
+            with self.phase(name):
+                batch = list(itertools.islice(it, chunk))
+            if not batch:
+                return
+            yield from batch
+
+    def summary(self, *, exporter: str, ok: bool) -> Dict[str, Any]:
+        wall_s = time.monotonic() - self.started
+        with self._lock:
+            phases = {name: round(self.phases.get(name, 0.0), 3) for name in ("fetch", "flatten", "write")}
+            phases["other"] = round(max(0.0, wall_s - sum(self.phases.values())), 3)
+            cumulative = list(itertools.accumulate(self.latency_counts))
+            return {
+                "exporter": exporter,
+                "status": "ok" if ok else "failed",
+                "started_at": self.started_at,
+                "finished_at": iso_now_utc(),
+                "duration_s": round(wall_s, 3),
+                "requests": self.requests,
+                "responses_by_status": dict(sorted(self.by_status.items())),
+                "retries_by_status": dict(sorted(self.retries.items())),
+                "bytes_received": self.bytes_received,
+                "request_latency_s": {
+                    "buckets": {**{str(le): n for le, n in zip(LATENCY_BUCKETS_S, cumulative)}, "+Inf": cumulative[-1]},
+                    "sum": round(self.latency_sum_s, 3),
+                    "count": self.requests,
+                },
+                "streams": {
+                    name: {
+                        "events": int(entry["events"]),
+                        "pages": int(entry["pages"]),
+                        "seconds": round(entry["seconds"], 3),
+                        "events_per_s": round(entry["events"] / entry["seconds"], 1) if entry["seconds"] > 0 else None,
+                    }
+                    for name, entry in sorted(self.streams.items())
+                },
+                "phase_seconds": phases,
+                "peak_rss_bytes": _peak_rss_bytes(),
+            }
+
+
+def _prom_labels(labels: Dict[str, str]) -> str:
+    def escape(v: str) -> str:
+        return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def metrics_to_prometheus(summary: Dict[str, Any]) -> str:
+    """
+    Renders a RunMetrics.summary() in the Prometheus text exposition format (node_exporter textfile collector).
+    """
+    job = {"exporter": summary["exporter"]}
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[Dict[str, str], Any]]) -> None:
+        lines.append(f"# HELP posthog_export_{name} {help_text}")
+        lines.append(f"# TYPE posthog_export_{name} {kind}")
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"posthog_export_{name}{_prom_labels({**job, **labels})} {value}")
+
+    metric("success", "gauge", "1 if the last run finished, 0 if it failed.", [({}, int(summary["status"] == "ok"))])
+    finished = parse_iso8601(summary["finished_at"]).timestamp()
+    metric("last_run_timestamp_seconds", "gauge", "End of the last run (Unix time).", [({}, int(finished))])
+    metric("duration_seconds", "gauge", "Wall time of the last run.", [({}, summary["duration_s"])])
+    metric(
+        "phase_seconds",
+        "gauge",
+        "Wall time of the last run by pipeline phase (exclusive).",
+        [({"phase": k}, v) for k, v in summary["phase_seconds"].items()],
+    )
+    metric("requests", "gauge", "HTTP requests issued (including retries).", [({}, summary["requests"])])
+    metric(
+        "responses",
+        "gauge",
+        "Request attempts by HTTP status ('error' for network errors/timeouts).",
+        [({"status": k}, v) for k, v in summary["responses_by_status"].items()],
+    )
+    metric(
+        "retries",
+        "gauge",
+        "Retries by the failed attempt's HTTP status.",
+        [({"status": k}, v) for k, v in summary["retries_by_status"].items()],
+    )
+    metric("received_bytes", "gauge", "Response body bytes received.", [({}, summary["bytes_received"])])
+    latency = summary["request_latency_s"]
+    lines.append("# HELP posthog_export_request_latency_seconds Latency of each request attempt (one per page).")
+    lines.append("# TYPE posthog_export_request_latency_seconds histogram")
+    for le, n in latency["buckets"].items():
+        lines.append(f"posthog_export_request_latency_seconds_bucket{_prom_labels({**job, 'le': le})} {n}")
+    lines.append(f"posthog_export_request_latency_seconds_sum{_prom_labels(job)} {latency['sum']}")
+    lines.append(f"posthog_export_request_latency_seconds_count{_prom_labels(job)} {latency['count']}")
+    streams = summary["streams"]
+    metric("stream_events", "gauge", "Events fetched per stream.", [({"stream": k}, v["events"]) for k, v in streams.items()])
+    metric(
+        "stream_events_per_second",
+        "gauge",
+        "Events fetched per second of stream paging time.",
+        [({"stream": k}, v["events_per_s"]) for k, v in streams.items()],
+    )
+    metric("peak_rss_bytes", "gauge", "Peak resident set size of the run.", [({}, summary["peak_rss_bytes"])])
+    return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[RunMetrics] = None
+
+
+def get_metrics() -> RunMetrics:
+    """
+    Process-wide run metrics, started on first use.
+    """
+    global _metrics
+    with _session_lock:
+        if _metrics is None:
+            _metrics = RunMetrics()
+        return _metrics
+
+
+class RequestObserver:
+    """
+    Hooks that request_json() calls around its attempts; subclasses override what they need.
+    """
+
+    def response(self, resp: requests.Response, elapsed_s: float) -> None:
+        pass
+
+    def retry(self, status: Optional[int]) -> None:
+        """
+        Called before each retry with the failed attempt's HTTP status (None for network errors/timeouts).
+        """
+
+
+def _backoff_s(backoff_s: float, attempt: int) -> float:
+    return jittered(min(BACKOFF_MAX_S, backoff_s * (2**attempt)))
+
+
+# Rate limit / transient backend errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _client_error(resp: requests.Response) -> RuntimeError:
+    detail = ""
+    try:
+        detail = resp.text.strip()
+    except Exception:
+        detail = ""
+    msg = f"PostHog request failed ({resp.status_code}) for {resp.request.method} {resp.url}"
+    if resp.status_code in (401, 403):
+        msg += (
+            "\nAuth error. Ensure you're using a *personal API key* (typically starts with 'phx_'), "
+            "not the JS project key ('phc_*'), and that POSTHOG_PROJECT_ID matches the project."
+        )
+    if detail:
+        msg += f"\nResponse: {detail[:500]}"
+    return RuntimeError(msg)
+
+
+def _retry_wait(resp: requests.Response, attempt: int, *, backoff_s: float, limiter: RateLimiter, verbose: bool) -> float:
+    """
+    Seconds to sleep before retrying a RETRY_STATUSES response. A 429 pauses the limiter
+    instead (every stream waits it out and slows down), so the caller itself sleeps 0.
+    """
+    if resp.status_code == 429:
+        advised = retry_after_s(resp)
+        wait = jittered(advised) if advised is not None else _backoff_s(backoff_s, attempt)
+        limiter.throttled(wait)
+        if verbose:
+            print(f"[posthog] rate limited (429); pausing {wait:.1f}s, now {limiter.rate:.2f} req/s", file=sys.stderr)
+        return 0.0
+    wait = _backoff_s(backoff_s, attempt)
+    if verbose:
+        print(f"[posthog] transient {resp.status_code}; retrying in {wait:.1f}s", file=sys.stderr)
+    return wait
+
+
+def request_json(
+    session: requests.Session,
+    url: str,
+    *,
+    headers: Dict[str, str],
+    params: Optional[Dict[str, Any]] = None,
+    timeout_s: int = 30,
+    max_retries: int = 6,
+    backoff_s: float = 1.0,
+    verbose: bool = False,
+    limiter: Optional[RateLimiter] = None,
+    method: str = "GET",
+    json_body: Optional[Dict[str, Any]] = None,
+    observer: Optional[RequestObserver] = None,
+) -> Dict[str, Any]:
+    """
+    `params` is re-read on every attempt, so an observer may adjust it from retry().
+    """
+    limiter = limiter or get_rate_limiter()
+    observer = observer or RequestObserver()
+    metrics = get_metrics()
+    last_err: Optional[BaseException] = None
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        status: Optional[int] = None
+        started = time.monotonic()
+        try:
+            resp = session.request(method, url, headers=headers, params=params, json=json_body, timeout=timeout_s)
+            status = resp.status_code
+            elapsed_s = time.monotonic() - started
+            metrics.response(status, len(resp.content), elapsed_s)
+            limiter.observe(resp)
+            observer.response(resp, elapsed_s)
+
+            # Fail fast on non-retryable client errors (wrong key/project/host/etc).
+            if 400 <= resp.status_code < 500 and resp.status_code != 429:
+                raise _client_error(resp)
+
+            if resp.status_code in RETRY_STATUSES and attempt < max_retries:
+                time.sleep(_retry_wait(resp, attempt, backoff_s=backoff_s, limiter=limiter, verbose=verbose))
+                metrics.retry(resp.status_code)
+                observer.retry(resp.status_code)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+        except (requests.RequestException, ValueError) as e:
+            last_err = e
+            if status is None:
+                metrics.response(None, 0, time.monotonic() - started)
+            if attempt >= max_retries:
+                break
+            wait = _backoff_s(backoff_s, attempt)
+            if verbose:
+                print(f"[posthog] request error; retrying in {wait:.1f}s: {e}", file=sys.stderr)
+            time.sleep(wait)
+            metrics.retry(status)
+            observer.retry(status)
+    raise RuntimeError(f"PostHog request failed after retries: {last_err}")
+
+
+# Pages a stream spools between checkpoints (fsync of its spool plus a state.json save).
+CHECKPOINT_SYNC_PAGES = 16
+
+
+class StreamCheckpoint:
+    """
+    Progress of one event stream: spooled pages, flushed byte offset and the `next` cursor.
+    """
+
+    def __init__(self, parent: "ExportCheckpoint", key: str, entry: Dict[str, Any]) -> None:
+        self._parent = parent
+        self.key = key
+        self.path = os.path.join(parent.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".jsonl")
+        self.next_url: Optional[str] = entry.get("next")
+        self.offset = int(entry.get("offset") or 0)
+        self.pages = int(entry.get("pages") or 0)
+        self.done = bool(entry.get("done"))
+        if self.offset and not os.path.exists(self.path):
+            # Spool lost: start this stream over.
+            self.next_url, self.offset, self.pages, self.done = None, 0, 0, False
+        self._saved_pages = self.pages
+
+    def replay(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the events already fetched by an earlier attempt, dropping any partially written page.
+        """
+        with open(self.path, "ab") as f:
+            f.truncate(self.offset)
+        if not self.offset:
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def commit(self, items: List[Dict[str, Any]], next_url: Optional[str]) -> None:
+        """
+        Spools one page. Every CHECKPOINT_SYNC_PAGES pages, and at the end of the stream, the spool
+        is fsynced before the cursor and offset are recorded; a resume drops any page spooled since.
+        """
+        self.pages += 1
+        self.next_url = next_url
+        self.done = next_url is None
+        sync = self.done or self.pages - self._saved_pages >= CHECKPOINT_SYNC_PAGES
+        with open(self.path, "ab") as f:
+            for item in items:
+                f.write(json_dumps(item).encode("utf-8"))
+                f.write(b"\n")
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+            self.offset = f.tell()
+        if sync:
+            self._saved_pages = self.pages
+            self._parent.save_stream(
+                self.key, {"next": self.next_url, "offset": self.offset, "pages": self.pages, "done": self.done}
+            )
+
+
+class ExportCheckpoint:
+    """
+    Page-level checkpoint for every stream of one export run, kept in a directory under --outdir.
+    Only used with --checkpoint or --resume (see open_checkpoint()); other runs spool nothing.
+
+    Each page's events are appended to its stream's spool file; every few pages (see
+    StreamCheckpoint.commit) the spool is fsynced and the `next` cursor plus the flushed byte offset
+    are recorded, so `--resume` replays what was already recorded and continues from there. The
+    directory is removed once the outputs are written.
+    """
+
+    def __init__(self, directory: str, *, resume: bool) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.state: Dict[str, Any] = {"window": {}, "streams": {}}
+        if resume:
+            try:
+                with open(os.path.join(directory, "state.json"), encoding="utf-8") as f:
+                    self.state = json.load(f)
+            except FileNotFoundError:
+                pass
+        else:
+            self.clear()
+        ensure_dir(directory)
+
+    def window(self, after: str, before: Optional[str]) -> Tuple[str, Optional[str]]:
+        """
+        Pins the export window, so a resumed run continues with the exact same streams.
+        """
+        saved = self.state.get("window") or {}
+        if saved.get("after"):
+            return saved["after"], saved.get("before")
+        with self._lock:
+            self.state["window"] = {"after": after, "before": before}
+            self._write()
+        return after, before
+
+    def stream(self, key: str) -> StreamCheckpoint:
+        with self._lock:
+            entry = dict((self.state.get("streams") or {}).get(key) or {})
+        return StreamCheckpoint(self, key, entry)
+
+    def save_stream(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self.state.setdefault("streams", {})[key] = entry
+            self._write()
+
+    def _write(self) -> None:
+        path = os.path.join(self.directory, "state.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, path)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# A page is healthy while it comes back within this time (capped at a quarter of the request
+# timeout) and payload size; the page size grows while pages are full and healthy.
+PAGE_TARGET_S = 5.0
+PAGE_TARGET_BYTES = 8 * 1024 * 1024
+
+
+def _without_query_param(url: str, name: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != name]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class PageSizer(RequestObserver):
+    """
+    Adaptive `limit` for one events-list stream, kept in the request params it owns.
+
+    Doubles after a full page that was fast and small enough, scales down in proportion when a
+    page was slow or large, and halves before retrying a timeout or 5xx; always within
+    [min_limit, max_limit].
+    """
+
+    def __init__(self, cfg: PostHogConfig, limit: int, params: Dict[str, Any]) -> None:
+        self.min_size = max(1, min(cfg.min_limit, cfg.max_limit))
+        self.max_size = max(self.min_size, cfg.max_limit)
+        self.target_s = min(PAGE_TARGET_S, cfg.timeout_s / 4)
+        self.params = params
+        self.size = min(self.max_size, max(self.min_size, int(limit)))
+        self.params["limit"] = self.size
+        self.elapsed_s = 0.0
+        self.bytes = 0
+
+    def _resize(self, size: int) -> None:
+        self.size = min(self.max_size, max(self.min_size, size))
+        self.params["limit"] = self.size
+
+    def response(self, resp: requests.Response, elapsed_s: float) -> None:
+        self.elapsed_s = elapsed_s
+        self.bytes = len(resp.content)
+
+    def retry(self, status: Optional[int]) -> None:
+        if status is None or status >= 500:
+            self._resize(self.size // 2)
+
+    def page_done(self, n_results: int) -> None:
+        slow = self.elapsed_s / self.target_s
+        large = self.bytes / PAGE_TARGET_BYTES
+        if slow > 1 or large > 1:
+            self._resize(int(self.size / max(slow, large)))
+        elif n_results >= self.size and slow < 0.5 and large < 0.5:
+            self._resize(self.size * 2)
+
+
+class EventsCursor:
+    """
+    Paging state of one events-list stream: the `next` URL, its adaptive page size and its checkpoint.
+
+    Transport-agnostic, so the sync iter_events() and the async transport page identically;
+    callers request `url` with `params` (observed by `sizer`) and hand each response to advance().
+    """
+
+    def __init__(
+        self,
+        cfg: PostHogConfig,
+        *,
+        event_name: Optional[str],
+        after: Optional[str],
+        before: Optional[str],
+        limit: int,
+        verbose: bool,
+        checkpoint: Optional[ExportCheckpoint] = None,
+    ) -> None:
+        self.cfg = cfg
+        self.event_name = event_name
+        self.verbose = verbose
+        self.url: Optional[str] = cfg.events_url
+        self.params: Dict[str, Any] = {}
+        self.sizer = PageSizer(cfg, limit, self.params)
+        if event_name:
+            self.params["event"] = event_name
+        if after:
+            self.params["after"] = after
+        if before:
+            self.params["before"] = before
+        self.page = 0
+        self._last_page = time.monotonic()
+        self.stream = checkpoint.stream(f"{event_name or '*'}|{after or ''}|{before or ''}") if checkpoint else None
+
+    def resume(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the events an interrupted run already fetched and moves the cursor past them.
+        """
+        stream = self.stream
+        if stream is None:
+            return
+        yield from stream.replay()
+        if stream.done:
+            self.url = None
+        elif stream.next_url:
+            self.url = stream.next_url
+            self.params.clear()
+            self.params["limit"] = self.sizer.size
+        self.page = stream.pages
+
+    def advance(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Takes one page response: resizes, checkpoints and follows `next`. Returns the page's events.
+        """
+        sizer = self.sizer
+        self.page += 1
+        results = data.get("results") or []
+        now = time.monotonic()
+        get_metrics().page(self.event_name or "*", len(results), now - self._last_page)
+        self._last_page = now
+        size = sizer.size
+        sizer.page_done(len(results))
+        if self.verbose:
+            name = self.event_name or "*"
+            print(
+                f"[posthog] {name}: page {self.page} -> {len(results)} events (limit {size}, {sizer.elapsed_s:.2f}s)",
+                file=sys.stderr,
+            )
+            if sizer.size != size:
+                print(f"[posthog] {name}: page size {size} -> {sizer.size}", file=sys.stderr)
+        items = [item for item in results if isinstance(item, dict)]
+        nxt = data.get("next")
+        if isinstance(nxt, str) and nxt:
+            # PostHog usually returns an absolute URL, but some deployments may return a relative path.
+            # 'next' carries every other query param; only the page size stays ours.
+            self.url = _without_query_param(urljoin(self.cfg.host + "/", nxt), "limit")
+            self.params.clear()
+            self.params["limit"] = sizer.size
+        else:
+            self.url = None
+        if self.stream is not None:
+            self.stream.commit(items, self.url)
+        return items
+
+
+def iter_events(
+    cfg: PostHogConfig,
+    *,
+    event_name: Optional[str],
+    after: Optional[str],
+    before: Optional[str],
+    limit: int,
+    verbose: bool,
+    checkpoint: Optional[ExportCheckpoint] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterates PostHog events.
+
+    Uses cursor pagination via the `next` URL in API responses.
+    """
+    session = get_session()
+    cursor = EventsCursor(
+        cfg, event_name=event_name, after=after, before=before, limit=limit, verbose=verbose, checkpoint=checkpoint
+    )
+    yield from cursor.resume()
+    while cursor.url:
+        data = request_json(
+            session,
+            cursor.url,
+            headers=cfg.headers,
+            params=cursor.params,
+            timeout_s=cfg.timeout_s,
+            max_retries=cfg.max_retries,
+            backoff_s=cfg.backoff_s,
+            verbose=verbose,
+            observer=cursor.sizer,
+        )
+        yield from cursor.advance(data)
+
+
+class _SourceError:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_SOURCE_DONE = object()
+
+
+def _iter_parallel(sources: List[Callable[[], Iterable[Dict[str, Any]]]], concurrency: int) -> Iterator[Dict[str, Any]]:
+    """
+    Drains each source in a bounded worker pool and yields items as they arrive.
+
+    The hand-off queue is bounded, so a slow consumer applies back-pressure to the workers.
+    """
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, concurrency) * 1024)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(source: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        if stop.is_set():
+            return
+        try:
+            for item in source():
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_SourceError(e))
+            return
+        put(_SOURCE_DONE)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(sources))) as pool:
+        for source in sources:
+            pool.submit(run, source)
+        remaining = len(sources)
+        try:
+            while remaining:
+                item = q.get()
+                if item is _SOURCE_DONE:
+                    remaining -= 1
+                elif isinstance(item, _SourceError):
+                    raise item.error
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+
+def collect_events(
+    cfg: PostHogConfig,
+    event_names: Tuple[str, ...],
+    *,
+    after: Optional[str],
+    before: Optional[str],
+    limit: int,
+    verbose: bool,
+    concurrency: int = 1,
+    time_slices: int = 1,
+    after_by_event: Optional[Dict[str, str]] = None,
+    checkpoint: Optional[ExportCheckpoint] = None,
+    transport: Optional[AsyncTransport] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields events for every name in `event_names`.
+
+    With concurrency > 1 the names are paged in parallel and share the process-wide RateLimiter;
+    events are then yielded in arrival order instead of grouped per name.
+    With time_slices > 1 see iter_sliced_events.
+    `after_by_event` overrides the window start for individual names (incremental runs).
+    With a `transport` the names are coroutines on its event loop rather than worker threads.
+    """
+    overrides = after_by_event or {}
+    if time_slices > 1 and after:
+        yield from iter_sliced_events(
+            cfg,
+            event_names,
+            after=after,
+            before=before,
+            limit=limit,
+            verbose=verbose,
+            concurrency=concurrency,
+            time_slices=time_slices,
+            after_by_event=overrides,
+            checkpoint=checkpoint,
+            transport=transport,
+        )
+        return
+
+    if transport is not None:
+        streams = [
+            dict(
+                event_name=name,
+                after=overrides.get(name, after),
+                before=before,
+                limit=limit,
+                verbose=verbose,
+                checkpoint=checkpoint,
+            )
+            for name in event_names
+        ]
+        yield from transport.iter_streams(cfg, streams, concurrency)
+        return
+
+    if concurrency <= 1 or len(event_names) <= 1:
+        for name in event_names:
+            yield from iter_events(
+                cfg,
+                event_name=name,
+                after=overrides.get(name, after),
+                before=before,
+                limit=limit,
+                verbose=verbose,
+                checkpoint=checkpoint,
+            )
+        return
+
+    sources = [
+        partial(
+            iter_events,
+            cfg,
+            event_name=name,
+            after=overrides.get(name, after),
+            before=before,
+            limit=limit,
+            verbose=verbose,
+            checkpoint=checkpoint,
+        )
+        for name in event_names
+    ]
+    yield from _iter_parallel(sources, concurrency)
+
+
+# Sub-windows are fetched with this much overlap and then trimmed to the interval they own,
+# so events sitting exactly on a boundary are neither dropped nor duplicated.
+SLICE_OVERLAP = timedelta(minutes=1)
+
+
+def _event_sort_key(ev: Dict[str, Any]) -> Tuple[str, str]:
+    return (extract_timestamp(ev) or "", str(ev.get("id") or ""))
+
+
+def _in_window(ev: Dict[str, Any], lo: Optional[datetime], hi: Optional[datetime]) -> bool:
+    ts = extract_timestamp(ev)
+    if not ts:
+        return True
+    try:
+        dt = parse_iso8601(ts)
+    except ValueError:
+        return True
+    return (lo is None or dt >= lo) and (hi is None or dt < hi)
+
+
+def _map_ordered(
+    pool: ThreadPoolExecutor,
+    fn: Callable[[Any], List[Any]],
+    tasks: List[Any],
+    *,
+    lookahead: int,
+) -> Iterator[Any]:
+    """
+    Like pool.map, but keeps at most `lookahead` results pending so memory stays bounded.
+    """
+    pending: Deque[Any] = deque()
+    todo = iter(tasks)
+    try:
+        for task in todo:
+            pending.append(pool.submit(fn, task))
+            if len(pending) >= lookahead:
+                break
+        while pending:
+            items = pending.popleft().result()
+            for task in todo:
+                pending.append(pool.submit(fn, task))
+                break
+            yield from items
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+def _slice_plan(
+    after: str, before: Optional[str], time_slices: int
+) -> List[Tuple[str, Optional[str], Optional[datetime], Optional[datetime]]]:
+    """
+    Sub-windows of [after, before), newest first, as (fetch after, fetch before, keep from, keep until).
+    Inner edges are fetched SLICE_OVERLAP wider and trimmed back to the keep bounds; the outer edges
+    keep the caller's bounds untouched, so an open-ended window stays open.
+    """
+    windows = split_window(after, before, time_slices)
+    last = len(windows) - 1
+    plan: List[Tuple[str, Optional[str], Optional[datetime], Optional[datetime]]] = []
+    for i in reversed(range(len(windows))):
+        lo, hi = parse_iso8601(windows[i][0]), parse_iso8601(windows[i][1])
+        plan.append(
+            (
+                after if i == 0 else format_iso8601(lo - SLICE_OVERLAP),
+                before if i == last else format_iso8601(hi + SLICE_OVERLAP),
+                lo if i > 0 else None,
+                hi if i < last else None,
+            )
+        )
+    return plan
+
+
+def iter_sliced_events(
+    cfg: PostHogConfig,
+    event_names: Tuple[str, ...],
+    *,
+    after: str,
+    before: Optional[str],
+    limit: int,
+    verbose: bool,
+    concurrency: int,
+    time_slices: int,
+    after_by_event: Optional[Dict[str, str]] = None,
+    checkpoint: Optional[ExportCheckpoint] = None,
+    transport: Optional[AsyncTransport] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Splits [after, before) into `time_slices` sub-windows per event name and pages them in parallel.
+
+    Like the events list, each event name is yielded newest first: sub-windows are fetched and
+    yielded newest first, each sorted by timestamp descending (names follow one another in
+    `event_names` order).
+    """
+    plans = {name: _slice_plan((after_by_event or {}).get(name, after), before, time_slices) for name in event_names}
+
+    def stream(task: Tuple[str, int]) -> Dict[str, Any]:
+        name, i = task
+        fetch_after, fetch_before, _lo, _hi = plans[name][i]
+        return dict(event_name=name, after=fetch_after, before=fetch_before, limit=limit, verbose=verbose, checkpoint=checkpoint)
+
+    def trim(task: Tuple[str, int], events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        name, i = task
+        _after, _before, lo, hi = plans[name][i]
+        evs = [ev for ev in events if _in_window(ev, lo, hi)]
+        evs.sort(key=_event_sort_key, reverse=True)
+        return evs
+
+    def fetch(task: Tuple[str, int]) -> List[Dict[str, Any]]:
+        return trim(task, iter_events(cfg, **stream(task)))
+
+    tasks = [(name, i) for name in event_names for i in range(len(plans[name]))]
+    workers = max(1, concurrency)
+    if transport is not None:
+        for task, events in zip(tasks, transport.map_streams(cfg, [stream(task) for task in tasks], workers)):
+            yield from trim(task, events)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from _map_ordered(pool, fetch, tasks, lookahead=workers * 2)
+
+
+# Rows per HogQL page; far larger than an events-list page since only a few columns come back.
+QUERY_PAGE_ROWS = 10_000
+
+
+def hogql_str(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def build_hogql_events_query(
+    event_names: Tuple[str, ...],
+    properties: Tuple[str, ...],
+    *,
+    after: str,
+    before: str,
+    after_by_event: Dict[str, str],
+    limit: int,
+    cursor: Optional[Tuple[str, str]] = None,
+) -> str:
+    """
+    One page of events as HogQL. Properties are projected as raw JSON (HogQL's properties.x is a
+    string), and `cursor` is the (timestamp, uuid) of the previous page's last row, so each page
+    is a keyset seek rather than an OFFSET that rescans the earlier rows.
+    """
+    columns = ["uuid", "event", "timestamp", "distinct_id"] + [
+        f"JSONExtractRaw(properties, {hogql_str(name)})" for name in properties
+    ]
+    plain = [name for name in event_names if name not in after_by_event]
+    event_filters: List[str] = []
+    if plain:
+        event_filters.append(f"event IN ({', '.join(hogql_str(name) for name in plain)})")
+    for name, start in after_by_event.items():
+        if name in event_names:
+            event_filters.append(f"(event = {hogql_str(name)} AND timestamp >= toDateTime({hogql_str(start)}))")
+    where = [
+        f"({' OR '.join(event_filters)})",
+        f"timestamp >= toDateTime({hogql_str(after)})",
+        f"timestamp < toDateTime({hogql_str(before)})",
+    ]
+    if cursor is not None:
+        ts, uuid = (hogql_str(v) for v in cursor)
+        where.append(
+            f"(timestamp < toDateTime({ts}) OR (timestamp = toDateTime({ts}) AND uuid < toUUID({uuid})))"
+        )
+    # Newest first, like the events list, so unsorted outputs keep their row order.
+    return (
+        f"SELECT {', '.join(columns)} FROM events WHERE {' AND '.join(where)} "
+        f"ORDER BY timestamp DESC, uuid DESC LIMIT {int(limit)}"
+    )
+
+
+def _event_from_query_row(row: List[Any], properties: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Rebuilds an events-list shaped dict from a HogQL row so the flatteners work unchanged.
+    Property values arrive as raw JSON ('' when unset) and are decoded back to their types.
+    """
+    uuid, event, ts, distinct_id, *values = row
+    if isinstance(ts, str) and ts:
+        # Same rendering as the events list (e.g. 2026-01-24T10:11:12.345000+00:00).
+        ts = parse_iso8601(ts).isoformat(timespec="microseconds")
+    props: Dict[str, Any] = {}
+    for name, raw in zip(properties, values):
+        if isinstance(raw, str) and raw:
+            props[name] = json.loads(raw)
+    return {
+        "id": str(uuid),
+        "event": event,
+        "distinct_id": distinct_id,
+        "properties": props,
+        "timestamp": ts,
+    }
+
+
+def iter_query_events(
+    cfg: PostHogConfig,
+    event_names: Tuple[str, ...],
+    properties: Tuple[str, ...],
+    *,
+    after: str,
+    before: Optional[str],
+    verbose: bool,
+    concurrency: int = 1,
+    after_by_event: Optional[Dict[str, str]] = None,
+    page_rows: int = QUERY_PAGE_ROWS,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Fetches events through HogQL queries against the query API instead of the events list.
+
+    The window is chunked by day and only `properties` are projected, so far fewer bytes and
+    requests are needed. Chunks are yielded newest first, each ordered newest first.
+    """
+    end = before or iso_now_utc()
+    days = max(1, math.ceil((parse_iso8601(end) - parse_iso8601(after)).total_seconds() / 86400))
+    windows = list(reversed(split_window(after, end, days)))
+    overrides = after_by_event or {}
+
+    def fetch(window: Tuple[str, str]) -> List[Dict[str, Any]]:
+        lo, hi = window
+        session = get_session()
+        events: List[Dict[str, Any]] = []
+        cursor: Optional[Tuple[str, str]] = None
+        page = 0
+        while True:
+            page += 1
+            query = build_hogql_events_query(
+                event_names,
+                properties,
+                after=lo,
+                before=hi,
+                after_by_event=overrides,
+                limit=page_rows,
+                cursor=cursor,
+            )
+            data = request_json(
+                session,
+                cfg.query_url,
+                headers=cfg.headers,
+                timeout_s=cfg.timeout_s,
+                max_retries=cfg.max_retries,
+                backoff_s=cfg.backoff_s,
+                verbose=verbose,
+                method="POST",
+                json_body={"query": {"kind": "HogQLQuery", "query": query}},
+            )
+            results = data.get("results") or []
+            if verbose:
+                print(f"[posthog] query {lo}..{hi}: page {page} -> {len(results)} rows", file=sys.stderr)
+            events.extend(_event_from_query_row(row, properties) for row in results if isinstance(row, list))
+            if len(results) < page_rows or not events:
+                return events
+            cursor = (events[-1]["timestamp"], events[-1]["id"])
+
+    workers = max(1, concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from _map_ordered(pool, fetch, windows, lookahead=workers * 2)
+
+
+# A day is only cached once it ended this long ago, leaving room for late-ingested events.
+CACHE_SETTLE = timedelta(hours=2)
+CACHE_MAX_MB = 2048
+CACHE_FETCH_DAYS = 7
+
+
+class EventCache:
+    """
+    On-disk store of raw events per event name and UTC day (gzip JSONL).
+
+    Only closed days are stored, so a cached day is complete and never fetched again. Reading a
+    day refreshes its mtime; evict() drops the least recently used days once the cache is larger
+    than `max_bytes`.
+    """
+
+    def __init__(self, directory: str, *, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, event_name: str, day: str) -> str:
+        return os.path.join(self.directory, event_name, f"{day}.jsonl.gz")
+
+    def has(self, event_name: str, day: str) -> bool:
+        return os.path.exists(self.path(event_name, day))
+
+    def read(self, event_name: str, day: str) -> List[Dict[str, Any]]:
+        path = self.path(event_name, day)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        with suppress(FileNotFoundError):
+            os.utime(path)
+        return events
+
+    def write(self, event_name: str, day: str, events: List[Dict[str, Any]]) -> None:
+        path = self.path(event_name, day)
+        ensure_dir(os.path.dirname(path))
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for ev in events:
+                f.write(json_dumps(ev))
+                f.write("\n")
+        os.replace(tmp, path)
+
+    def evict(self, *, verbose: bool = False) -> None:
+        with self._lock:
+            files: List[Tuple[float, int, str]] = []
+            for root, _dirs, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith(".jsonl.gz"):
+                        path = os.path.join(root, name)
+                        st = os.stat(path)
+                        files.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _mtime, size, _path in files)
+            for _mtime, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                if verbose:
+                    print(f"[cache] evicted {os.path.relpath(path, self.directory)}", file=sys.stderr)
+
+
+def iter_cached_events(
+    cfg: PostHogConfig,
+    event_names: Tuple[str, ...],
+    cache: EventCache,
+    *,
+    after: str,
+    before: Optional[str],
+    limit: int,
+    verbose: bool,
+    concurrency: int = 1,
+    time_slices: int = 1,
+    after_by_event: Optional[Dict[str, str]] = None,
+    checkpoint: Optional[ExportCheckpoint] = None,
+    transport: Optional[AsyncTransport] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Serves each (event name, UTC day) of the window from `cache`, fetching only missing days.
+
+    Runs of up to CACHE_FETCH_DAYS missing closed days are fetched whole in one stream, split
+    per day and cached (empty days included), so later runs with any window inside them stay
+    offline. The still-open day is fetched for the requested range only and never cached.
+    With time_slices > 1 each fetch is itself split into sub-windows (as in iter_sliced_events).
+    Cache reads and sub-window fetches all run on one pool of max(concurrency, time_slices)
+    workers, so the two settings never multiply into nested pools.
+    Events without a usable timestamp cannot be placed in a day and are dropped from fetched closed days.
+    Like the events list, each event name is yielded newest first.
+    With a `transport` the worker threads' fetches share its connections.
+    """
+    now = datetime.now(tz=timezone.utc)
+    end = parse_iso8601(before) if before else now
+    one_day = timedelta(days=1)
+
+    def is_closed(day_start: datetime) -> bool:
+        return day_start + one_day + CACHE_SETTLE <= now
+
+    # (event name, days to cover, window start) in yield order.
+    tasks: List[Tuple[str, List[datetime], datetime]] = []
+    for name in event_names:
+        start = parse_iso8601((after_by_event or {}).get(name, after))
+        name_tasks: List[Tuple[str, List[datetime], datetime]] = []
+        missing: List[datetime] = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end:
+            key = day.strftime("%Y-%m-%d")
+            if is_closed(day) and not cache.has(name, key):
+                missing.append(day)
+                if len(missing) >= CACHE_FETCH_DAYS:
+                    name_tasks.append((name, missing, start))
+                    missing = []
+            else:
+                if missing:
+                    name_tasks.append((name, missing, start))
+                    missing = []
+                name_tasks.append((name, [day], start))
+            day += one_day
+        if missing:
+            name_tasks.append((name, missing, start))
+        tasks.extend(reversed(name_tasks))
+
+    # Per task: None to read it from the cache, else its sub-windows to fetch.
+    plans: List[Optional[List[Tuple[str, Optional[str], Optional[datetime], Optional[datetime]]]]] = []
+    for name, days, start in tasks:
+        lo, hi = days[0], days[-1] + one_day
+        if len(days) == 1 and is_closed(lo) and cache.has(name, lo.strftime("%Y-%m-%d")):
+            plans.append(None)
+            continue
+        fetch_lo, fetch_hi = (lo, hi) if is_closed(lo) else (max(lo, start), min(hi, end))
+        plans.append(_slice_plan(format_iso8601(fetch_lo), format_iso8601(fetch_hi), time_slices))
+    units = [(t, i) for t, plan in enumerate(plans) for i in range(len(plan) if plan is not None else 1)]
+
+    def fetch(unit: Tuple[int, int]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+        t, i = unit
+        name, days, _start = tasks[t]
+        plan = plans[t]
+        if plan is None:
+            return [(t, cache.read(name, days[0].strftime("%Y-%m-%d")))]
+        fetch_after, fetch_before, keep_lo, keep_hi = plan[i]
+        pager = transport.iter_events if transport is not None else iter_events
+        events = pager(
+            cfg, event_name=name, after=fetch_after, before=fetch_before, limit=limit, verbose=verbose, checkpoint=checkpoint
+        )
+        return [(t, [ev for ev in events if _in_window(ev, keep_lo, keep_hi)])]
+
+    def finish(t: int, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        name, days, start = tasks[t]
+        lo, hi = days[0], days[-1] + one_day
+        if plans[t] is not None and is_closed(lo):
+            by_day: Dict[str, List[Dict[str, Any]]] = {d.strftime("%Y-%m-%d"): [] for d in days}
+            kept: List[Dict[str, Any]] = []
+            for ev in events:
+                ts = extract_timestamp(ev)
+                try:
+                    day_events = by_day.get(parse_iso8601(ts).strftime("%Y-%m-%d")) if ts else None
+                except ValueError:
+                    day_events = None
+                if day_events is not None:
+                    day_events.append(ev)
+                    kept.append(ev)
+            if verbose and len(kept) < len(events):
+                print(f"[cache] {name}: dropped {len(events) - len(kept)} events without a timestamp in the fetched days", file=sys.stderr)
+            for day_key, day_events in by_day.items():
+                day_events.sort(key=_event_sort_key)
+                cache.write(name, day_key, day_events)
+            events = kept
+        if start > lo or end < hi:
+            events = [ev for ev in events if _in_window(ev, start, end)]
+        events.sort(key=_event_sort_key, reverse=True)
+        return events
+
+    workers = max(1, concurrency, time_slices)
+    parts: List[Dict[str, Any]] = []
+    received = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for t, events in _map_ordered(pool, fetch, units, lookahead=workers * 2):
+            parts.extend(events)
+            received += 1
+            if received == (len(plans[t]) if plans[t] is not None else 1):
+                yield from finish(t, parts)
+                parts, received = [], 0
+    cache.evict(verbose=verbose)
+
+
+@contextmanager
+def atomic_open(path: str, *, newline: Optional[str] = None) -> Iterator[IO[str]]:
+    """
+    Writes to a temp file next to `path` and renames it into place only once the write succeeded.
+    """
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", newline=newline, encoding="utf-8") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+
+def write_jsonl(path: str, rows: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    with atomic_open(path) as f:
+        for ev in rows:
+            f.write(json_dumps(ev))
+            f.write("\n")
+            count += 1
+    return count
+
+
+class JsonlTee:
+    """
+    Writes each event to an open JSONL file as it passes through, so one pass feeds every output.
+    """
+
+    def __init__(self, f: IO[str]) -> None:
+        self.f = f
+        self.count = 0
+
+    def __call__(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for ev in events:
+            self.f.write(json_dumps(ev))
+            self.f.write("\n")
+            self.count += 1
+            yield ev
+
+
+def append_jsonl(path: str, rows: Iterable[Dict[str, Any]]) -> int:
+    count = 0
+    with atomic_open(path) as f:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as existing:
+                shutil.copyfileobj(existing, f)
+        for ev in rows:
+            f.write(json_dumps(ev))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+class HighWaterMarks:
+    """
+    Newest exported timestamp per event name, plus the event ids seen at exactly that timestamp.
+
+    Persisted as JSON under --outdir so an incremental run only asks PostHog for newer events
+    and drops the ones it already has from the overlap. `since` is the window start of the run
+    that started the state (and the raw store with it): the store holds every event from there on.
+    """
+
+    def __init__(self, path: str, *, after: str) -> None:
+        self.path = path
+        self.loaded = False
+        self.marks: Dict[str, Dict[str, Any]] = {}
+        self.since: Optional[str] = after
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("events"), dict):
+            self.marks = data["events"]
+            self.loaded = True
+            # None for states written before `since` was recorded.
+            self.since = data.get("since")
+        self._previous: Dict[str, Tuple[datetime, Set[str]]] = {}
+        for name, mark in self.marks.items():
+            ts = mark.get("last_timestamp")
+            if isinstance(ts, str) and ts:
+                self._previous[name] = (parse_iso8601(ts), set(mark.get("last_ids") or []))
+
+    def after_by_event(self, after: str) -> Dict[str, str]:
+        start = parse_iso8601(after)
+        out: Dict[str, str] = {}
+        for name, (last_dt, _ids) in self._previous.items():
+            if last_dt > start:
+                # `after` is inclusive, so the events at exactly the mark are fetched again; skip_seen()
+                # drops the ones whose ids it already has.
+                out[name] = format_iso8601(last_dt)
+        return out
+
+    def skip_seen(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Yields only events newer than the previous run's marks, advancing the marks as it goes.
+        """
+        current: Dict[str, Tuple[datetime, Set[str]]] = {
+            name: (dt, set(ids)) for name, (dt, ids) in self._previous.items()
+        }
+        for ev in events:
+            name = str(ev.get("event") or "")
+            ev_id = str(ev.get("id") or "")
+            ts = extract_timestamp(ev)
+            try:
+                dt = parse_iso8601(ts) if ts else None
+            except ValueError:
+                dt = None
+            if dt is None:
+                yield ev
+                continue
+            prev = self._previous.get(name)
+            if prev is not None and (dt < prev[0] or (dt == prev[0] and ev_id in prev[1])):
+                continue
+            cur = current.get(name)
+            if cur is None or dt > cur[0]:
+                current[name] = (dt, {ev_id})
+            elif dt == cur[0]:
+                cur[1].add(ev_id)
+            yield ev
+        for name, (dt, ids) in current.items():
+            self.marks[name] = {"last_timestamp": format_iso8601(dt), "last_ids": sorted(i for i in ids if i)}
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": iso_now_utc(), "since": self.since, "events": self.marks}, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+PARQUET_BATCH_ROWS = 50_000
+
+
+def _import_pyarrow() -> Tuple[Any, Any, Any]:
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as pads
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("--format parquet needs pyarrow: pip install pyarrow") from None
+    return pa, pads, pq
+
+
+class ParquetDatasetWriter:
+    """
+    Streams rows into a (hive-partitioned) Parquet dataset directory in batches of `batch_rows`.
+
+    `fields` are (name, type) pairs, type being one of string/int64/float64/timestamp (UTC, us).
+    The dataset is built next to `path` and swapped into place on close(); abort() discards it.
+    pyarrow is optional and only imported here.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fields: Tuple[Tuple[str, str], ...],
+        *,
+        partition_cols: Tuple[str, ...] = (),
+        batch_rows: int = PARQUET_BATCH_ROWS,
+    ) -> None:
+        self.pa, self._pads, self._pq = _import_pyarrow()
+        pa = self.pa
+        types = {
+            "string": pa.string(),
+            "int64": pa.int64(),
+            "float64": pa.float64(),
+            "timestamp": pa.timestamp("us", tz="UTC"),
+        }
+        self.path = path
+        self.schema = pa.schema([(name, types[kind]) for name, kind in fields])
+        self.partitioning = (
+            self._pads.partitioning(pa.schema([(c, pa.string()) for c in partition_cols]), flavor="hive")
+            if partition_cols
+            else None
+        )
+        self.batch_rows = batch_rows
+        self.count = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._batches = 0
+        self._tmp = f"{path}.tmp"
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        ensure_dir(self._tmp)
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self._batch.append(row)
+        self.count += 1
+        if len(self._batch) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        table = self.pa.Table.from_pylist(self._batch, schema=self.schema)
+        if self.partitioning is None:
+            self._pq.write_table(table, os.path.join(self._tmp, f"part-{self._batches}.parquet"))
+        else:
+            self._pads.write_dataset(
+                table,
+                self._tmp,
+                format="parquet",
+                partitioning=self.partitioning,
+                basename_template=f"part-{self._batches}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+        self._batches += 1
+        self._batch = []
+
+    def close(self) -> None:
+        if self._batch or not self._batches:
+            # An empty export still gets one (schema-only) file so readers find the columns.
+            self._flush()
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._tmp, self.path)
+
+    def abort(self) -> None:
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+def write_parquet_dataset(
+    path: str,
+    rows: Iterable[Dict[str, Any]],
+    fields: Tuple[Tuple[str, str], ...],
+    *,
+    partition_cols: Tuple[str, ...] = (),
+) -> int:
+    writer = ParquetDatasetWriter(path, fields, partition_cols=partition_cols)
+    try:
+        for r in rows:
+            writer.add(r)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer.count
+
+
+def write_csv(path: str, rows: Iterable[Dict[str, Any]], fieldnames: Optional[Tuple[str, ...]] = None) -> int:
+    """
+    Writes rows as CSV. Without `fieldnames` the header comes from the first row, and an empty
+    input produces an empty file.
+    """
+    rows_iter = iter(rows)
+    if fieldnames is None:
+        try:
+            first = next(rows_iter)
+        except StopIteration:
+            with atomic_open(path, newline="") as f:
+                f.write("")
+            return 0
+        fieldnames = tuple(first.keys())
+        rows_iter = itertools.chain([first], rows_iter)
+
+    count = 0
+    with atomic_open(path, newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(fieldnames), extrasaction="ignore")
+        w.writeheader()
+        for r in rows_iter:
+            w.writerow(r)
+            count += 1
+    return count
+
+
+def extract_distinct_id(ev: Dict[str, Any]) -> Optional[str]:
+    distinct_id = ev.get("distinct_id")
+    if isinstance(distinct_id, str) and distinct_id:
+        return distinct_id
+    props = ev.get("properties") or {}
+    if isinstance(props, dict):
+        v = props.get("distinct_id")
+        if isinstance(v, str) and v:
+            return v
+    return None
+
+
+def extract_timestamp(ev: Dict[str, Any]) -> Optional[str]:
+    ts = ev.get("timestamp")
+    if isinstance(ts, str) and ts:
+        return ts
+    props = ev.get("properties") or {}
+    if isinstance(props, dict):
+        v = props.get("timestamp")
+        if isinstance(v, str) and v:
+            return v
+    return None
+
+
+def add_export_args(p: argparse.ArgumentParser) -> None:
+    """
+    Options shared by every exporter: window, paging strategy, outputs and credentials.
+    """
+    p.add_argument("--after", required=True, help="Start (inclusive). Accepts YYYY-MM-DD or ISO datetime.")
+    p.add_argument("--before", default=None, help="End (exclusive). Accepts YYYY-MM-DD or ISO datetime.")
+    p.add_argument("--outdir", default="posthog/exports", help="Output directory (default: posthog/exports).")
+    p.add_argument("--limit", type=int, default=200, help="Initial page size for API requests (default: 200).")
+    p.add_argument(
+        "--min-limit",
+        type=int,
+        default=50,
+        help="Smallest page size the events list shrinks to after slow pages, timeouts or 5xx (default: 50).",
+    )
+    p.add_argument(
+        "--max-limit",
+        type=int,
+        default=1000,
+        help="Largest page size the events list grows to (default: 1000); equal --min/--max-limit fix the size.",
+    )
+    p.add_argument("--concurrency", type=int, default=1, help="Page up to N event names in parallel (default: 1, serial).")
+    p.add_argument(
+        "--time-slices",
+        type=int,
+        default=1,
+        help="Split the window (or each uncached run of days) into N sub-windows per event name, fetched in parallel (default: 1).",
+    )
+    p.add_argument(
+        "--backend",
+        choices=("events", "query"),
+        default="events",
+        help="'events' pages the events list; 'query' runs day-chunked HogQL queries fetching only the needed columns.",
+    )
+    p.add_argument(
+        "--transport",
+        choices=("sync", "async"),
+        default="sync",
+        help="HTTP transport for the events backend: 'sync' (requests, default) or 'async' (httpx, HTTP/2 multiplexed; sync without httpx).",
+    )
+    p.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Where --cache keeps its per-day raw events (default: <outdir>/.cache).",
+    )
+    p.add_argument(
+        "--cache",
+        action="store_true",
+        help=(
+            "Serve closed days (ended over 2h ago) from a per-day raw event cache and fetch only the missing ones "
+            "(events backend only). Cached days are never refetched, so late or deleted events are not picked up."
+        ),
+    )
+    p.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=CACHE_MAX_MB,
+        help=f"With --cache, evict least recently used cached days beyond this size (default: {CACHE_MAX_MB}).",
+    )
+    p.add_argument(
+        "--format",
+        choices=("csv", "jsonl", "both", "parquet"),
+        default="csv",
+        help="Write raw JSONL and/or CSV outputs, or typed Parquet datasets (needs pyarrow).",
+    )
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch events newer than the last run (state file under --outdir) and merge them into stable-named outputs.",
+    )
+    p.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Spool fetched pages under --outdir so an interrupted export can be continued with --resume.",
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted --checkpoint export from its last checkpointed page (implies --checkpoint).",
+    )
+    p.add_argument("--stable-names", action="store_true", help="Write stable filenames (no timestamp), overwriting on each run.")
+    p.add_argument(
+        "--prometheus-dir",
+        default=None,
+        help="Also write the run metrics as posthog_export_<exporter>.prom here (node_exporter textfile collector).",
+    )
+    p.add_argument("--host", default=os.getenv("POSTHOG_HOST", ""), help="PostHog app host (default: EU cloud).")
+    p.add_argument("--project-id", default=os.getenv("POSTHOG_PROJECT_ID", ""), help="PostHog project ID.")
+    p.add_argument("--api-key", default=os.getenv("POSTHOG_PERSONAL_API_KEY", ""), help="PostHog personal API key.")
+    p.add_argument("--verbose", action="store_true", help="Print progress to stderr.")
+
+
+def config_from_args(args: argparse.Namespace) -> PostHogConfig:
+    host = normalize_host(args.host)
+    if not args.project_id:
+        raise SystemExit("Missing PostHOG project id: set POSTHOG_PROJECT_ID or pass --project-id")
+    if not args.api_key:
+        raise SystemExit("Missing PostHOG personal api key: set POSTHOG_PERSONAL_API_KEY or pass --api-key")
+    return PostHogConfig(
+        host=host,
+        project_id=str(args.project_id),
+        personal_api_key=str(args.api_key),
+        min_limit=args.min_limit,
+        max_limit=args.max_limit,
+    )
+
+
+def output_suffix(args: argparse.Namespace) -> str:
+    """
+    Filename suffix for this run: empty for stable/incremental outputs, else the run stamp.
+    """
+    if args.stable_names or args.incremental:
+        return ""
+    stamp = (os.getenv("POSTHOG_EXPORT_STAMP") or "").strip()
+    if not stamp:
+        stamp = iso_now_utc().replace(":", "").replace("-", "")
+    return f"_{stamp}"
+
+
+def open_checkpoint(args: argparse.Namespace, name: str) -> Optional[ExportCheckpoint]:
+    """
+    The run's page checkpoint in <outdir>/<name> with --checkpoint or --resume, else None.
+    """
+    if not (args.checkpoint or args.resume):
+        return None
+    return ExportCheckpoint(os.path.join(args.outdir, name), resume=args.resume)
+
+
+def write_run_metrics(args: argparse.Namespace, path: str, *, exporter: str, ok: bool) -> None:
+    """
+    Writes this run's metrics summary as JSON to `path` and, with --prometheus-dir, as a textfile.
+    """
+    summary = get_metrics().summary(exporter=exporter, ok=ok)
+    with atomic_open(path) as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+    if args.prometheus_dir:
+        ensure_dir(args.prometheus_dir)
+        with atomic_open(os.path.join(args.prometheus_dir, f"posthog_export_{exporter}.prom")) as f:
+            f.write(metrics_to_prometheus(summary))
+    if args.verbose:
+        print(f"[done] wrote run metrics -> {path}", file=sys.stderr)
+
+
+def iter_export_events(
+    cfg: PostHogConfig,
+    args: argparse.Namespace,
+    event_names: Tuple[str, ...],
+    query_properties: Tuple[str, ...],
+    *,
+    after: str,
+    before: Optional[str],
+    marks: Optional[HighWaterMarks],
+    checkpoint: Optional[ExportCheckpoint],
+) -> Iterator[Dict[str, Any]]:
+    """
+    Raw event stream for an exporter, through the backend and paging options chosen on the CLI.
+    """
+    window = dict(after=after, before=before, marks=marks, checkpoint=checkpoint)
+    if args.transport == "async" and args.backend == "events" and importlib.util.find_spec("httpx") is None:
+        print("[posthog] --transport async needs httpx (pip install 'httpx[http2]'); using the sync transport", file=sys.stderr)
+    elif args.transport == "async" and args.backend == "events":
+        from posthog_async import AsyncTransport
+
+        transport = AsyncTransport(cfg)
+        events = _iter_export_events(cfg, args, event_names, query_properties, transport=transport, **window)
+        return _closing_transport(transport, events)
+    return _iter_export_events(cfg, args, event_names, query_properties, **window)
+
+
+def _closing_transport(transport: AsyncTransport, events: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    with transport:
+        yield from events
+
+
+def _iter_export_events(
+    cfg: PostHogConfig,
+    args: argparse.Namespace,
+    event_names: Tuple[str, ...],
+    query_properties: Tuple[str, ...],
+    *,
+    after: str,
+    before: Optional[str],
+    marks: Optional[HighWaterMarks],
+    checkpoint: Optional[ExportCheckpoint],
+    transport: Optional[AsyncTransport] = None,
+) -> Iterator[Dict[str, Any]]:
+    after_by_event = marks.after_by_event(after) if marks else None
+    if args.backend == "query":
+        return iter_query_events(
+            cfg,
+            event_names,
+            query_properties,
+            after=after,
+            before=before,
+            verbose=args.verbose,
+            concurrency=args.concurrency,
+            after_by_event=after_by_event,
+        )
+    if args.cache:
+        cache = EventCache(args.cache_dir or os.path.join(args.outdir, ".cache"), max_bytes=args.cache_max_mb * 1024 * 1024)
+        return iter_cached_events(
+            cfg,
+            event_names,
+            cache,
+            after=after,
+            before=before,
+            limit=args.limit,
+            verbose=args.verbose,
+            concurrency=args.concurrency,
+            time_slices=args.time_slices,
+            after_by_event=after_by_event,
+            checkpoint=checkpoint,
+            transport=transport,
+        )
+    return collect_events(
+        cfg,
+        event_names,
+        after=after,
+        before=before,
+        limit=args.limit,
+        verbose=args.verbose,
+        concurrency=args.concurrency,
+        time_slices=args.time_slices,
+        after_by_event=after_by_event,
+        checkpoint=checkpoint,
+        transport=transport,
+    )
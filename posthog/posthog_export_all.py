@@ -0,0 +1,257 @@
+"""
+Export the survey and badge interaction reports from a single PostHog fetch.
+
+BADGE_EVENTS already covers every SURVEY_EVENTS name, so the union is fetched exactly once and
+the stream is fanned out to every report in one pass.
+
+Outputs:
+- badge_survey_responses*.csv, badge_survey_locations*.csv: as posthog_export_survey.py
+- badge_interactions*.csv: as posthog_export_badge_interactions.py
+- badge_interactions_raw*.jsonl (optional): raw PostHog events for all of the above
+- badge_hover_report*.csv, badge_feedback_prompt_report*.csv (--hover-report): as posthog_export_badge_interactions.py
+- with --format parquet, each report is a Parquet dataset of the same name instead of a CSV
+- export_all_metrics*.json: run metrics (requests, retries, latency, phase times, peak RSS)
+
+Incremental runs share badge_interactions_state.json and the raw JSONL store with
+posthog_export_badge_interactions.py, since both cover the same events.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import posthog_export_badge_interactions as badges
+import posthog_export_survey as survey
+from posthog_client import (
+    HighWaterMarks,
+    JsonlTee,
+    ParquetDatasetWriter,
+    add_export_args,
+    append_jsonl,
+    atomic_open,
+    config_from_args,
+    ensure_dir,
+    get_metrics,
+    iso_now_utc,
+    iter_export_events,
+    open_checkpoint,
+    output_suffix,
+    read_jsonl,
+    to_iso8601,
+    write_csv,
+    write_jsonl,
+    write_parquet_dataset,
+    write_run_metrics,
+)
+
+
+EXPORT_EVENTS: Tuple[str, ...] = badges.BADGE_EVENTS + tuple(
+    name for name in survey.SURVEY_EVENTS if name not in badges.BADGE_EVENTS
+)
+QUERY_PROPERTIES: Tuple[str, ...] = badges.QUERY_PROPERTIES + tuple(
+    name for name in survey.QUERY_PROPERTIES if name not in badges.QUERY_PROPERTIES
+)
+
+
+def write_reports(
+    events: Iterable[Dict[str, Any]],
+    *,
+    responses_path: str,
+    locations_path: str,
+    badge_csv_path: str,
+) -> Tuple[int, int, int]:
+    """
+    One pass over `events` feeds every report: survey responses stream straight to CSV while the
+    location counts and the badge rows' external sort accumulate alongside.
+    """
+    counter = survey.LocationCounter()
+    metrics = get_metrics()
+    with badges.ChronologicalRows() as badge_rows:
+
+        def fan_out(evs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            for ev in evs:
+                counter.add(ev)
+                row = badges.flatten_badge_event(ev)
+                if row is not None:
+                    badge_rows.add(row)
+                yield ev
+
+        n_resp = write_csv(responses_path, survey.iter_responses(metrics.timed("flatten", fan_out(events))))
+        n_loc = write_csv(locations_path, counter.rows())
+        n_badge = write_csv(badge_csv_path, badge_rows.merged(), badges.CSV_FIELDS)
+    return n_resp, n_loc, n_badge
+
+
+def write_parquet_reports(
+    events: Iterable[Dict[str, Any]],
+    *,
+    responses_path: str,
+    locations_path: str,
+    badge_csv_path: str,
+) -> Tuple[int, int, int]:
+    """
+    write_reports() for --format parquet. Badge rows go straight to their dataset writer,
+    so no external sort is needed (readers order by time_utc).
+    """
+    counter = survey.LocationCounter()
+    metrics = get_metrics()
+    badge_rows = ParquetDatasetWriter(
+        badge_csv_path, badges.PARQUET_FIELDS, partition_cols=badges.PARQUET_PARTITIONS
+    )
+
+    def fan_out(evs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for ev in evs:
+            counter.add(ev)
+            row = badges.typed_badge_row(ev)
+            if row is not None:
+                badge_rows.add(row)
+            yield ev
+
+    try:
+        flattened = metrics.timed("flatten", fan_out(events))
+        responses = (survey.typed_response(r) for r in survey.iter_responses(flattened))
+        n_resp = write_parquet_dataset(
+            responses_path, responses, survey.RESPONSE_PARQUET_FIELDS, partition_cols=("day",)
+        )
+        n_loc = write_parquet_dataset(locations_path, counter.rows(), survey.LOCATION_PARQUET_FIELDS)
+    except BaseException:
+        badge_rows.abort()
+        raise
+    badge_rows.close()
+    return n_resp, n_loc, badge_rows.count
+
+
+def write_outputs(
+    args: argparse.Namespace,
+    raw_iter: Iterable[Dict[str, Any]],
+    *,
+    raw_path: str,
+    responses_path: str,
+    locations_path: str,
+    badge_csv_path: str,
+    marks: Optional[HighWaterMarks],
+) -> None:
+    paths = {"responses_path": responses_path, "locations_path": locations_path, "badge_csv_path": badge_csv_path}
+    n_raw: Optional[int] = None
+    counts: Optional[Tuple[int, int, int]] = None
+    reports = write_parquet_reports if args.format == "parquet" else write_reports
+
+    if marks is not None:
+        # The raw JSONL is the merge base: append the new events, then rebuild the reports from it.
+        write_raw = append_jsonl if marks.loaded else write_jsonl
+        n_raw = write_raw(raw_path, marks.skip_seen(raw_iter))
+        marks.save()
+        if args.format != "jsonl":
+            counts = reports(read_jsonl(raw_path), **paths)
+    elif args.format == "jsonl":
+        n_raw = write_jsonl(raw_path, raw_iter)
+    elif args.format in ("csv", "parquet"):
+        counts = reports(raw_iter, **paths)
+    else:
+        # both: tee the raw events to JSONL as they stream into the reports.
+        with atomic_open(raw_path) as raw_f:
+            tee = JsonlTee(raw_f)
+            counts = write_reports(tee(raw_iter), **paths)
+        n_raw = tee.count
+
+    if args.verbose:
+        if n_raw is not None:
+            verb = "appended" if marks is not None else "wrote"
+            print(f"[done] {verb} {n_raw} raw events -> {raw_path}", file=sys.stderr)
+        if counts is not None:
+            n_resp, n_loc, n_badge = counts
+            print(f"[done] wrote {n_resp} survey responses -> {responses_path}", file=sys.stderr)
+            print(f"[done] wrote {n_loc} location summary rows -> {locations_path}", file=sys.stderr)
+            print(f"[done] wrote {n_badge} badge interaction rows -> {badge_csv_path}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Export survey and badge interaction reports from one PostHog fetch.")
+    add_export_args(p)
+    p.add_argument(
+        "--hover-report",
+        action="store_true",
+        help="Also write sessionised hover analytics (badge_hover_report*.csv, badge_feedback_prompt_report*.csv).",
+    )
+    args = p.parse_args(argv)
+
+    cfg = config_from_args(args)
+    after = to_iso8601(args.after)
+    before = to_iso8601(args.before) if args.before else None
+
+    ensure_dir(args.outdir)
+    suffix = output_suffix(args)
+    raw_path = os.path.join(args.outdir, f"badge_interactions_raw{suffix}.jsonl")
+    ext = "parquet" if args.format == "parquet" else "csv"
+    responses_path = os.path.join(args.outdir, f"badge_survey_responses{suffix}.{ext}")
+    locations_path = os.path.join(args.outdir, f"badge_survey_locations{suffix}.{ext}")
+    badge_csv_path = os.path.join(args.outdir, f"badge_interactions{suffix}.{ext}")
+    hover_path = os.path.join(args.outdir, f"badge_hover_report{suffix}.csv")
+    prompt_path = os.path.join(args.outdir, f"badge_feedback_prompt_report{suffix}.csv")
+    metrics_path = os.path.join(args.outdir, f"export_all_metrics{suffix}.json")
+    checkpoint = open_checkpoint(args, ".checkpoint_export_all")
+    if checkpoint is not None:
+        if args.time_slices > 1 and before is None:
+            # Slice boundaries must not move between an interrupted run and its --resume.
+            before = iso_now_utc()
+        after, before = checkpoint.window(after, before)
+    marks = HighWaterMarks(os.path.join(args.outdir, "badge_interactions_state.json"), after=after) if args.incremental else None
+
+    metrics = get_metrics()
+    raw_iter = iter_export_events(
+        cfg,
+        args,
+        EXPORT_EVENTS,
+        QUERY_PROPERTIES,
+        after=after,
+        before=before,
+        marks=marks,
+        checkpoint=checkpoint,
+    )
+    raw_iter = metrics.timed("fetch", raw_iter)
+
+    sessions = badges.HoverSessions() if args.hover_report else None
+    if sessions is not None and marks is None:
+        raw_iter = sessions.observe(raw_iter)
+
+    ok = False
+    try:
+        with metrics.phase("write"):
+            write_outputs(
+                args,
+                raw_iter,
+                raw_path=raw_path,
+                responses_path=responses_path,
+                locations_path=locations_path,
+                badge_csv_path=badge_csv_path,
+                marks=marks,
+            )
+            if sessions is not None:
+                with sessions:
+                    if marks is not None:
+                        # Sessions can span runs, so the report is rebuilt from the whole raw store.
+                        for ev in read_jsonl(raw_path):
+                            sessions.add(ev)
+                    badges.write_hover_reports(
+                        sessions, hover_path=hover_path, prompt_path=prompt_path, verbose=args.verbose
+                    )
+        ok = True
+    except BaseException:
+        if checkpoint is not None:
+            print(
+                f"[posthog] export interrupted; fetched pages are kept in {checkpoint.directory} (re-run with --resume)",
+                file=sys.stderr,
+            )
+        raise
+    finally:
+        write_run_metrics(args, metrics_path, exporter="export_all", ok=ok)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
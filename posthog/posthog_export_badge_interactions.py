@@ -4,6 +4,11 @@ Export badge interaction logs from PostHog.
 Outputs:
 - badge_interactions*.csv: one row per badge-related event (lightweight, not overly detailed)
 - badge_interactions_raw*.jsonl (optional): raw PostHog events for the same window
+- badge_interactions*.parquet/ (--format parquet): typed rows, hive-partitioned by event and day
+- badge_hover_report*.csv, badge_feedback_prompt_report*.csv (--hover-report): sessionised hover analytics
+- badge_summary*.csv (--summary/--from-sketches): per-badge unique users and dwell quantiles from
+  mergeable per-day sketches cached in badge_sketches/
+- badge_interactions_metrics*.json: run metrics (requests, retries, latency, phase times, peak RSS)
 
 Events used:
 - badge_hover
@@ -17,17 +22,45 @@ Events used:
 from __future__ import annotations
 
 import argparse
-import csv
+import bisect
+import calendar
+import heapq
 import json
 import os
 import sys
-import time
-from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
-from urllib.parse import urljoin
-
-import requests
+import tempfile
+from collections import OrderedDict, defaultdict
+from contextlib import nullcontext, suppress
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from posthog_client import (
+    CACHE_SETTLE,
+    HighWaterMarks,
+    JsonlTee,
+    add_export_args,
+    append_jsonl,
+    atomic_open,
+    config_from_args,
+    ensure_dir,
+    extract_distinct_id,
+    extract_timestamp,
+    format_iso8601,
+    get_metrics,
+    iso_now_utc,
+    iter_export_events,
+    json_dumps,
+    open_checkpoint,
+    output_suffix,
+    parse_iso8601,
+    read_jsonl,
+    to_iso8601,
+    write_csv,
+    write_jsonl,
+    write_parquet_dataset,
+    write_run_metrics,
+)
+from posthog_sketches import HyperLogLog, QuantileSketch
 
 
 BADGE_EVENTS: Tuple[str, ...] = (
@@ -41,221 +74,44 @@ BADGE_EVENTS: Tuple[str, ...] = (
 
 CSV_FIELDS: Tuple[str, ...] = ("time_utc", "user", "page", "action", "badge", "details")
 
-
-def iso_now_utc() -> str:
-    return datetime.now(tz=timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
-
-
-def normalize_host(host: str) -> str:
-    host = (host or "").strip()
-    if not host:
-        return "https://eu.posthog.com"
-    return host.rstrip("/")
-
-
-def ensure_dir(path: str) -> None:
-    os.makedirs(path, exist_ok=True)
-
-
-def to_iso8601(value: str) -> str:
-    """
-    Accepts YYYY-MM-DD or ISO timestamp.
-    Produces an ISO8601 string in UTC with Z suffix.
-    """
-    value = value.strip()
-    if not value:
-        raise ValueError("empty datetime")
-    # Allow date-only for convenience.
-    if len(value) == 10 and value[4] == "-" and value[7] == "-":
-        return f"{value}T00:00:00Z"
-    # If user provided a Z timestamp, keep it.
-    if value.endswith("Z"):
-        return value
-    # Try parsing as ISO and ensure timezone.
-    dt = datetime.fromisoformat(value)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
-
-
-def json_dumps(v: Any) -> str:
-    return json.dumps(v, ensure_ascii=False, separators=(",", ":"), default=str)
-
-
-@dataclass(frozen=True)
-class PostHogConfig:
-    host: str
-    project_id: str
-    personal_api_key: str
-    timeout_s: int = 30
-    max_retries: int = 6
-    backoff_s: float = 1.0
-
-    @property
-    def events_url(self) -> str:
-        return f"{self.host}/api/projects/{self.project_id}/events/"
-
-    @property
-    def headers(self) -> Dict[str, str]:
-        return {"Authorization": f"Bearer {self.personal_api_key}"}
-
-
-def request_json(
-    session: requests.Session,
-    url: str,
-    *,
-    headers: Dict[str, str],
-    params: Optional[Dict[str, Any]] = None,
-    timeout_s: int = 30,
-    max_retries: int = 6,
-    backoff_s: float = 1.0,
-    verbose: bool = False,
-) -> Dict[str, Any]:
-    last_err: Optional[BaseException] = None
-    for attempt in range(max_retries + 1):
-        try:
-            resp = session.get(url, headers=headers, params=params, timeout=timeout_s)
-
-            # Fail fast on non-retryable client errors (wrong key/project/host/etc).
-            if 400 <= resp.status_code < 500 and resp.status_code != 429:
-                detail = ""
-                try:
-                    detail = resp.text.strip()
-                except Exception:
-                    detail = ""
-                msg = f"PostHog request failed ({resp.status_code}) for {resp.request.method} {resp.url}"
-                if resp.status_code in (401, 403):
-                    msg += (
-                        "\nAuth error. Ensure you're using a *personal API key* (typically starts with 'phx_'), "
-                        "not the JS project key ('phc_*'), and that POSTHOG_PROJECT_ID matches the project."
-                    )
-                if detail:
-                    msg += f"\nResponse: {detail[:500]}"
-                raise RuntimeError(msg)
-
-            if resp.status_code in (429, 500, 502, 503, 504):
-                if attempt < max_retries:
-                    wait = backoff_s * (2**attempt)
-                    if verbose:
-                        print(f"[posthog] transient {resp.status_code}; retrying in {wait:.1f}s", file=sys.stderr)
-                    time.sleep(wait)
-                    continue
-            resp.raise_for_status()
-            return resp.json()
-        except BaseException as e:
-            last_err = e
-            if attempt >= max_retries:
-                break
-            wait = backoff_s * (2**attempt)
-            if verbose:
-                print(f"[posthog] request error; retrying in {wait:.1f}s: {e}", file=sys.stderr)
-            time.sleep(wait)
-    raise RuntimeError(f"PostHog request failed after retries: {last_err}")
-
-
-def iter_events(
-    cfg: PostHogConfig,
-    *,
-    event_name: Optional[str],
-    after: Optional[str],
-    before: Optional[str],
-    limit: int,
-    verbose: bool,
-) -> Iterator[Dict[str, Any]]:
-    session = requests.Session()
-    url: Optional[str] = cfg.events_url
-    params: Optional[Dict[str, Any]] = {"limit": int(limit)}
-    if event_name:
-        params["event"] = event_name
-    if after:
-        params["after"] = after
-    if before:
-        params["before"] = before
-
-    page = 0
-    while url:
-        page += 1
-        data = request_json(
-            session,
-            url,
-            headers=cfg.headers,
-            params=params,
-            timeout_s=cfg.timeout_s,
-            max_retries=cfg.max_retries,
-            backoff_s=cfg.backoff_s,
-            verbose=verbose,
-        )
-        params = None  # 'next' already includes any query params.
-        results = data.get("results") or []
-        if verbose:
-            name = event_name or "*"
-            print(f"[posthog] {name}: page {page} -> {len(results)} events", file=sys.stderr)
-        for item in results:
-            if isinstance(item, dict):
-                yield item
-        nxt = data.get("next")
-        if isinstance(nxt, str) and nxt:
-            url = urljoin(cfg.host + "/", nxt)
-        else:
-            url = None
-
-
-def collect_events(
-    cfg: PostHogConfig,
-    event_names: Tuple[str, ...],
-    *,
-    after: Optional[str],
-    before: Optional[str],
-    limit: int,
-    verbose: bool,
-) -> Iterator[Dict[str, Any]]:
-    for name in event_names:
-        yield from iter_events(cfg, event_name=name, after=after, before=before, limit=limit, verbose=verbose)
-
-
-def write_jsonl(path: str, rows: Iterable[Dict[str, Any]]) -> int:
-    count = 0
-    with open(path, "w", encoding="utf-8") as f:
-        for ev in rows:
-            f.write(json_dumps(ev))
-            f.write("\n")
-            count += 1
-    return count
-
-
-def write_csv(path: str, rows: Iterable[Dict[str, Any]], fieldnames: Tuple[str, ...]) -> int:
-    count = 0
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=list(fieldnames), extrasaction="ignore")
-        w.writeheader()
-        for r in rows:
-            w.writerow(r)
-            count += 1
-    return count
-
-
-def extract_distinct_id(ev: Dict[str, Any]) -> Optional[str]:
-    distinct_id = ev.get("distinct_id")
-    if isinstance(distinct_id, str) and distinct_id:
-        return distinct_id
-    props = ev.get("properties") or {}
-    if isinstance(props, dict):
-        v = props.get("distinct_id")
-        if isinstance(v, str) and v:
-            return v
-    return None
-
-
-def extract_timestamp(ev: Dict[str, Any]) -> Optional[str]:
-    ts = ev.get("timestamp")
-    if isinstance(ts, str) and ts:
-        return ts
-    props = ev.get("properties") or {}
-    if isinstance(props, dict):
-        v = props.get("timestamp")
-        if isinstance(v, str) and v:
-            return v
-    return None
+# Typed columns of the Parquet export; event/day are the hive partition keys.
+PARQUET_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("time_utc", "timestamp"),
+    ("user", "string"),
+    ("page", "string"),
+    ("action", "string"),
+    ("badge", "string"),
+    ("badge_id", "string"),
+    ("mode", "string"),
+    ("duration_ms", "int64"),
+    ("ended_by", "string"),
+    ("click_kind", "string"),
+    ("button", "int64"),
+    ("interacted_badge_count", "int64"),
+    ("interacted_badge_ids", "string"),
+    ("threshold", "int64"),
+    ("rating", "int64"),
+    ("details", "string"),
+    ("event", "string"),
+    ("day", "string"),
+)
+PARQUET_PARTITIONS: Tuple[str, ...] = ("event", "day")
+
+# Properties read by flatten_badge_event; the only ones the query backend fetches.
+QUERY_PROPERTIES: Tuple[str, ...] = (
+    "pathname",
+    "badge_id",
+    "badge_label",
+    "mode",
+    "duration_ms",
+    "ended_by",
+    "badge_click_kind",
+    "button",
+    "interacted_badge_count",
+    "interacted_badge_ids",
+    "threshold",
+    "rating",
+)
 
 
 def _day(ts: Optional[str]) -> Optional[str]:
@@ -463,80 +319,811 @@ def flatten_badge_event(ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     }
 
 
+def _badge_id(props: Dict[str, Any]) -> Optional[str]:
+    v = props.get("badge_id")
+    if not isinstance(v, (str, int, float)):
+        return None
+    return str(v).strip() or None
+
+
+def _str_prop(props: Dict[str, Any], key: str) -> Optional[str]:
+    v = props.get(key)
+    return v if isinstance(v, str) and v else None
+
+
+def typed_badge_row(ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The CSV row plus real typed columns for what the CSV folds into `details` (Parquet export).
+    """
+    row = flatten_badge_event(ev)
+    if row is None:
+        return None
+    row.pop("_sort_ts", None)
+    props = ev.get("properties") if isinstance(ev.get("properties"), dict) else {}
+    ts = extract_timestamp(ev)
+    try:
+        time_utc = parse_iso8601(ts) if ts else None
+    except ValueError:
+        time_utc = None
+    row.update(
+        {
+            "time_utc": time_utc,
+            "badge_id": _badge_id(props),
+            "mode": _str_prop(props, "mode"),
+            "duration_ms": _clean_int(props.get("duration_ms")),
+            "ended_by": _str_prop(props, "ended_by"),
+            "click_kind": _str_prop(props, "badge_click_kind"),
+            "button": _clean_int(props.get("button")),
+            "interacted_badge_count": _clean_int(props.get("interacted_badge_count")),
+            "interacted_badge_ids": _interacted_badge_ids(props),
+            "threshold": _clean_int(props.get("threshold")),
+            "rating": _clean_int(props.get("rating")),
+            "event": ev.get("event"),
+            "day": time_utc.strftime("%Y-%m-%d") if time_utc else None,
+        }
+    )
+    return row
+
+
+def iter_typed_rows(events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    rows = (row for row in map(typed_badge_row, events) if row is not None)
+    return get_metrics().timed("flatten", rows)
+
+
 def iter_flat_rows(events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
-    for ev in events:
-        row = flatten_badge_event(ev)
-        if row is not None:
-            yield row
+    rows = (row for row in map(flatten_badge_event, events) if row is not None)
+    return get_metrics().timed("flatten", rows)
+
+
+# Rows held in memory before a sorted run is spilled to disk.
+SORT_RUN_ROWS = 100_000
+
+
+def _row_sort_key(row: Dict[str, Any]) -> Tuple[str, str]:
+    return (str(row.get("_sort_ts") or ""), str(row.get("action") or ""))
+
+
+def _spill_run(rows: List[Dict[str, Any]], tmpdir: str) -> str:
+    rows.sort(key=_row_sort_key)
+    fd, path = tempfile.mkstemp(suffix=".jsonl", dir=tmpdir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json_dumps(r))
+            f.write("\n")
+    return path
+
+
+def _read_run(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class ChronologicalRows:
+    """
+    External sort for flattened rows, fed one row at a time.
+
+    Rows are sorted in runs of `run_size`, spilled to temp files and k-way merged on a heap, so
+    memory stays at one run plus one row per spilled run. Ties keep their arrival order, exactly
+    like a single stable sort.
+    """
+
+    def __init__(self, *, run_size: int = SORT_RUN_ROWS) -> None:
+        self.run_size = run_size
+        self._tmp = tempfile.TemporaryDirectory(prefix="badge_sort_")
+        self._runs: List[str] = []
+        self._buf: List[Dict[str, Any]] = []
 
+    def add(self, row: Dict[str, Any]) -> None:
+        self._buf.append(row)
+        if len(self._buf) >= self.run_size:
+            self._runs.append(_spill_run(self._buf, self._tmp.name))
+            self._buf = []
 
-def _sorted_rows(events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def merged(self) -> Iterator[Dict[str, Any]]:
+        self._buf.sort(key=_row_sort_key)
+        streams: List[Iterable[Dict[str, Any]]] = [_read_run(path) for path in self._runs]
+        streams.append(self._buf)
+        for r in heapq.merge(*streams, key=_row_sort_key):
+            r.pop("_sort_ts", None)
+            yield r
+
+    def close(self) -> None:
+        self._tmp.cleanup()
+
+    def __enter__(self) -> "ChronologicalRows":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _sorted_rows(events: Iterable[Dict[str, Any]], *, run_size: int = SORT_RUN_ROWS) -> Iterator[Dict[str, Any]]:
     """
     Human-friendly CSV should be chronological.
-    PostHog API pagination is per-event, so we buffer and sort.
+    PostHog API pagination is per-event, so rows go through an external sort (ChronologicalRows).
     """
-    rows = list(iter_flat_rows(events))
-    rows.sort(key=lambda r: (str(r.get("_sort_ts") or ""), str(r.get("action") or "")))
-    for r in rows:
-        r.pop("_sort_ts", None)
-    return rows
+    with ChronologicalRows(run_size=run_size) as rows:
+        for row in iter_flat_rows(events):
+            rows.add(row)
+        yield from rows.merged()
+
+
+# A user's session ends after this long without any badge event.
+SESSION_GAP_S = 30 * 60
+
+# Histogram edges (upper bounds, exclusive) for hover dwell time and session-start -> feedback prompt.
+DWELL_EDGES_MS: Tuple[int, ...] = (1_000, 3_000, 10_000, 30_000)
+DWELL_LABELS: Tuple[str, ...] = ("dwell_lt_1s", "dwell_1_3s", "dwell_3_10s", "dwell_10_30s", "dwell_ge_30s")
+PROMPT_EDGES_S: Tuple[int, ...] = (30, 120, 300, 900)
+PROMPT_LABELS: Tuple[str, ...] = ("prompt_lt_30s", "prompt_30s_2m", "prompt_2_5m", "prompt_5_15m", "prompt_ge_15m")
+
+HOVER_REPORT_FIELDS: Tuple[str, ...] = (
+    "page",
+    "badge_id",
+    "hover_events",
+    "hover_sessions",
+    "clicked_sessions",
+    "hover_to_click_rate",
+    "click_kinds",  # badge_click_kind counts of clicks that followed a hover on the same badge
+    "dwell_events",
+    "dwell_mean_ms",
+) + DWELL_LABELS
+PROMPT_REPORT_FIELDS: Tuple[str, ...] = (
+    "page",
+    "prompts",
+    "time_to_prompt_mean_s",
+    "interacted_badges_mean",
+    "interacted_badges_hovered_rate",
+) + PROMPT_LABELS
+
+
+def _bucket(value: float, edges: Tuple[int, ...]) -> int:
+    return bisect.bisect_right(edges, value)
+
+
+def _id_list(v: Any) -> List[str]:
+    if isinstance(v, str) and v.strip().startswith("["):
+        try:
+            v = json.loads(v)
+        except ValueError:
+            return []
+    if isinstance(v, (list, tuple)):
+        return [str(x).strip() for x in v if str(x).strip()]
+    return []
 
 
-def main(argv: Optional[List[str]] = None) -> int:
-    p = argparse.ArgumentParser(description="Export badge interaction logs (hover/click + feedback prompt events) from PostHog.")
-    p.add_argument("--after", required=True, help="Start (inclusive). Accepts YYYY-MM-DD or ISO datetime.")
-    p.add_argument("--before", default=None, help="End (exclusive). Accepts YYYY-MM-DD or ISO datetime.")
-    p.add_argument("--outdir", default="posthog/exports", help="Output directory (default: posthog/exports).")
-    p.add_argument("--limit", type=int, default=200, help="Page size for API requests (default: 200).")
-    p.add_argument("--format", choices=("csv", "jsonl", "both"), default="csv", help="Write raw JSONL and/or CSV outputs.")
-    p.add_argument("--stable-names", action="store_true", help="Write stable filenames (no timestamp), overwriting on each run.")
-    p.add_argument("--host", default=os.getenv("POSTHOG_HOST", ""), help="PostHog app host (default: EU cloud).")
-    p.add_argument("--project-id", default=os.getenv("POSTHOG_PROJECT_ID", ""), help="PostHog project ID.")
-    p.add_argument("--api-key", default=os.getenv("POSTHOG_PERSONAL_API_KEY", ""), help="PostHog personal API key.")
-    p.add_argument("--verbose", action="store_true", help="Print progress to stderr.")
+def _session_record(ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The few fields the session pass needs, small enough to go through the external sort.
+    """
+    name = ev.get("event")
+    if name not in BADGE_EVENTS:
+        return None
+    ts = extract_timestamp(ev)
+    try:
+        t = parse_iso8601(ts).timestamp() if ts else None
+    except ValueError:
+        t = None
+    user = extract_distinct_id(ev)
+    if t is None or not user:
+        return None
+    props = ev.get("properties") if isinstance(ev.get("properties"), dict) else {}
+    ids = _id_list(props.get("interacted_badge_ids"))
+    count = _clean_int(props.get("interacted_badge_count"))
+    return {
+        "_sort_ts": ts,
+        "action": name,
+        "t": t,
+        "user": user,
+        "page": _normalize_pathname(props.get("pathname") if isinstance(props.get("pathname"), str) else None),
+        "badge_id": _badge_id(props),
+        "duration_ms": _clean_int(props.get("duration_ms")),
+        "click_kind": _str_prop(props, "badge_click_kind"),
+        "interacted": ids,
+        "interacted_count": count if count is not None else (len(ids) if ids else None),
+    }
 
-    args = p.parse_args(argv)
 
-    host = normalize_host(args.host)
-    if not args.project_id:
-        raise SystemExit("Missing PostHOG project id: set POSTHOG_PROJECT_ID or pass --project-id")
-    if not args.api_key:
-        raise SystemExit("Missing PostHOG personal api key: set POSTHOG_PERSONAL_API_KEY or pass --api-key")
+class _Session:
+    __slots__ = ("start", "last", "hovered", "clicked")
 
-    after = to_iso8601(args.after)
-    before = to_iso8601(args.before) if args.before else None
+    def __init__(self, t: float) -> None:
+        self.start = t
+        self.last = t
+        self.hovered: Dict[str, str] = {}  # badge_id -> page of its first hover
+        self.clicked: Set[str] = set()
 
-    cfg = PostHogConfig(host=host, project_id=str(args.project_id), personal_api_key=str(args.api_key))
-    ensure_dir(args.outdir)
 
-    stamp = (os.getenv("POSTHOG_EXPORT_STAMP") or "").strip()
-    if not stamp:
-        stamp = iso_now_utc().replace(":", "").replace("-", "")
-    suffix = "" if args.stable_names else f"_{stamp}"
-    raw_path = os.path.join(args.outdir, f"badge_interactions_raw{suffix}.jsonl")
-    csv_path = os.path.join(args.outdir, f"badge_interactions{suffix}.csv")
+class HoverSessions:
+    """
+    Sessionised hover analytics: dwell-time distribution and hover -> click conversion per
+    (page, badge), and time from session start to the feedback prompt per page.
+
+    Events are fed in any order (add/observe) and go through the same external sort as the CSV rows,
+    so sessions are rebuilt in a single chronological pass. Only users active within the last
+    SESSION_GAP_S of that pass are kept in memory; everything else is running aggregates.
+    """
+
+    def __init__(self, *, gap_s: float = SESSION_GAP_S, run_size: int = SORT_RUN_ROWS) -> None:
+        self.gap_s = gap_s
+        self._records = ChronologicalRows(run_size=run_size)
+        self._badges: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._prompts: Dict[str, Dict[str, Any]] = {}
+        self.sessions = 0
+
+    def add(self, ev: Dict[str, Any]) -> None:
+        rec = _session_record(ev)
+        if rec is not None:
+            self._records.add(rec)
+
+    def observe(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for ev in events:
+            self.add(ev)
+            yield ev
+
+    def _badge(self, page: Optional[str], badge_id: str) -> Dict[str, Any]:
+        key = (page or "", badge_id)
+        agg = self._badges.get(key)
+        if agg is None:
+            agg = self._badges[key] = {
+                "hover_events": 0,
+                "hover_sessions": 0,
+                "clicked_sessions": 0,
+                "click_kinds": defaultdict(int),
+                "dwell_events": 0,
+                "dwell_sum_ms": 0,
+                "dwell": [0] * len(DWELL_LABELS),
+            }
+        return agg
+
+    def _prompt(self, page: Optional[str]) -> Dict[str, Any]:
+        agg = self._prompts.get(page or "")
+        if agg is None:
+            agg = self._prompts[page or ""] = {
+                "prompts": 0,
+                "wait_sum_s": 0.0,
+                "interacted_n": 0,
+                "interacted_sum": 0,
+                "ids_seen": 0,
+                "ids_hovered": 0,
+                "wait": [0] * len(PROMPT_LABELS),
+            }
+        return agg
+
+    def _run(self) -> None:
+        active: "OrderedDict[str, _Session]" = OrderedDict()
+        for rec in self._records.merged():
+            t = rec["t"]
+            # Users idle for longer than the gap can't extend their session any more.
+            while active:
+                oldest = next(iter(active.values()))
+                if t - oldest.last <= self.gap_s:
+                    break
+                active.popitem(last=False)
+
+            user = rec["user"]
+            sess = active.pop(user, None)
+            if sess is None or t - sess.last > self.gap_s:
+                sess = _Session(t)
+                self.sessions += 1
+            sess.last = t
+            active[user] = sess
+
+            name, page, badge_id = rec["action"], rec["page"], rec["badge_id"]
+            if name == "badge_hover" and badge_id:
+                agg = self._badge(page, badge_id)
+                agg["hover_events"] += 1
+                if badge_id not in sess.hovered:
+                    sess.hovered[badge_id] = page or ""
+                    agg["hover_sessions"] += 1
+            elif name == "badge_hover_duration" and badge_id and rec["duration_ms"] is not None:
+                agg = self._badge(page, badge_id)
+                agg["dwell_events"] += 1
+                agg["dwell_sum_ms"] += rec["duration_ms"]
+                agg["dwell"][_bucket(rec["duration_ms"], DWELL_EDGES_MS)] += 1
+            elif name == "badge_click" and badge_id:
+                hover_page = sess.hovered.get(badge_id)
+                if hover_page is not None:
+                    agg = self._badge(hover_page, badge_id)
+                    agg["click_kinds"][rec["click_kind"] or "unknown"] += 1
+                    if badge_id not in sess.clicked:
+                        sess.clicked.add(badge_id)
+                        agg["clicked_sessions"] += 1
+            elif name == "badge_feedback_shown":
+                agg = self._prompt(page)
+                wait = t - sess.start
+                agg["prompts"] += 1
+                agg["wait_sum_s"] += wait
+                agg["wait"][_bucket(wait, PROMPT_EDGES_S)] += 1
+                if rec["interacted_count"] is not None:
+                    agg["interacted_n"] += 1
+                    agg["interacted_sum"] += rec["interacted_count"]
+                agg["ids_seen"] += len(rec["interacted"])
+                agg["ids_hovered"] += sum(1 for b in rec["interacted"] if b in sess.hovered)
+
+    def rows(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Runs the session pass and returns (hover report rows, feedback prompt report rows).
+        """
+        self._run()
+        hover_rows: List[Dict[str, Any]] = []
+        for (page, badge_id), a in sorted(self._badges.items()):
+            row: Dict[str, Any] = {
+                "page": page or None,
+                "badge_id": badge_id,
+                "hover_events": a["hover_events"],
+                "hover_sessions": a["hover_sessions"],
+                "clicked_sessions": a["clicked_sessions"],
+                "hover_to_click_rate": (a["clicked_sessions"] / a["hover_sessions"]) if a["hover_sessions"] else None,
+                "click_kinds": "; ".join(f"{k}={n}" for k, n in sorted(a["click_kinds"].items())) or None,
+                "dwell_events": a["dwell_events"],
+                "dwell_mean_ms": round(a["dwell_sum_ms"] / a["dwell_events"]) if a["dwell_events"] else None,
+            }
+            row.update(zip(DWELL_LABELS, a["dwell"]))
+            hover_rows.append(row)
+        prompt_rows: List[Dict[str, Any]] = []
+        for page, a in sorted(self._prompts.items()):
+            row = {
+                "page": page or None,
+                "prompts": a["prompts"],
+                "time_to_prompt_mean_s": round(a["wait_sum_s"] / a["prompts"], 1),
+                "interacted_badges_mean": round(a["interacted_sum"] / a["interacted_n"], 2) if a["interacted_n"] else None,
+                "interacted_badges_hovered_rate": (a["ids_hovered"] / a["ids_seen"]) if a["ids_seen"] else None,
+            }
+            row.update(zip(PROMPT_LABELS, a["wait"]))
+            prompt_rows.append(row)
+        return hover_rows, prompt_rows
+
+    def close(self) -> None:
+        self._records.close()
+
+    def __enter__(self) -> "HoverSessions":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def write_hover_reports(sessions: HoverSessions, *, hover_path: str, prompt_path: str, verbose: bool) -> None:
+    hover_rows, prompt_rows = sessions.rows()
+    n_hover = write_csv(hover_path, hover_rows, HOVER_REPORT_FIELDS)
+    n_prompt = write_csv(prompt_path, prompt_rows, PROMPT_REPORT_FIELDS)
+    if verbose:
+        print(f"[done] rebuilt {sessions.sessions} sessions", file=sys.stderr)
+        print(f"[done] wrote {n_hover} hover report rows -> {hover_path}", file=sys.stderr)
+        print(f"[done] wrote {n_prompt} feedback prompt report rows -> {prompt_path}", file=sys.stderr)
+
+
+SUMMARY_FIELDS: Tuple[str, ...] = (
+    "badge_id",
+    "events",
+    "unique_users",
+    "dwell_events",
+    "dwell_p50_ms",
+    "dwell_p90_ms",
+    "dwell_p99_ms",
+)
+
+
+class _BadgeSketch:
+    __slots__ = ("events", "users", "dwell")
+
+    def __init__(self) -> None:
+        self.events = 0
+        self.users = HyperLogLog()
+        self.dwell = QuantileSketch()
+
+    def merge(self, other: "_BadgeSketch") -> None:
+        self.events += other.events
+        self.users.merge(other.users)
+        self.dwell.merge(other.dwell)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"events": self.events, "users": self.users.to_json(), "dwell_ms": self.dwell.to_json()}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "_BadgeSketch":
+        sketch = cls()
+        sketch.events = int(data["events"])
+        sketch.users = HyperLogLog.from_json(data["users"])
+        sketch.dwell = QuantileSketch.from_json(data["dwell_ms"])
+        return sketch
+
+
+class BadgeSketches:
+    """
+    Per UTC day and badge: event count, a HyperLogLog of distinct_id and a QuantileSketch of the
+    badge_hover_duration duration_ms.
+
+    Days are cached as <directory>/<YYYY-MM-DD>.json, only once every event of the day went into
+    the sketch. Sketches merge losslessly, so any date range is answered from the day files alone
+    (load()) without re-reading events. Whole months are read from a rollup
+    (<directory>/months/<YYYY-MM>.json, rebuilt when one of its days changes), so a year is a dozen
+    merges per badge.
+    """
+
+    def __init__(self) -> None:
+        self.days: Dict[str, Dict[str, _BadgeSketch]] = {}
+        # Oldest event added, so a rebuild from a store of unknown start knows which days it holds whole.
+        self.earliest: Optional[datetime] = None
+
+    def add(self, ev: Dict[str, Any]) -> None:
+        if ev.get("event") not in BADGE_EVENTS:
+            return
+        props = ev.get("properties") if isinstance(ev.get("properties"), dict) else {}
+        badge_id = _badge_id(props)
+        ts = extract_timestamp(ev)
+        if badge_id is None or not ts:
+            return
+        try:
+            dt = parse_iso8601(ts)
+        except ValueError:
+            return
+        if self.earliest is None or dt < self.earliest:
+            self.earliest = dt
+        badges = self.days.setdefault(dt.strftime("%Y-%m-%d"), {})
+        sketch = badges.get(badge_id)
+        if sketch is None:
+            sketch = badges[badge_id] = _BadgeSketch()
+        sketch.events += 1
+        user = extract_distinct_id(ev)
+        if user:
+            sketch.users.add(user)
+        if ev.get("event") == "badge_hover_duration":
+            ms = _clean_int(props.get("duration_ms"))
+            if ms is not None and ms >= 0:
+                sketch.dwell.add(ms)
+
+    def observe(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for ev in events:
+            self.add(ev)
+            yield ev
+
+    def save(self, directory: str, days: Iterable[str]) -> int:
+        """
+        Writes (replaces) the day files for `days`, every event of which must have been added;
+        a day without badge events is cached as empty.
+        """
+        ensure_dir(directory)
+        n = 0
+        for day in sorted(set(days)):
+            _write_sketch_file(os.path.join(directory, f"{day}.json"), day, self.days.get(day, {}))
+            n += 1
+        return n
+
+    @classmethod
+    def load(cls, directory: str, days: Iterable[str]) -> Tuple["BadgeSketches", List[str]]:
+        """
+        Reads the cached `days`; returns the sketches and the days without a usable day file
+        (missing, or an empty placeholder left by an older version).
+        """
+        sketches = cls()
+        missing: List[str] = []
+        by_month: Dict[str, List[str]] = defaultdict(list)
+        for day in days:
+            by_month[day[:7]].append(day)
+        for month, month_days in sorted(by_month.items()):
+            year, mon = int(month[:4]), int(month[5:7])
+            if len(set(month_days)) == calendar.monthrange(year, mon)[1]:
+                badges = _read_sketch_month(directory, month, month_days)
+                if badges is not None:
+                    sketches.days[month] = badges
+                    continue
+            for day in month_days:
+                badges = _read_sketch_day(os.path.join(directory, f"{day}.json"))
+                if badges is None:
+                    missing.append(day)
+                else:
+                    sketches.days[day] = badges
+        return sketches, missing
+
+    def merged(self, days: Optional[Set[str]] = None) -> Dict[str, _BadgeSketch]:
+        out: Dict[str, _BadgeSketch] = {}
+        for day, badges in self.days.items():
+            if days is not None and day not in days:
+                continue
+            for badge_id, sketch in badges.items():
+                out.setdefault(badge_id, _BadgeSketch()).merge(sketch)
+        return out
+
+    def rows(self, days: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
+        """
+        One summary row per badge, over `days` (default: every day held).
+        """
+        rows: List[Dict[str, Any]] = []
+        for badge_id, sk in sorted(self.merged(days).items()):
+            quantiles = {q: sk.dwell.quantile(q) for q in (0.5, 0.9, 0.99)}
+            rows.append(
+                {
+                    "badge_id": badge_id,
+                    "events": sk.events,
+                    "unique_users": sk.users.estimate(),
+                    "dwell_events": sk.dwell.count,
+                    "dwell_p50_ms": None if quantiles[0.5] is None else round(quantiles[0.5]),
+                    "dwell_p90_ms": None if quantiles[0.9] is None else round(quantiles[0.9]),
+                    "dwell_p99_ms": None if quantiles[0.99] is None else round(quantiles[0.99]),
+                }
+            )
+        return rows
+
+
+def _read_sketch_day(path: str, *, complete_only: bool = False) -> Optional[Dict[str, _BadgeSketch]]:
+    """
+    The sketches of a day (or month rollup) file. None when it is missing, or when it lacks the
+    `complete` flag and is empty (a placeholder) or `complete_only` is set.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    badges = data.get("badges") or {}
+    if not data.get("complete") and (complete_only or not badges):
+        return None
+    return {b: _BadgeSketch.from_json(v) for b, v in badges.items()}
+
+
+def _write_sketch_file(path: str, key: str, badges: Dict[str, _BadgeSketch]) -> None:
+    data = {"day": key, "complete": True, "badges": {b: sk.to_json() for b, sk in sorted(badges.items())}}
+    with atomic_open(path) as f:
+        f.write(json_dumps(data))
+
+
+def _read_sketch_month(directory: str, month: str, days: List[str]) -> Optional[Dict[str, _BadgeSketch]]:
+    """
+    The merged sketches of a whole cached month, from its rollup when that is newer than every
+    day file; None if a day is missing or a placeholder.
+    """
+    try:
+        newest = max(os.stat(os.path.join(directory, f"{day}.json")).st_mtime_ns for day in days)
+    except FileNotFoundError:
+        return None
+    rollup = os.path.join(directory, "months", f"{month}.json")
+    with suppress(FileNotFoundError):
+        if os.stat(rollup).st_mtime_ns > newest:
+            cached = _read_sketch_day(rollup, complete_only=True)
+            if cached is not None:
+                return cached
+    merged: Dict[str, _BadgeSketch] = {}
+    for day in days:
+        badges = _read_sketch_day(os.path.join(directory, f"{day}.json"))
+        if badges is None:
+            return None
+        for badge_id, sketch in badges.items():
+            merged.setdefault(badge_id, _BadgeSketch()).merge(sketch)
+    ensure_dir(os.path.dirname(rollup))
+    _write_sketch_file(rollup, month, merged)
+    return merged
+
+
+def window_days(after: str, before: Optional[str], *, whole_closed_only: bool = False) -> List[str]:
+    """
+    UTC days overlapping [after, before). With `whole_closed_only`, only days that lie entirely
+    inside the window and are settled (see CACHE_SETTLE), i.e. whose sketch is final.
+    """
+    now = datetime.now(tz=timezone.utc)
+    start = parse_iso8601(after)
+    end = parse_iso8601(before) if before else now
+    one_day = timedelta(days=1)
+    days: List[str] = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        if not whole_closed_only or (day >= start and day + one_day <= end and day + one_day + CACHE_SETTLE <= now):
+            days.append(day.strftime("%Y-%m-%d"))
+        day += one_day
+    return days
+
+
+def write_summary(
+    sketches: BadgeSketches,
+    args: argparse.Namespace,
+    marks: Optional[HighWaterMarks],
+    *,
+    sketch_dir: str,
+    summary_path: str,
+    after: str,
+    before: Optional[str],
+) -> None:
+    """
+    Caches the settled days whose events all went into `sketches` and writes the summary CSV for
+    the window's UTC days.
+
+    A plain export saw every event of the window, so it caches the days lying whole inside it. An
+    incremental one has rebuilt `sketches` from the whole raw store, which holds every event since
+    `marks.since` (for older states: since its oldest event), so the cached days start no earlier.
+    """
+    cached_from = after
+    if marks is not None:
+        since = marks.since or (format_iso8601(sketches.earliest) if sketches.earliest else None)
+        if since is not None and parse_iso8601(since) > parse_iso8601(after):
+            cached_from = since
+    n_days = sketches.save(sketch_dir, window_days(cached_from, before, whole_closed_only=True))
+    n = write_csv(summary_path, sketches.rows(set(window_days(after, before))), SUMMARY_FIELDS)
+    if args.verbose:
+        print(f"[done] cached sketches for {n_days} days -> {sketch_dir}", file=sys.stderr)
+        print(f"[done] wrote {n} badge summary rows -> {summary_path}", file=sys.stderr)
+
+
+def write_summary_from_sketches(
+    args: argparse.Namespace,
+    *,
+    sketch_dir: str,
+    summary_path: str,
+    after: str,
+    before: Optional[str],
+) -> int:
+    """
+    --from-sketches: the summary CSV of the window's UTC days from the cached day sketches only
+    (no fetch, so no credentials needed). Days without a usable day file are left out and reported.
+    """
+    days = window_days(after, before)
+    sketches, missing = BadgeSketches.load(sketch_dir, days)
+    if missing:
+        print(
+            f"[posthog] no complete cached sketches for {len(missing)} of {len(days)} day(s) of the window"
+            f" ({missing[0]} .. {missing[-1]}), left out of the summary; run with --summary over those days to build them",
+            file=sys.stderr,
+        )
+    n = write_csv(summary_path, sketches.rows(), SUMMARY_FIELDS)
+    if args.verbose:
+        print(f"[done] wrote {n} badge summary rows from {len(days) - len(missing)} cached days -> {summary_path}", file=sys.stderr)
+    return 0
 
-    raw_iter = collect_events(cfg, BADGE_EVENTS, after=after, before=before, limit=args.limit, verbose=args.verbose)
+
+def _write_parquet(path: str, events: Iterable[Dict[str, Any]]) -> int:
+    return write_parquet_dataset(path, iter_typed_rows(events), PARQUET_FIELDS, partition_cols=PARQUET_PARTITIONS)
+
+
+def write_outputs(
+    args: argparse.Namespace,
+    raw_iter: Iterable[Dict[str, Any]],
+    *,
+    raw_path: str,
+    csv_path: str,
+    parquet_path: str,
+    marks: Optional[HighWaterMarks],
+) -> None:
+    if marks is not None:
+        # The raw JSONL is the merge base: append the new events, then rebuild the CSV from it.
+        # Without a state file, start the store over so old non-incremental output isn't duplicated.
+        write_raw = append_jsonl if marks.loaded else write_jsonl
+        n_new = write_raw(raw_path, marks.skip_seen(raw_iter))
+        marks.save()
+        n_rows, rows_path = None, csv_path
+        if args.format == "parquet":
+            n_rows, rows_path = _write_parquet(parquet_path, read_jsonl(raw_path)), parquet_path
+        elif args.format != "jsonl":
+            n_rows = write_csv(csv_path, _sorted_rows(read_jsonl(raw_path)), CSV_FIELDS)
+        if args.verbose:
+            print(f"[done] appended {n_new} new raw badge events -> {raw_path}", file=sys.stderr)
+            if n_rows is not None:
+                print(f"[done] wrote {n_rows} badge interaction rows -> {rows_path}", file=sys.stderr)
+        return
+
+    if args.format == "parquet":
+        n = _write_parquet(parquet_path, raw_iter)
+        if args.verbose:
+            print(f"[done] wrote {n} badge interaction rows -> {parquet_path}", file=sys.stderr)
+        return
 
     if args.format == "jsonl":
         n = write_jsonl(raw_path, raw_iter)
         if args.verbose:
             print(f"[done] wrote {n} raw badge events -> {raw_path}", file=sys.stderr)
-        return 0
+        return
 
     if args.format == "csv":
         n = write_csv(csv_path, _sorted_rows(raw_iter), CSV_FIELDS)
         if args.verbose:
             print(f"[done] wrote {n} badge interaction rows -> {csv_path}", file=sys.stderr)
-        return 0
+        return
 
-    # both: need two passes -> buffer in memory (badge volume should be manageable)
-    evs = list(raw_iter)
-    n_raw = write_jsonl(raw_path, evs)
-    n_csv = write_csv(csv_path, _sorted_rows(evs), CSV_FIELDS)
+    # both: tee the raw events to JSONL as they stream into the CSV rows.
+    with atomic_open(raw_path) as raw_f:
+        tee = JsonlTee(raw_f)
+        n_csv = write_csv(csv_path, _sorted_rows(tee(raw_iter)), CSV_FIELDS)
     if args.verbose:
-        print(f"[done] wrote {n_raw} raw badge events -> {raw_path}", file=sys.stderr)
+        print(f"[done] wrote {tee.count} raw badge events -> {raw_path}", file=sys.stderr)
         print(f"[done] wrote {n_csv} badge interaction rows -> {csv_path}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Export badge interaction logs (hover/click + feedback prompt events) from PostHog.")
+    add_export_args(p)
+    p.add_argument(
+        "--hover-report",
+        action="store_true",
+        help="Also write sessionised hover analytics (badge_hover_report*.csv, badge_feedback_prompt_report*.csv).",
+    )
+    p.add_argument(
+        "--summary",
+        action="store_true",
+        help="Also write per-badge unique users and dwell p50/p90/p99 (badge_summary*.csv) and cache per-day sketches.",
+    )
+    p.add_argument(
+        "--from-sketches",
+        action="store_true",
+        help="Write badge_summary*.csv for the window from the cached per-day sketches only (whole UTC days, no fetch).",
+    )
+    args = p.parse_args(argv)
+
+    after = to_iso8601(args.after)
+    before = to_iso8601(args.before) if args.before else None
+
+    ensure_dir(args.outdir)
+    suffix = output_suffix(args)
+    raw_path = os.path.join(args.outdir, f"badge_interactions_raw{suffix}.jsonl")
+    csv_path = os.path.join(args.outdir, f"badge_interactions{suffix}.csv")
+    parquet_path = os.path.join(args.outdir, f"badge_interactions{suffix}.parquet")
+    hover_path = os.path.join(args.outdir, f"badge_hover_report{suffix}.csv")
+    prompt_path = os.path.join(args.outdir, f"badge_feedback_prompt_report{suffix}.csv")
+    summary_path = os.path.join(args.outdir, f"badge_summary{suffix}.csv")
+    metrics_path = os.path.join(args.outdir, f"badge_interactions_metrics{suffix}.json")
+    sketch_dir = os.path.join(args.outdir, "badge_sketches")
+
+    if args.from_sketches:
+        return write_summary_from_sketches(args, sketch_dir=sketch_dir, summary_path=summary_path, after=after, before=before)
+
+    cfg = config_from_args(args)
+    checkpoint = open_checkpoint(args, ".checkpoint_badge_interactions")
+    if checkpoint is not None:
+        if args.time_slices > 1 and before is None:
+            # Slice boundaries must not move between an interrupted run and its --resume.
+            before = iso_now_utc()
+        after, before = checkpoint.window(after, before)
+    marks = HighWaterMarks(os.path.join(args.outdir, "badge_interactions_state.json"), after=after) if args.incremental else None
+
+    metrics = get_metrics()
+    raw_iter = iter_export_events(
+        cfg,
+        args,
+        BADGE_EVENTS,
+        QUERY_PROPERTIES,
+        after=after,
+        before=before,
+        marks=marks,
+        checkpoint=checkpoint,
+    )
+    raw_iter = metrics.timed("fetch", raw_iter)
+
+    sessions = HoverSessions() if args.hover_report else None
+    sketches = BadgeSketches() if args.summary else None
+    if marks is None:
+        if sessions is not None:
+            raw_iter = sessions.observe(raw_iter)
+        if sketches is not None:
+            raw_iter = sketches.observe(raw_iter)
+
+    ok = False
+    try:
+        with metrics.phase("write"):
+            write_outputs(args, raw_iter, raw_path=raw_path, csv_path=csv_path, parquet_path=parquet_path, marks=marks)
+            with sessions or nullcontext():
+                if marks is not None and (sessions is not None or sketches is not None):
+                    # Sessions can span runs and a cached sketch day must hold all its events, so both
+                    # reports are rebuilt from the whole raw store.
+                    for ev in read_jsonl(raw_path):
+                        if sessions is not None:
+                            sessions.add(ev)
+                        if sketches is not None:
+                            sketches.add(ev)
+                if sessions is not None:
+                    write_hover_reports(sessions, hover_path=hover_path, prompt_path=prompt_path, verbose=args.verbose)
+            if sketches is not None:
+                write_summary(sketches, args, marks, sketch_dir=sketch_dir, summary_path=summary_path, after=after, before=before)
+        ok = True
+    except BaseException:
+        if checkpoint is not None:
+            print(
+                f"[posthog] export interrupted; fetched pages are kept in {checkpoint.directory} (re-run with --resume)",
+                file=sys.stderr,
+            )
+        raise
+    finally:
+        write_run_metrics(args, metrics_path, exporter="badge_interactions", ok=ok)
+    if checkpoint is not None:
+        checkpoint.clear()
     return 0
 
 
@@ -1,9 +1,10 @@
 """
 Export badge feedback survey data from PostHog.
 
-Outputs (CSV):
+Outputs (CSV, or Parquet datasets of the same name with --format parquet):
 - badge_survey_responses*.csv: one row per submitted response (stars + comment)
 - badge_survey_locations*.csv: counts of shown/submitted/not-submitted by pathname
+- badge_survey_metrics*.json: run metrics (requests, retries, latency, phase times, peak RSS)
 
 Events used:
 - badge_feedback_shown
@@ -14,256 +15,65 @@ Events used:
 from __future__ import annotations
 
 import argparse
-import csv
 import json
 import os
 import sys
-import time
 from collections import defaultdict
-from dataclasses import dataclass
-from datetime import datetime, timezone
 from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
-from urllib.parse import urljoin
 
-import requests
+from posthog_client import (
+    QUERY_PAGE_ROWS,
+    HighWaterMarks,
+    JsonlTee,
+    PostHogConfig,
+    add_export_args,
+    append_jsonl,
+    atomic_open,
+    config_from_args,
+    ensure_dir,
+    extract_distinct_id,
+    extract_timestamp,
+    get_metrics,
+    get_session,
+    hogql_str,
+    iso_now_utc,
+    iter_export_events,
+    open_checkpoint,
+    output_suffix,
+    parse_iso8601,
+    read_jsonl,
+    request_json,
+    to_iso8601,
+    write_csv,
+    write_jsonl,
+    write_parquet_dataset,
+    write_run_metrics,
+)
 
 
 SURVEY_EVENTS: Tuple[str, ...] = ("badge_feedback_shown", "badge_feedback_dismissed", "badge_feedback_submitted")
 SUBMIT_EVENT = "badge_feedback_submitted"
 
-
-def iso_now_utc() -> str:
-    return datetime.now(tz=timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
-
-
-def normalize_host(host: str) -> str:
-    host = (host or "").strip()
-    if not host:
-        return "https://eu.posthog.com"
-    return host.rstrip("/")
-
-
-def ensure_dir(path: str) -> None:
-    os.makedirs(path, exist_ok=True)
-
-
-def to_iso8601(value: str) -> str:
-    """
-    Accepts YYYY-MM-DD or ISO timestamp.
-    Produces an ISO8601 string in UTC with Z suffix.
-    """
-    value = value.strip()
-    if not value:
-        raise ValueError("empty datetime")
-    # Allow date-only for convenience.
-    if len(value) == 10 and value[4] == "-" and value[7] == "-":
-        return f"{value}T00:00:00Z"
-    # If user provided a Z timestamp, keep it.
-    if value.endswith("Z"):
-        return value
-    # Try parsing as ISO and ensure timezone.
-    dt = datetime.fromisoformat(value)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
-
-
-def json_dumps(v: Any) -> str:
-    return json.dumps(v, ensure_ascii=False, separators=(",", ":"), default=str)
-
-
-@dataclass(frozen=True)
-class PostHogConfig:
-    host: str
-    project_id: str
-    personal_api_key: str
-    timeout_s: int = 30
-    max_retries: int = 6
-    backoff_s: float = 1.0
-
-    @property
-    def events_url(self) -> str:
-        return f"{self.host}/api/projects/{self.project_id}/events/"
-
-    @property
-    def headers(self) -> Dict[str, str]:
-        return {"Authorization": f"Bearer {self.personal_api_key}"}
-
-
-def request_json(
-    session: requests.Session,
-    url: str,
-    *,
-    headers: Dict[str, str],
-    params: Optional[Dict[str, Any]] = None,
-    timeout_s: int = 30,
-    max_retries: int = 6,
-    backoff_s: float = 1.0,
-    verbose: bool = False,
-) -> Dict[str, Any]:
-    last_err: Optional[BaseException] = None
-    for attempt in range(max_retries + 1):
-        try:
-            resp = session.get(url, headers=headers, params=params, timeout=timeout_s)
-
-            # Fail fast on non-retryable client errors (wrong key/project/host/etc).
-            if 400 <= resp.status_code < 500 and resp.status_code != 429:
-                detail = ""
-                try:
-                    detail = resp.text.strip()
-                except Exception:
-                    detail = ""
-                msg = f"PostHog request failed ({resp.status_code}) for {resp.request.method} {resp.url}"
-                if resp.status_code in (401, 403):
-                    msg += (
-                        "\nAuth error. Ensure you're using a *personal API key* (typically starts with 'phx_'), "
-                        "not the JS project key ('phc_*'), and that POSTHOG_PROJECT_ID matches the project."
-                    )
-                if detail:
-                    msg += f"\nResponse: {detail[:500]}"
-                raise RuntimeError(msg)
-
-            if resp.status_code in (429, 500, 502, 503, 504):
-                # Rate limit / transient backend errors.
-                if attempt < max_retries:
-                    wait = backoff_s * (2**attempt)
-                    if verbose:
-                        print(f"[posthog] transient {resp.status_code}; retrying in {wait:.1f}s", file=sys.stderr)
-                    time.sleep(wait)
-                    continue
-            resp.raise_for_status()
-            return resp.json()
-        except BaseException as e:
-            last_err = e
-            if attempt >= max_retries:
-                break
-            wait = backoff_s * (2**attempt)
-            if verbose:
-                print(f"[posthog] request error; retrying in {wait:.1f}s: {e}", file=sys.stderr)
-            time.sleep(wait)
-    raise RuntimeError(f"PostHog request failed after retries: {last_err}")
-
-
-def iter_events(
-    cfg: PostHogConfig,
-    *,
-    event_name: Optional[str],
-    after: Optional[str],
-    before: Optional[str],
-    limit: int,
-    verbose: bool,
-) -> Iterator[Dict[str, Any]]:
-    """
-    Iterates PostHog events.
-
-    Uses cursor pagination via the `next` URL in API responses.
-    """
-    session = requests.Session()
-    url: Optional[str] = cfg.events_url
-    params: Optional[Dict[str, Any]] = {"limit": int(limit)}
-    if event_name:
-        params["event"] = event_name
-    if after:
-        params["after"] = after
-    if before:
-        params["before"] = before
-
-    page = 0
-    while url:
-        page += 1
-        data = request_json(
-            session,
-            url,
-            headers=cfg.headers,
-            params=params,
-            timeout_s=cfg.timeout_s,
-            max_retries=cfg.max_retries,
-            backoff_s=cfg.backoff_s,
-            verbose=verbose,
-        )
-        params = None  # 'next' already includes any query params.
-        results = data.get("results") or []
-        if verbose:
-            name = event_name or "*"
-            print(f"[posthog] {name}: page {page} -> {len(results)} events", file=sys.stderr)
-        for item in results:
-            if isinstance(item, dict):
-                yield item
-        nxt = data.get("next")
-        if isinstance(nxt, str) and nxt:
-            # PostHog usually returns an absolute URL, but some deployments may return a relative path.
-            url = urljoin(cfg.host + "/", nxt)
-        else:
-            url = None
-
-
-def collect_events(
-    cfg: PostHogConfig,
-    event_names: Tuple[str, ...],
-    *,
-    after: Optional[str],
-    before: Optional[str],
-    limit: int,
-    verbose: bool,
-) -> Iterator[Dict[str, Any]]:
-    for name in event_names:
-        yield from iter_events(cfg, event_name=name, after=after, before=before, limit=limit, verbose=verbose)
-
-
-def write_jsonl(path: str, rows: Iterable[Dict[str, Any]]) -> int:
-    count = 0
-    with open(path, "w", encoding="utf-8") as f:
-        for ev in rows:
-            f.write(json_dumps(ev))
-            f.write("\n")
-            count += 1
-    return count
-
-
-def write_csv(path: str, rows: Iterable[Dict[str, Any]]) -> int:
-    rows_iter = iter(rows)
-    try:
-        first = next(rows_iter)
-    except StopIteration:
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            f.write("")
-        return 0
-
-    fieldnames = list(first.keys())
-    count = 0
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
-        w.writeheader()
-        w.writerow(first)
-        count += 1
-        for r in rows_iter:
-            w.writerow(r)
-            count += 1
-    return count
-
-
-def extract_distinct_id(ev: Dict[str, Any]) -> Optional[str]:
-    distinct_id = ev.get("distinct_id")
-    if isinstance(distinct_id, str) and distinct_id:
-        return distinct_id
-    props = ev.get("properties") or {}
-    if isinstance(props, dict):
-        v = props.get("distinct_id")
-        if isinstance(v, str) and v:
-            return v
-    return None
-
-
-def extract_timestamp(ev: Dict[str, Any]) -> Optional[str]:
-    ts = ev.get("timestamp")
-    if isinstance(ts, str) and ts:
-        return ts
-    props = ev.get("properties") or {}
-    if isinstance(props, dict):
-        v = props.get("timestamp")
-        if isinstance(v, str) and v:
-            return v
-    return None
+# Properties read by flatten_response and build_location_rows; the only ones the query backend fetches.
+QUERY_PROPERTIES: Tuple[str, ...] = ("pathname", "rating", "rating_label", "comment")
+
+# Typed columns of the Parquet outputs; responses are hive-partitioned by day.
+RESPONSE_PARQUET_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("timestamp", "timestamp"),
+    ("day", "string"),
+    ("distinct_id", "string"),
+    ("pathname", "string"),
+    ("rating", "int64"),
+    ("rating_label", "string"),
+    ("comment", "string"),
+)
+LOCATION_PARQUET_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("badge_survey_page_group", "string"),
+    ("badge_survey_shown_events", "int64"),
+    ("badge_survey_submitted_events", "int64"),
+    ("badge_survey_not_submitted_events", "int64"),
+    ("badge_survey_response_rate", "float64"),
+)
 
 
 def clean_text(v: Any) -> Optional[str]:
@@ -364,6 +174,20 @@ def flatten_response(ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     }
 
 
+def typed_response(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    flatten_response() row with a real timestamp and a string rating_label (Parquet export).
+    """
+    ts = row.get("timestamp")
+    try:
+        row["timestamp"] = parse_iso8601(ts) if ts else None
+    except ValueError:
+        row["timestamp"] = None
+    label = row.get("rating_label")
+    row["rating_label"] = None if label is None else str(label)
+    return row
+
+
 def iter_responses(events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
     for ev in events:
         r = flatten_response(ev)
@@ -371,117 +195,288 @@ def iter_responses(events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]
             yield r
 
 
-def build_location_rows(events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+class LocationCounter:
     """
-    Returns a simple location summary with exactly 3 rows (cobenefit/nation/lad) for the selected time window:
-    - how often the badge survey was shown
-    - how often it was submitted
-    - how often it was not submitted (shown - submitted)
-
-    Notes:
-    - "not submitted" includes all cases where the survey was shown but never submitted
-      (e.g. dismissed, ignored, navigated away, etc.).
+    Accumulates shown/submitted counts per survey page group as events stream past.
     """
-    counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"shown": 0, "submitted": 0})
 
-    for ev in events:
+    def __init__(self) -> None:
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"shown": 0, "submitted": 0})
+
+    def add(self, ev: Dict[str, Any]) -> None:
         name = ev.get("event")
         if name not in SURVEY_EVENTS:
-            continue
+            return
         props = ev.get("properties") if isinstance(ev.get("properties"), dict) else {}
         group = _survey_group_for_pathname(_pathname(props))
         if not group:
-            continue
+            return
 
         if name == "badge_feedback_shown":
-            counts[group]["shown"] += 1
+            self.counts[group]["shown"] += 1
         elif name == "badge_feedback_submitted":
-            counts[group]["submitted"] += 1
-
-    rows: List[Dict[str, Any]] = []
-    for group in ("cobenefit", "nation", "lad"):
-        c = counts.get(group, {"shown": 0, "submitted": 0})
-        shown = c["shown"]
-        submitted = c["submitted"]
-        not_submitted = max(0, shown - submitted)
-        response_rate = (submitted / shown) if shown else None
-        rows.append(
-            {
-                "badge_survey_page_group": group,
-                "badge_survey_shown_events": shown,
-                "badge_survey_submitted_events": submitted,
-                "badge_survey_not_submitted_events": not_submitted,
-                "badge_survey_response_rate": response_rate,
-            }
-        )
+            self.counts[group]["submitted"] += 1
 
-    return rows
-
-
-def main(argv: Optional[List[str]] = None) -> int:
-    p = argparse.ArgumentParser(description="Export badge feedback survey data (responses + location summary) from PostHog.")
-    p.add_argument("--after", required=True, help="Start (inclusive). Accepts YYYY-MM-DD or ISO datetime.")
-    p.add_argument("--before", default=None, help="End (exclusive). Accepts YYYY-MM-DD or ISO datetime.")
-    p.add_argument("--outdir", default="posthog/exports", help="Output directory (default: posthog/exports).")
-    p.add_argument("--limit", type=int, default=200, help="Page size for API requests (default: 200).")
-    p.add_argument("--format", choices=("csv", "jsonl", "both"), default="csv", help="Write raw JSONL and/or CSV outputs.")
-    p.add_argument("--stable-names", action="store_true", help="Write stable filenames (no timestamp), overwriting on each run.")
-    p.add_argument("--host", default=os.getenv("POSTHOG_HOST", ""), help="PostHog app host (default: EU cloud).")
-    p.add_argument("--project-id", default=os.getenv("POSTHOG_PROJECT_ID", ""), help="PostHog project ID.")
-    p.add_argument("--api-key", default=os.getenv("POSTHOG_PERSONAL_API_KEY", ""), help="PostHog personal API key.")
-    p.add_argument("--verbose", action="store_true", help="Print progress to stderr.")
+    def add_counts(self, pathname: Any, shown: int, submitted: int) -> None:
+        """
+        Folds in counts that were already aggregated per raw pathname (server-side mode).
+        """
+        group = _survey_group_for_pathname(pathname if isinstance(pathname, str) and pathname else None)
+        if not group:
+            return
+        self.counts[group]["shown"] += int(shown or 0)
+        self.counts[group]["submitted"] += int(submitted or 0)
+
+    def observe(self, events: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for ev in events:
+            self.add(ev)
+            yield ev
+
+    def rows(self) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        for group in ("cobenefit", "nation", "lad"):
+            c = self.counts.get(group, {"shown": 0, "submitted": 0})
+            shown = c["shown"]
+            submitted = c["submitted"]
+            not_submitted = max(0, shown - submitted)
+            response_rate = (submitted / shown) if shown else None
+            rows.append(
+                {
+                    "badge_survey_page_group": group,
+                    "badge_survey_shown_events": shown,
+                    "badge_survey_submitted_events": submitted,
+                    "badge_survey_not_submitted_events": not_submitted,
+                    "badge_survey_response_rate": response_rate,
+                }
+            )
+        return rows
 
-    args = p.parse_args(argv)
 
-    host = normalize_host(args.host)
-    if not args.project_id:
-        raise SystemExit("Missing PostHOG project id: set POSTHOG_PROJECT_ID or pass --project-id")
-    if not args.api_key:
-        raise SystemExit("Missing PostHOG personal api key: set POSTHOG_PERSONAL_API_KEY or pass --api-key")
+def build_location_rows(events: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Returns a simple location summary with exactly 3 rows (cobenefit/nation/lad) for the selected time window:
+    - how often the badge survey was shown
+    - how often it was submitted
+    - how often it was not submitted (shown - submitted)
 
-    after = to_iso8601(args.after)
-    before = to_iso8601(args.before) if args.before else None
+    Notes:
+    - "not submitted" includes all cases where the survey was shown but never submitted
+      (e.g. dismissed, ignored, navigated away, etc.).
+    """
+    counter = LocationCounter()
+    for ev in events:
+        counter.add(ev)
+    return counter.rows()
 
-    cfg = PostHogConfig(host=host, project_id=str(args.project_id), personal_api_key=str(args.api_key))
-    ensure_dir(args.outdir)
 
-    stamp = (os.getenv("POSTHOG_EXPORT_STAMP") or "").strip()
-    if not stamp:
-        stamp = iso_now_utc().replace(":", "").replace("-", "")
-    suffix = "" if args.stable_names else f"_{stamp}"
-    raw_path = os.path.join(args.outdir, f"badge_survey_raw{suffix}.jsonl")
-    responses_path = os.path.join(args.outdir, f"badge_survey_responses{suffix}.csv")
-    locations_path = os.path.join(args.outdir, f"badge_survey_locations{suffix}.csv")
+def fetch_location_counts(
+    cfg: PostHogConfig,
+    *,
+    after: str,
+    before: Optional[str],
+    verbose: bool,
+    page_rows: int = QUERY_PAGE_ROWS,
+) -> LocationCounter:
+    """
+    Counts shown/submitted events per pathname inside PostHog (one grouped HogQL query) and
+    buckets the aggregate rows locally, instead of downloading every raw event.
 
-    raw_iter = collect_events(cfg, SURVEY_EVENTS, after=after, before=before, limit=args.limit, verbose=args.verbose)
+    Pathnames are grouped by their raw JSON so non-string values are skipped exactly as
+    LocationCounter.add() skips them, and pages seek past the last group instead of using OFFSET.
+    """
+    shown, submitted = hogql_str("badge_feedback_shown"), hogql_str(SUBMIT_EVENT)
+    pathname = f"JSONExtractRaw(properties, {hogql_str('pathname')})"
+    where = [f"event IN ({shown}, {submitted})", f"timestamp >= toDateTime({hogql_str(after)})"]
+    if before:
+        where.append(f"timestamp < toDateTime({hogql_str(before)})")
+    session = get_session()
+    counter = LocationCounter()
+    last: Optional[str] = None
+    while True:
+        page_where = where if last is None else where + [f"{pathname} > {hogql_str(last)}"]
+        query = (
+            f"SELECT {pathname}, countIf(event = {shown}), countIf(event = {submitted}) "
+            f"FROM events WHERE {' AND '.join(page_where)} "
+            f"GROUP BY {pathname} ORDER BY {pathname} LIMIT {int(page_rows)}"
+        )
+        data = request_json(
+            session,
+            cfg.query_url,
+            headers=cfg.headers,
+            timeout_s=cfg.timeout_s,
+            max_retries=cfg.max_retries,
+            backoff_s=cfg.backoff_s,
+            verbose=verbose,
+            method="POST",
+            json_body={"query": {"kind": "HogQLQuery", "query": query}},
+        )
+        results = [row for row in data.get("results") or [] if isinstance(row, list) and len(row) == 3]
+        if verbose:
+            print(f"[posthog] location counts: {len(results)} pathnames", file=sys.stderr)
+        for raw, n_shown, n_submitted in results:
+            counter.add_counts(json.loads(raw) if isinstance(raw, str) and raw else None, n_shown, n_submitted)
+        if len(results) < page_rows:
+            return counter
+        last = results[-1][0] or ""
+
+
+def _write_reports(
+    events: Iterable[Dict[str, Any]],
+    responses_path: str,
+    locations_path: str,
+    counter: Optional[LocationCounter] = None,
+    *,
+    parquet: bool = False,
+) -> Tuple[int, int]:
+    """
+    Single pass: responses stream straight to CSV (or Parquet) while the location counts accumulate.
+    A `counter` that was already filled server-side is written as is.
+    """
+    if counter is None:
+        counter = LocationCounter()
+        events = counter.observe(events)
+    responses = get_metrics().timed("flatten", iter_responses(events))
+    if parquet:
+        typed = (typed_response(r) for r in responses)
+        n_resp = write_parquet_dataset(responses_path, typed, RESPONSE_PARQUET_FIELDS, partition_cols=("day",))
+        n_loc = write_parquet_dataset(locations_path, counter.rows(), LOCATION_PARQUET_FIELDS)
+        return n_resp, n_loc
+    n_resp = write_csv(responses_path, responses)
+    n_loc = write_csv(locations_path, counter.rows())
+    return n_resp, n_loc
+
+
+def write_outputs(
+    args: argparse.Namespace,
+    raw_iter: Iterable[Dict[str, Any]],
+    *,
+    raw_path: str,
+    responses_path: str,
+    locations_path: str,
+    marks: Optional[HighWaterMarks],
+    location_counter: Optional[LocationCounter] = None,
+) -> None:
+    if marks is not None:
+        # The raw JSONL is the merge base: append the new events, then rebuild the CSVs from it.
+        # Without a state file, start the store over so old non-incremental output isn't duplicated.
+        write_raw = append_jsonl if marks.loaded else write_jsonl
+        n_new = write_raw(raw_path, marks.skip_seen(raw_iter))
+        marks.save()
+        if args.format != "jsonl":
+            n_resp, n_loc = _write_reports(
+                read_jsonl(raw_path), responses_path, locations_path, parquet=args.format == "parquet"
+            )
+        if args.verbose:
+            print(f"[done] appended {n_new} new raw survey events -> {raw_path}", file=sys.stderr)
+            if args.format != "jsonl":
+                print(f"[done] wrote {n_resp} survey responses -> {responses_path}", file=sys.stderr)
+                print(f"[done] wrote {n_loc} location summary rows -> {locations_path}", file=sys.stderr)
+        return
 
     if args.format == "jsonl":
         n = write_jsonl(raw_path, raw_iter)
         if args.verbose:
             print(f"[done] wrote {n} raw survey events -> {raw_path}", file=sys.stderr)
-        return 0
-
-    if args.format == "csv":
-        # Need one pass for responses + locations. Buffer in memory (survey volume should be manageable).
-        evs = list(raw_iter)
-        n_resp = write_csv(responses_path, iter_responses(evs))
-        location_rows = build_location_rows(evs)
-        n_loc = write_csv(locations_path, location_rows)
+        return
+
+    if args.format in ("csv", "parquet"):
+        n_resp, n_loc = _write_reports(
+            raw_iter, responses_path, locations_path, location_counter, parquet=args.format == "parquet"
+        )
         if args.verbose:
             print(f"[done] wrote {n_resp} survey responses -> {responses_path}", file=sys.stderr)
             print(f"[done] wrote {n_loc} location summary rows -> {locations_path}", file=sys.stderr)
-        return 0
-
-    # both
-    evs = list(raw_iter)
-    n_raw = write_jsonl(raw_path, evs)
-    n_resp = write_csv(responses_path, iter_responses(evs))
-    location_rows = build_location_rows(evs)
-    n_loc = write_csv(locations_path, location_rows)
+        return
+
+    # both: tee the raw events to JSONL as they stream into the reports.
+    with atomic_open(raw_path) as raw_f:
+        tee = JsonlTee(raw_f)
+        n_resp, n_loc = _write_reports(tee(raw_iter), responses_path, locations_path, location_counter)
     if args.verbose:
-        print(f"[done] wrote {n_raw} raw survey events -> {raw_path}", file=sys.stderr)
+        print(f"[done] wrote {tee.count} raw survey events -> {raw_path}", file=sys.stderr)
         print(f"[done] wrote {n_resp} survey responses -> {responses_path}", file=sys.stderr)
         print(f"[done] wrote {n_loc} location summary rows -> {locations_path}", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Export badge feedback survey data (responses + location summary) from PostHog.")
+    add_export_args(p)
+    p.add_argument(
+        "--locations-source",
+        choices=("events", "server"),
+        default="events",
+        help="'server' counts shown/submitted per pathname inside PostHog instead of downloading those events.",
+    )
+    args = p.parse_args(argv)
+
+    if args.locations_source == "server" and args.incremental:
+        p.error("--locations-source server cannot be combined with --incremental (locations are rebuilt from the local store)")
+
+    cfg = config_from_args(args)
+    after = to_iso8601(args.after)
+    before = to_iso8601(args.before) if args.before else None
+
+    ensure_dir(args.outdir)
+    suffix = output_suffix(args)
+    raw_path = os.path.join(args.outdir, f"badge_survey_raw{suffix}.jsonl")
+    ext = "parquet" if args.format == "parquet" else "csv"
+    responses_path = os.path.join(args.outdir, f"badge_survey_responses{suffix}.{ext}")
+    locations_path = os.path.join(args.outdir, f"badge_survey_locations{suffix}.{ext}")
+    metrics_path = os.path.join(args.outdir, f"badge_survey_metrics{suffix}.json")
+    checkpoint = open_checkpoint(args, ".checkpoint_badge_survey")
+    if checkpoint is not None:
+        if args.time_slices > 1 and before is None:
+            # Slice boundaries must not move between an interrupted run and its --resume.
+            before = iso_now_utc()
+        after, before = checkpoint.window(after, before)
+    marks = HighWaterMarks(os.path.join(args.outdir, "badge_survey_state.json"), after=after) if args.incremental else None
+
+    metrics = get_metrics()
+    event_names = SURVEY_EVENTS
+    location_counter: Optional[LocationCounter] = None
+    if args.locations_source == "server" and args.format != "jsonl":
+        with metrics.phase("fetch"):
+            location_counter = fetch_location_counts(cfg, after=after, before=before, verbose=args.verbose)
+        if args.format in ("csv", "parquet"):
+            # Only the responses report still needs raw events.
+            event_names = (SUBMIT_EVENT,)
+
+    raw_iter = iter_export_events(
+        cfg,
+        args,
+        event_names,
+        QUERY_PROPERTIES,
+        after=after,
+        before=before,
+        marks=marks,
+        checkpoint=checkpoint,
+    )
+    raw_iter = metrics.timed("fetch", raw_iter)
+
+    ok = False
+    try:
+        with metrics.phase("write"):
+            write_outputs(
+                args,
+                raw_iter,
+                raw_path=raw_path,
+                responses_path=responses_path,
+                locations_path=locations_path,
+                marks=marks,
+                location_counter=location_counter,
+            )
+        ok = True
+    except BaseException:
+        if checkpoint is not None:
+            print(
+                f"[posthog] export interrupted; fetched pages are kept in {checkpoint.directory} (re-run with --resume)",
+                file=sys.stderr,
+            )
+        raise
+    finally:
+        write_run_metrics(args, metrics_path, exporter="badge_survey", ok=ok)
+    if checkpoint is not None:
+        checkpoint.clear()
     return 0
 
 
@@ -0,0 +1,816 @@
+"""
+Offline stand-in for the PostHog events API, for exercising and benchmarking the exporters.
+
+Serves GET /api/projects/{id}/events/ with the same contract the exporters rely on:
+- `event`, `after` (inclusive), `before` (exclusive) and `limit` params, newest events first,
+- a `next` URL carrying every param plus the cursor, and `null` on the last page,
+- optional 429 (Retry-After, RateLimit-* quota headers) and 5xx injection, and per-request latency.
+
+Events are synthetic but shaped like the site's BADGE_EVENTS captures (see src/lib/badge/), with
+the usual PostHog `$` properties. They are derived from (seed, event name, index) on demand, so
+10M-event windows cost no memory and every run serves identical data.
+
+POST /api/projects/{id}/query/ runs HogQLQuery requests over the same events, for the subset of
+HogQL the exporters send (see HogQLQuery below): plain columns, properties.<name> (string-typed like
+HogQL's property access), JSONExtractRaw, countIf, WHERE with AND/OR/IN and comparisons, GROUP BY,
+ORDER BY, LIMIT and OFFSET. Anything else is answered 400, like a query PostHog rejects.
+
+GET /_mock/stats returns request/response counters.
+
+Usage:
+  python posthog/posthog_mock_server.py --events 1000000 --port 8765
+  python posthog/posthog_export_badge_interactions.py --host http://127.0.0.1:8765 --project-id 1 \\
+      --api-key phx_mock --after 2026-01-01 --before 2026-02-01
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import gzip
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from posthog_client import parse_iso8601, to_iso8601
+from posthog_export_badge_interactions import BADGE_EVENTS
+
+# Share of all events per name, roughly as the site produces them.
+EVENT_MIX: Dict[str, float] = {
+    "badge_hover": 0.50,
+    "badge_hover_duration": 0.35,
+    "badge_click": 0.08,
+    "badge_feedback_shown": 0.04,
+    "badge_feedback_dismissed": 0.02,
+    "badge_feedback_submitted": 0.01,
+}
+assert set(EVENT_MIX) == set(BADGE_EVENTS), "EVENT_MIX must cover BADGE_EVENTS"
+
+MOCK_START = "2026-01-01"
+MOCK_END = "2026-02-01"
+# Largest page the mock serves, whatever `limit` asks for.
+MOCK_MAX_LIMIT = 1000
+# One distinct user per this many events.
+EVENTS_PER_USER = 40
+
+PATHNAMES = (
+    "/",
+    "/map",
+    "/CoBenefits/cobenefit/AirQuality",
+    "/CoBenefits/cobenefit/Noise",
+    "/CoBenefits/cobenefit/PhysicalActivity",
+    "/CoBenefits/cobenefit/Congestion",
+    "/CoBenefits/nation/England",
+    "/CoBenefits/nation/Scotland",
+    "/CoBenefits/nation/Wales",
+    "/CoBenefits/location/E06000001",
+    "/CoBenefits/location/S12000036",
+    "/CoBenefits/location/W06000015",
+)
+# (id, label, type, intent)
+BADGES = (
+    ("air-quality", "Air quality", "info", "INFORMATION"),
+    ("noise", "Noise", "info", "INFORMATION"),
+    ("physical-activity", "Physical activity", "info", "INFORMATION"),
+    ("comparison-average", "Compared with the UK average", "comparison", "CONFIRMATION"),
+    ("data-caveat", "Modelled estimate", "caveat", "WARNING"),
+    ("aggregated", "Aggregated data", "info", "INFORMATION"),
+    ("alternative-units", "Alternative units", "info", "INFORMATION"),
+    ("small-areas", "Some elements too small to be shown", "caveat", "WARNING"),
+)
+BROWSERS = ("Chrome", "Safari", "Firefox", "Microsoft Edge")
+OSES = ("Windows", "Mac OS X", "iOS", "Android", "Linux")
+RATING_LABELS = ("Not useful", "Slightly useful", "Useful", "Very useful", "Extremely useful")
+COMMENTS = (None, None, None, "Helpful context", "Too many badges", "Could not find the source", "Nice!\nThanks")
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(x: int) -> int:
+    """
+    splitmix64 finaliser: a cheap, well-spread 64-bit hash of an integer.
+    """
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _us(dt: datetime) -> int:
+    return int(dt.timestamp()) * 1_000_000 + dt.microsecond
+
+
+def _uuid4(hi: int, lo: int) -> str:
+    """
+    Formats two 64-bit hashes as a version-4 UUID string.
+    """
+    return (
+        f"{hi >> 32:08x}-{(hi >> 16) & 0xFFFF:04x}-{0x4000 | (hi & 0x0FFF):04x}-"
+        f"{0x8000 | ((lo >> 48) & 0x3FFF):04x}-{lo & 0xFFFFFFFFFFFF:012x}"
+    )
+
+
+@functools.lru_cache(maxsize=4096)
+def _utc_date(day: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+
+
+def _utc_timestamp(ts_us: int) -> str:
+    sec, us = divmod(ts_us, 1_000_000)
+    day, s = divmod(sec, 86400)
+    h, s = divmod(s, 3600)
+    m, s = divmod(s, 60)
+    return f"{_utc_date(day)}T{h:02d}:{m:02d}:{s:02d}.{us:06d}+00:00"
+
+
+class SyntheticEvents:
+    """
+    `total` events over [start, end), split across the names by EVENT_MIX.
+
+    Within a name, event k sits at a hashed offset inside the k-th of M equal steps of the window,
+    so timestamps rise with k and a time bound maps to an index by binary search.
+    """
+
+    def __init__(self, total: int, *, start: str = MOCK_START, end: str = MOCK_END, seed: int = 1) -> None:
+        self.total = total
+        self.seed = seed
+        self.start_us = _us(parse_iso8601(to_iso8601(start)))
+        self.end_us = _us(parse_iso8601(to_iso8601(end)))
+        if self.end_us <= self.start_us:
+            raise ValueError("mock window end must be after its start")
+        self.span_us = self.end_us - self.start_us
+        self.names: Tuple[str, ...] = BADGE_EVENTS
+        self.counts: Dict[str, int] = {name: int(total * EVENT_MIX[name]) for name in self.names}
+        self.counts[self.names[0]] += total - sum(self.counts.values())
+        self.users = max(10, total // EVENTS_PER_USER)
+
+    def _hash(self, name: str, k: int, salt: int = 0) -> int:
+        return _mix((self.seed << 40) ^ (self.names.index(name) << 36) ^ (salt << 32) ^ k)
+
+    def ts_us(self, name: str, k: int) -> int:
+        frac = self._hash(name, k) & 0xFFFFFFFF
+        return self.start_us + (((k << 32) + frac) * self.span_us) // (self.counts[name] << 32)
+
+    def index_before(self, name: str, t_us: Optional[int]) -> int:
+        """
+        Number of `name` events with a timestamp before `t_us` (None: all of them).
+        """
+        m = self.counts[name]
+        if t_us is None:
+            return m
+        lo, hi = 0, m
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts_us(name, mid) < t_us:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @functools.lru_cache(maxsize=None)
+    def _client_props(self, pathname: str, browser: str, os_name: str) -> str:
+        mobile = os_name in ("iOS", "Android")
+        props = {
+            "$current_url": f"https://cobenefits.example.org{pathname}",
+            "$host": "cobenefits.example.org",
+            "$pathname": pathname,
+            "$browser": browser,
+            "$os": os_name,
+            "$device_type": "Mobile" if mobile else "Desktop",
+            "$screen_height": 844 if mobile else 1080,
+            "$screen_width": 390 if mobile else 1920,
+            "$lib": "web",
+            "$lib_version": "1.200.0",
+            "$referrer": "$direct",
+            "pathname": pathname,
+        }
+        return json.dumps(props, separators=(",", ":"))[1:-1]
+
+    @functools.lru_cache(maxsize=None)
+    def _badge_props(self, name: str, badge: int, render: str, mode: str) -> str:
+        badge_id, label, badge_type, intent = BADGES[badge]
+        props: Dict[str, Any] = {
+            "badge_id": badge_id,
+            "badge_label": label,
+            "badge_type": badge_type,
+            "badge_intent": intent,
+            "badge_render": render,
+            "badge_click_kind": None,
+        }
+        if name == "badge_click":
+            props["button"] = 0
+        else:
+            props["mode"] = mode
+        return json.dumps(props, separators=(",", ":"))[1:-1]
+
+    def _event_props(self, name: str, h: int) -> str:
+        if not name.startswith("badge_feedback"):
+            render = "mini" if (h >> 24) % 3 == 0 else "normal"
+            mode = "focus" if (h >> 28) % 10 == 0 else "mouse"
+            props = self._badge_props(name, (h >> 16) % len(BADGES), render, mode)
+            if name == "badge_hover_duration":
+                # Heavy-tailed dwell: mostly short glances, a few long reads.
+                dwell = int(80 * (1.0 / (1.0 - ((h >> 32) % 1000) / 1000.0)) ** 1.5)
+                ended_by = "destroy" if (h >> 44) % 20 == 0 else "leave"
+                props += f',"duration_ms":{dwell},"ended_by":"{ended_by}"'
+            return props
+        n = 3 + (h >> 24) % 4
+        picked = [BADGES[(h >> (28 + 3 * i)) % len(BADGES)] for i in range(n)]
+        extra: Dict[str, Any] = {
+            "interacted_badge_ids": [b[0] for b in picked],
+            "interacted_badge_count": n,
+            "threshold": 3,
+        }
+        if name != "badge_feedback_dismissed":
+            extra["interacted_badge_labels"] = [b[1] for b in picked]
+        if name == "badge_feedback_submitted":
+            rating = 1 + (h >> 48) % 5
+            extra.update(rating=rating, rating_label=RATING_LABELS[rating - 1], comment=COMMENTS[(h >> 52) % len(COMMENTS)])
+        return json.dumps(extra, separators=(",", ":"))[1:-1]
+
+    def event_json(self, name: str, k: int) -> str:
+        """
+        Event k of `name` as events-API JSON, rendered from cached fragments (the mock's hot path).
+        """
+        h = self._hash(name, k, 1)
+        h2 = self._hash(name, k, 2)
+        ts_us = self.ts_us(name, k)
+        sec, us = divmod(ts_us, 1_000_000)
+        user = h % self.users
+        session = _mix(user ^ (ts_us // 1_800_000_000))
+        client = self._client_props(
+            PATHNAMES[(h >> 8) % len(PATHNAMES)], BROWSERS[(user >> 3) % len(BROWSERS)], OSES[(user >> 5) % len(OSES)]
+        )
+        return (
+            f'{{"id":"{_uuid4(h, h2)}","distinct_id":"user-{user:08x}","properties":{{{client},'
+            f'"$session_id":"{_uuid4(session, user)}","$insert_id":"{h2:016x}","$time":{sec}.{us:06d},'
+            f'{self._event_props(name, h)}}},"event":"{name}",'
+            f'"timestamp":"{_utc_timestamp(ts_us)}",'
+            f'"person":null,"elements":[],"elements_chain":""}}'
+        )
+
+    def page(
+        self, name: Optional[str], after_us: Optional[int], before_us: Optional[int], cursor: List[int], limit: int
+    ) -> Tuple[List[str], Optional[List[int]]]:
+        """
+        Next `limit` events (as JSON), newest first. `cursor` counts the events already served per name
+        (one entry for a single-name query, one per name otherwise); returns the advanced cursor
+        or None when the window is exhausted.
+        """
+        names = (name,) if name else self.names
+        # Per name: index of the next (newest remaining) event and the lowest index in the window.
+        heads = []
+        for i, n in enumerate(names):
+            lo = self.index_before(n, after_us) if after_us is not None else 0
+            hi = self.index_before(n, before_us)
+            heads.append([hi - 1 - cursor[i], lo])
+        out: List[str] = []
+        while len(out) < limit:
+            best, best_ts = -1, -1
+            for i, (k, lo) in enumerate(heads):
+                if k >= lo:
+                    ts = self.ts_us(names[i], k)
+                    if ts > best_ts:
+                        best, best_ts = i, ts
+            if best < 0:
+                return out, None
+            out.append(self.event_json(names[best], heads[best][0]))
+            heads[best][0] -= 1
+            cursor[best] += 1
+        if all(k < lo for k, lo in heads):
+            return out, None
+        return out, cursor
+
+
+@dataclass
+class MockOptions:
+    latency_ms: float = 0.0
+    latency_per_1k_ms: float = 0.0
+    fail_429: float = 0.0
+    fail_5xx: float = 0.0
+    retry_after_s: int = 1
+    quota: int = 0
+    quota_window_s: float = 60.0
+    api_key: Optional[str] = None
+    gzip: bool = True
+
+
+@dataclass
+class MockStats:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    requests: int = 0
+    by_status: Dict[str, int] = field(default_factory=dict)
+    events: int = 0
+    bytes_sent: int = 0
+    quota_start: float = field(default_factory=time.monotonic)
+    quota_used: int = 0
+
+    def record(self, status: int, n_events: int, n_bytes: int) -> None:
+        with self.lock:
+            self.requests += 1
+            self.by_status[str(status)] = self.by_status.get(str(status), 0) + 1
+            self.events += n_events
+            self.bytes_sent += n_bytes
+
+    def to_json(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "by_status": dict(sorted(self.by_status.items())),
+                "events": self.events,
+                "bytes_sent": self.bytes_sent,
+            }
+
+
+_HOGQL_TOKEN = re.compile(
+    r"\s*(?:(?P<str>'(?:[^'\\]|\\.)*')|(?P<num>\d+)|(?P<op>>=|<=|!=|=|<|>|,|\(|\))|(?P<word>[A-Za-z_$][\w$.]*))"
+)
+_HOGQL_KEYWORDS = ("SELECT", "FROM", "WHERE", "GROUP", "ORDER", "BY", "LIMIT", "OFFSET", "AND", "OR", "IN", "DESC", "ASC")
+_HOGQL_OPS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def _hogql_unquote(token: str) -> str:
+    return re.sub(r"\\(.)", r"\1", token[1:-1])
+
+
+def _hogql_property(props: Dict[str, Any], key: str) -> Optional[str]:
+    """
+    properties.<key> as HogQL returns it: the value's JSON text with surrounding quotes stripped, NULL if unset.
+    """
+    if key not in props:
+        return None
+    raw = json.dumps(props[key], ensure_ascii=False, separators=(",", ":"))
+    return None if raw == "null" else re.sub(r'^"|"$', "", raw)
+
+
+def _hogql_datetime(ts_us: int) -> str:
+    # DRF renders UTC datetimes with a Z suffix.
+    return _utc_timestamp(ts_us)[: -len("+00:00")] + "Z"
+
+
+class HogQLQuery:
+    """
+    A parsed SELECT over the `events` table. Expressions are tuples: ("lit", v), ("col", name),
+    ("call", fn, args), ("cmp", op, a, b), ("in", a, values), ("and", a, b), ("or", a, b).
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.tokens: List[Tuple[str, str, int, int]] = []
+        pos = 0
+        while pos < len(text):
+            m = _HOGQL_TOKEN.match(text, pos)
+            if m is None or m.end() == pos:
+                if text[pos:].strip():
+                    raise ValueError(f"unsupported HogQL near {text[pos:pos + 20]!r}")
+                break
+            kind = m.lastgroup or ""
+            self.tokens.append((kind, m.group(kind), m.start(kind), m.end(kind)))
+            pos = m.end()
+        self.i = 0
+        self.expect("SELECT")
+        self.columns: List[Tuple[str, Any]] = []
+        while True:
+            start = self.peek()[2]
+            node = self.expr()
+            self.columns.append((text[start : self.tokens[self.i - 1][3]], node))
+            if not self.accept(","):
+                break
+        self.expect("FROM")
+        if self.next_value() != "events":
+            raise ValueError("only the events table is supported")
+        self.where = self.expr() if self.accept("WHERE") else None
+        self.group_by = None
+        if self.accept("GROUP"):
+            self.expect("BY")
+            self.group_by = self.expr()
+        self.order_by: List[Tuple[Any, bool]] = []
+        if self.accept("ORDER"):
+            self.expect("BY")
+            while True:
+                node = self.expr()
+                desc = self.accept("DESC")
+                if not desc:
+                    self.accept("ASC")
+                self.order_by.append((node, desc))
+                if not self.accept(","):
+                    break
+        self.limit = int(self.next_value()) if self.accept("LIMIT") else 100
+        self.offset = int(self.next_value()) if self.accept("OFFSET") else 0
+        if self.i != len(self.tokens):
+            raise ValueError(f"unexpected {self.peek()[1]!r}")
+
+    def peek(self) -> Tuple[str, str, int, int]:
+        return self.tokens[self.i] if self.i < len(self.tokens) else ("end", "", len(self.text), len(self.text))
+
+    def next_value(self) -> str:
+        value = self.peek()[1]
+        self.i += 1
+        return value
+
+    def accept(self, value: str) -> bool:
+        kind, v = self.peek()[:2]
+        if (kind == "word" and v.upper() == value) or (kind == "op" and v == value):
+            self.i += 1
+            return True
+        return False
+
+    def expect(self, value: str) -> None:
+        if not self.accept(value):
+            raise ValueError(f"expected {value}, got {self.peek()[1]!r}")
+
+    def expr(self) -> Any:
+        node = self.conjunction()
+        while self.accept("OR"):
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self) -> Any:
+        node = self.comparison()
+        while self.accept("AND"):
+            node = ("and", node, self.comparison())
+        return node
+
+    def comparison(self) -> Any:
+        node = self.primary()
+        kind, v = self.peek()[:2]
+        if kind == "op" and v in _HOGQL_OPS:
+            self.i += 1
+            return ("cmp", v, node, self.primary())
+        if self.accept("IN"):
+            self.expect("(")
+            values = [self.primary()]
+            while self.accept(","):
+                values.append(self.primary())
+            self.expect(")")
+            return ("in", node, values)
+        return node
+
+    def primary(self) -> Any:
+        kind, v = self.peek()[:2]
+        if self.accept("("):
+            node = self.expr()
+            self.expect(")")
+            return node
+        self.i += 1
+        if kind == "str":
+            return ("lit", _hogql_unquote(v))
+        if kind == "num":
+            return ("lit", int(v))
+        if kind != "word" or v.upper() in _HOGQL_KEYWORDS:
+            raise ValueError(f"unexpected {v!r}")
+        if self.accept("("):
+            args = [self.expr()]
+            while self.accept(","):
+                args.append(self.expr())
+            self.expect(")")
+            if v not in ("toDateTime", "toUUID", "JSONExtractRaw", "countIf"):
+                raise ValueError(f"unsupported function {v}")
+            return ("call", v, args)
+        if v not in ("uuid", "event", "timestamp", "distinct_id", "properties") and not v.startswith("properties."):
+            raise ValueError(f"unknown column {v}")
+        return ("col", v)
+
+    def eval(self, node: Any, row: Dict[str, Any]) -> Any:
+        op = node[0]
+        if op == "lit":
+            return node[1]
+        if op == "col":
+            name = node[1]
+            if name.startswith("properties."):
+                return _hogql_property(row["properties"], name[len("properties.") :])
+            return row[name]
+        if op == "call":
+            fn, args = node[1], node[2]
+            if fn == "toDateTime":
+                return _us(parse_iso8601(self.eval(args[0], row)))
+            if fn == "toUUID":
+                return self.eval(args[0], row)
+            if fn == "JSONExtractRaw":
+                props, key = args[0], self.eval(args[1], row)
+                if props != ("col", "properties"):
+                    raise ValueError("JSONExtractRaw only reads properties")
+                return json.dumps(row["properties"][key], ensure_ascii=False, separators=(",", ":")) if key in row["properties"] else ""
+            raise ValueError(f"{fn} is an aggregate")
+        if op == "cmp":
+            a, b = self.eval(node[2], row), self.eval(node[3], row)
+            return a is not None and b is not None and _HOGQL_OPS[node[1]](a, b)
+        if op == "in":
+            a = self.eval(node[1], row)
+            return a is not None and a in [self.eval(v, row) for v in node[2]]
+        if op == "and":
+            return bool(self.eval(node[1], row)) and bool(self.eval(node[2], row))
+        if op == "or":
+            return bool(self.eval(node[1], row)) or bool(self.eval(node[2], row))
+        raise ValueError(f"bad expression {node!r}")
+
+    def time_bounds(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        [after, before) in microseconds from the WHERE clause's top-level timestamp conditions, to narrow the scan.
+        """
+        after_us: Optional[int] = None
+        before_us: Optional[int] = None
+        todo = [self.where] if self.where is not None else []
+        while todo:
+            node = todo.pop()
+            if node[0] == "and":
+                todo.extend(node[1:])
+            elif node[0] == "cmp" and node[2] == ("col", "timestamp") and node[3][0] == "call":
+                t = self.eval(node[3], {})
+                if node[1] == ">=":
+                    after_us = t if after_us is None else max(after_us, t)
+                elif node[1] == "<":
+                    before_us = t if before_us is None else min(before_us, t)
+        return after_us, before_us
+
+    def run(self, events: "SyntheticEvents") -> List[List[Any]]:
+        after_us, before_us = self.time_bounds()
+        rows: List[Dict[str, Any]] = []
+        for name in events.names:
+            lo = events.index_before(name, after_us) if after_us is not None else 0
+            for k in range(lo, events.index_before(name, before_us)):
+                ev = json.loads(events.event_json(name, k))
+                row = {
+                    "uuid": ev["id"],
+                    "event": name,
+                    "timestamp": events.ts_us(name, k),
+                    "distinct_id": ev["distinct_id"],
+                    "properties": ev["properties"],
+                }
+                if self.where is None or self.eval(self.where, row):
+                    rows.append(row)
+        if self.group_by is not None:
+            groups: Dict[Any, List[Dict[str, Any]]] = {}
+            for row in rows:
+                groups.setdefault(self.eval(self.group_by, row), []).append(row)
+            items = [(members[0], members) for members in groups.values()]
+        else:
+            items = [(row, [row]) for row in rows]
+
+        def compare(x: Tuple[Dict[str, Any], Any], y: Tuple[Dict[str, Any], Any]) -> int:
+            for node, desc in self.order_by:
+                a, b = self.eval(node, x[0]), self.eval(node, y[0])
+                if a == b:
+                    continue
+                if a is None or b is None:
+                    return 1 if a is None else -1  # NULLS LAST either way
+                return (-1 if a < b else 1) * (-1 if desc else 1)
+            return 0
+
+        items.sort(key=functools.cmp_to_key(compare))
+        out = []
+        for first, members in items[self.offset : self.offset + self.limit]:
+            values = []
+            for _text, node in self.columns:
+                if node[0] == "call" and node[1] == "countIf":
+                    values.append(sum(1 for row in members if self.eval(node[2][0], row)))
+                elif node == ("col", "timestamp"):
+                    values.append(_hogql_datetime(first["timestamp"]))
+                else:
+                    values.append(self.eval(node, first))
+            out.append(values)
+        return out
+
+
+_EVENTS_PATH = re.compile(r"^/api/projects/[^/]+/events/?$")
+_QUERY_PATH = re.compile(r"^/api/projects/[^/]+/query/?$")
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        self._send_raw(status, json.dumps(body, separators=(",", ":")).encode("utf-8"), headers)
+
+    def _send_raw(self, status: int, data: bytes, headers: Optional[Dict[str, str]] = None, n_events: int = 0) -> None:
+        gzipped = self.server.options.gzip and "gzip" in (self.headers.get("Accept-Encoding") or "")
+        if gzipped:
+            data = gzip.compress(data, compresslevel=1)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.stats.record(status, n_events, len(data))
+
+    def _quota_headers(self) -> Tuple[bool, Dict[str, str]]:
+        opts, stats = self.server.options, self.server.stats
+        if not opts.quota:
+            return True, {}
+        with stats.lock:
+            now = time.monotonic()
+            if now - stats.quota_start >= opts.quota_window_s:
+                stats.quota_start, stats.quota_used = now, 0
+            stats.quota_used += 1
+            remaining = opts.quota - stats.quota_used
+            reset = max(0.0, opts.quota_window_s - (now - stats.quota_start))
+        headers = {
+            "RateLimit-Limit": f"{opts.quota};w={int(opts.quota_window_s)}",
+            "RateLimit-Remaining": str(max(remaining, 0)),
+            "RateLimit-Reset": str(int(reset + 0.999)),
+        }
+        if remaining < 0:
+            headers["Retry-After"] = str(int(reset + 0.999))
+            return False, headers
+        return True, headers
+
+    def _admit(self, limit: int) -> Optional[Dict[str, str]]:
+        """
+        Applies the added latency, quota and injected failures to a request. Returns the quota headers
+        for the response, or None once an error has been sent.
+        """
+        opts = self.server.options
+        delay_s = (opts.latency_ms + opts.latency_per_1k_ms * limit / 1000.0) / 1000.0
+        if delay_s > 0:
+            time.sleep(delay_s * random.uniform(0.5, 1.5))
+        ok, quota_headers = self._quota_headers()
+        if not ok:
+            self._send(429, {"type": "throttled_error", "detail": "Request was throttled."}, quota_headers)
+            return None
+        roll = random.random()
+        if roll < opts.fail_429:
+            headers = {**quota_headers, "Retry-After": str(opts.retry_after_s)}
+            self._send(429, {"type": "throttled_error", "detail": "Request was throttled."}, headers)
+            return None
+        if roll < opts.fail_429 + opts.fail_5xx:
+            self._send(random.choice((500, 502, 503, 504)), {"detail": "Injected server error."}, quota_headers)
+            return None
+        return quota_headers
+
+    def _authorized(self) -> bool:
+        opts = self.server.options
+        if opts.api_key and self.headers.get("Authorization") != f"Bearer {opts.api_key}":
+            self._send(401, {"type": "authentication_error", "detail": "Invalid personal API key."})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        if parts.path == "/_mock/stats":
+            body = self.server.stats.to_json()
+            body["total_events"] = self.server.events.total
+            return self._send(200, body)
+        if not _EVENTS_PATH.match(parts.path):
+            return self._send(404, {"detail": "Not found."})
+        if not self._authorized():
+            return
+
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        try:
+            limit = max(1, min(MOCK_MAX_LIMIT, int(params.get("limit") or 100)))
+            after_us = _us(parse_iso8601(params["after"])) if params.get("after") else None
+            before_us = _us(parse_iso8601(params["before"])) if params.get("before") else None
+            name = params.get("event") or None
+            n_cursors = 1 if name else len(self.server.events.names)
+            cursor = [int(v) for v in params["cursor"].split(",")] if params.get("cursor") else [0] * n_cursors
+            if len(cursor) != n_cursors:
+                raise ValueError("cursor does not match the query")
+        except (KeyError, ValueError) as e:
+            return self._send(400, {"type": "validation_error", "detail": str(e)})
+
+        quota_headers = self._admit(limit)
+        if quota_headers is None:
+            return
+        if name is not None and name not in self.server.events.counts:
+            return self._send(200, {"next": None, "results": []}, quota_headers)
+        results, next_cursor = self.server.events.page(name, after_us, before_us, cursor, limit)
+        next_url = None
+        if next_cursor is not None:
+            next_params = {**params, "cursor": ",".join(map(str, next_cursor))}
+            next_url = f"http://{self.headers.get('Host')}{parts.path}?{urlencode(next_params)}"
+        body = f'{{"next":{json.dumps(next_url)},"results":[{",".join(results)}]}}'
+        self._send_raw(200, body.encode("utf-8"), quota_headers, n_events=len(results))
+
+    def do_POST(self) -> None:
+        n = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(n) if n else b""
+        if not _QUERY_PATH.match(urlsplit(self.path).path):
+            return self._send(404, {"detail": "Not found."})
+        if not self._authorized():
+            return
+        try:
+            body = json.loads(data or b"{}")
+            if body["query"].get("kind") != "HogQLQuery":
+                raise ValueError("only HogQLQuery is supported")
+            query = HogQLQuery(body["query"]["query"])
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            return self._send(400, {"type": "validation_error", "detail": str(e)})
+
+        quota_headers = self._admit(query.limit)
+        if quota_headers is None:
+            return
+        try:
+            results = query.run(self.server.events)
+        except (TypeError, ValueError) as e:
+            return self._send(400, {"type": "validation_error", "detail": str(e)})
+        out = {"columns": [text for text, _node in query.columns], "results": results}
+        data = json.dumps(out, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._send_raw(200, data, quota_headers, n_events=len(results))
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], events: SyntheticEvents, options: MockOptions) -> None:
+        super().__init__(address, MockHandler)
+        self.events = events
+        self.options = options
+        self.stats = MockStats()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve_in_thread(events: SyntheticEvents, options: Optional[MockOptions] = None, *, port: int = 0) -> MockServer:
+    """
+    Starts a mock server on 127.0.0.1 (a free port by default) in a daemon thread; call shutdown() to stop it.
+    """
+    server = MockServer(("127.0.0.1", port), events, options or MockOptions())
+    threading.Thread(target=server.serve_forever, name="posthog-mock", daemon=True).start()
+    return server
+
+
+def parse_count(value: str) -> int:
+    """
+    Accepts plain integers and k/m suffixes (10k, 1m, 2.5m).
+    """
+    v = value.strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(v[-1:], 1)
+    if scale > 1:
+        v = v[:-1]
+    return int(float(v) * scale)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Serve synthetic badge events over a mock PostHog events API.")
+    p.add_argument("--port", type=int, default=8765, help="Port on 127.0.0.1 (0 picks a free one; default: 8765).")
+    p.add_argument("--events", type=parse_count, default=10_000, help="Events in the window, e.g. 10k, 1m (default: 10k).")
+    p.add_argument("--start", default=MOCK_START, help=f"Window start (default: {MOCK_START}).")
+    p.add_argument("--end", default=MOCK_END, help=f"Window end, exclusive (default: {MOCK_END}).")
+    p.add_argument("--seed", type=int, default=1, help="Seed for the synthetic data and injected failures (default: 1).")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Mean added latency per request (default: 0).")
+    p.add_argument(
+        "--latency-per-1k-ms", type=float, default=0.0, help="Extra mean latency per 1000 events of page size (default: 0)."
+    )
+    p.add_argument("--fail-429", type=float, default=0.0, help="Fraction of requests answered 429 (default: 0).")
+    p.add_argument("--fail-5xx", type=float, default=0.0, help="Fraction of requests answered 500/502/503/504 (default: 0).")
+    p.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s (default: 1).")
+    p.add_argument("--quota", type=int, default=0, help="Requests allowed per quota window, with RateLimit-* headers (default: off).")
+    p.add_argument("--quota-window", type=float, default=60.0, help="Quota window in seconds (default: 60).")
+    p.add_argument("--api-key", default=None, help="Require this personal API key (default: accept any).")
+    p.add_argument("--no-gzip", action="store_true", help="Never gzip responses.")
+    args = p.parse_args(argv)
+
+    random.seed(args.seed)
+    events = SyntheticEvents(args.events, start=args.start, end=args.end, seed=args.seed)
+    options = MockOptions(
+        latency_ms=args.latency_ms,
+        latency_per_1k_ms=args.latency_per_1k_ms,
+        fail_429=args.fail_429,
+        fail_5xx=args.fail_5xx,
+        retry_after_s=args.retry_after,
+        quota=args.quota,
+        quota_window_s=args.quota_window,
+        api_key=args.api_key,
+        gzip=not args.no_gzip,
+    )
+    server = MockServer(("127.0.0.1", args.port), events, options)
+    print(f"[mock] serving {events.total} events ({args.start} .. {args.end}) at {server.url}", file=sys.stderr)
+    # The URL alone on stdout lets a parent process (posthog_benchmark.py) find a --port 0 server.
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
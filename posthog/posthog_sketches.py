@@ -0,0 +1,194 @@
+"""
+Mergeable sketches for summarising very large export windows without keeping the events.
+
+- HyperLogLog: approximate distinct counts (~1.6% standard error at the default precision).
+- QuantileSketch: relative-error quantiles (DDSketch-style log buckets, 1% by default).
+
+Both merge losslessly (merge(a, b) equals a sketch fed both inputs) and serialise to small JSON
+objects, so per-day sketches can be cached on disk and combined for any date range.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import math
+from typing import Any, Dict, Iterable, Optional
+
+HLL_PRECISION = 12
+QUANTILE_ACCURACY = 0.01
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _bytewise_max(a: bytes, b: bytes) -> bytearray:
+    """
+    Element-wise max of two equal-length byte strings whose values are all below 0x80, done on
+    whole-buffer integers (SWAR) instead of byte by byte.
+    """
+    n = len(a)
+    high = int.from_bytes(b"\x80" * n, "little")
+    x, y = int.from_bytes(a, "little"), int.from_bytes(b, "little")
+    # Per byte, 0x80 + x - y keeps its high bit iff x >= y and never borrows from the next byte.
+    ge = (((x | high) - y) & high) >> 7
+    mask = ge * 0xFF
+    return bytearray(((x & mask) | (y & ~mask)).to_bytes(n, "little"))
+
+
+class HyperLogLog:
+    """
+    HyperLogLog with 2**p one-byte registers.
+
+    Registers stay in a sparse {index: rank} dict until a quarter of them are set, which keeps
+    per-day sketches of a few hundred users small on disk and cheap to merge.
+    """
+
+    def __init__(self, p: int = HLL_PRECISION) -> None:
+        if not 4 <= p <= 16:
+            raise ValueError(f"HyperLogLog precision must be in 4..16, got {p}")
+        self.p = p
+        self.m = 1 << p
+        self._sparse: Optional[Dict[int, int]] = {}
+        self._dense: Optional[bytearray] = None
+
+    def _set(self, idx: int, rank: int) -> None:
+        if self._dense is not None:
+            if rank > self._dense[idx]:
+                self._dense[idx] = rank
+            return
+        assert self._sparse is not None
+        if rank > self._sparse.get(idx, 0):
+            self._sparse[idx] = rank
+            if len(self._sparse) > self.m // 4:
+                self._densify()
+
+    def _densify(self) -> None:
+        assert self._sparse is not None
+        dense = bytearray(self.m)
+        for idx, rank in self._sparse.items():
+            dense[idx] = rank
+        self._dense, self._sparse = dense, None
+
+    def add(self, value: str) -> None:
+        h = _hash64(value)
+        bits = 64 - self.p
+        w = h & ((1 << bits) - 1)
+        self._set(h >> bits, bits - w.bit_length() + 1)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError(f"cannot merge HyperLogLog sketches of precision {self.p} and {other.p}")
+        if other._dense is not None:
+            if self._dense is None:
+                self._densify()
+            assert self._dense is not None
+            self._dense = _bytewise_max(self._dense, other._dense)
+        else:
+            assert other._sparse is not None
+            for idx, rank in other._sparse.items():
+                self._set(idx, rank)
+
+    def estimate(self) -> int:
+        m = self.m
+        if self._dense is not None:
+            registers: Iterable[int] = self._dense
+            zeros = self._dense.count(0)
+        else:
+            assert self._sparse is not None
+            registers = self._sparse.values()
+            zeros = m - len(self._sparse)
+        harmonic = zeros + sum(2.0**-r for r in registers if r)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        e = alpha * m * m / harmonic
+        if e <= 2.5 * m and zeros:
+            # Small-range correction (linear counting).
+            e = m * math.log(m / zeros)
+        return int(round(e))
+
+    def to_json(self) -> Dict[str, Any]:
+        if self._dense is not None:
+            return {"p": self.p, "dense": base64.b64encode(bytes(self._dense)).decode("ascii")}
+        assert self._sparse is not None
+        packed = b"".join(idx.to_bytes(2, "big") + bytes((rank,)) for idx, rank in sorted(self._sparse.items()))
+        return {"p": self.p, "sparse": base64.b64encode(packed).decode("ascii")}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        hll = cls(int(data["p"]))
+        if "dense" in data:
+            dense = bytearray(base64.b64decode(data["dense"]))
+            if len(dense) != hll.m:
+                raise ValueError("HyperLogLog register count does not match its precision")
+            hll._dense, hll._sparse = dense, None
+        else:
+            packed = base64.b64decode(data.get("sparse") or "")
+            hll._sparse = {int.from_bytes(packed[i : i + 2], "big"): packed[i + 2] for i in range(0, len(packed), 3)}
+        return hll
+
+
+class QuantileSketch:
+    """
+    Quantiles of non-negative values with bounded relative error (DDSketch-style).
+
+    Each value goes into the log-spaced bucket ceil(log_gamma(x)); any quantile is then within
+    `accuracy` of the true value. Buckets are plain counts, so merging is exact.
+    """
+
+    def __init__(self, accuracy: float = QUANTILE_ACCURACY) -> None:
+        if not 0 < accuracy < 1:
+            raise ValueError(f"QuantileSketch accuracy must be in (0, 1), got {accuracy}")
+        self.accuracy = accuracy
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.count = 0
+        self.zeros = 0
+        self.bins: Dict[int, int] = {}
+
+    def add(self, value: float) -> None:
+        if value < 0:
+            raise ValueError(f"QuantileSketch only takes non-negative values, got {value}")
+        self.count += 1
+        if value == 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.accuracy != self.accuracy:
+            raise ValueError(f"cannot merge QuantileSketch of accuracy {self.accuracy} and {other.accuracy}")
+        self.count += other.count
+        self.zeros += other.zeros
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return 2 * self._gamma**key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.bins) / (self._gamma + 1)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "accuracy": self.accuracy,
+            "count": self.count,
+            "zeros": self.zeros,
+            "bins": {str(k): n for k, n in sorted(self.bins.items())},
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(float(data["accuracy"]))
+        sketch.count = int(data["count"])
+        sketch.zeros = int(data["zeros"])
+        sketch.bins = {int(k): int(n) for k, n in (data.get("bins") or {}).items()}
+        return sketch
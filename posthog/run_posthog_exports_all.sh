@@ -1,10 +1,12 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-# Run the PostHog survey (user rating) export with sensible defaults.
+# Run the PostHog survey (user rating) and badge interaction exports with sensible defaults.
+# Both reports come from a single fetch (posthog_export_all.py).
 #
 # Default outputs:
 # - posthog/exports/badge_survey_*.csv
+# - posthog/exports/badge_interactions_*.csv
 #
 # Default time window:
 # - from 30 days ago (UTC date) until now
@@ -14,18 +16,31 @@ POSTHOG_EXPORT_AFTER=2026-01-24
 # - POSTHOG_EXPORT_BEFORE=YYYY-MM-DD
 # - POSTHOG_EXPORT_OUTDIR=posthog/exports
 # - POSTHOG_EXPORT_VERBOSE=1
+# - POSTHOG_EXPORT_CONCURRENCY=1 (event names paged in parallel)
+# - POSTHOG_EXPORT_TIME_SLICES=1 (sub-windows per event name, paged in parallel; with the cache, per uncached run of days)
+# - POSTHOG_EXPORT_CACHE=1 (serve closed days from the per-day raw event cache under <outdir>/.cache)
+# - POSTHOG_EXPORT_INCREMENTAL=1 (only fetch events newer than the last run; stable filenames)
+# - POSTHOG_EXPORT_HOVER_REPORT=1 (also write sessionised hover analytics)
+# - POSTHOG_EXPORT_TRANSPORT=sync (or async: httpx, streams multiplexed over HTTP/2; needs httpx[http2])
+# - POSTHOG_EXPORT_PROMETHEUS_DIR=/path (also write run metrics for node_exporter's textfile collector)
 
 repo_root="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
 posthog_dir="${repo_root}/posthog"
 venv_dir="${posthog_dir}/.venv-posthog-export"
 env_file="${posthog_dir}/posthog.env"
-py_script_survey="${posthog_dir}/posthog_export_survey.py"
-py_script_badges="${posthog_dir}/posthog_export_badge_interactions.py"
+py_script_all="${posthog_dir}/posthog_export_all.py"
 py_bin="${venv_dir}/bin/python"
 
 outdir="${POSTHOG_EXPORT_OUTDIR:-posthog/exports}"
 format="csv"
 verbose="${POSTHOG_EXPORT_VERBOSE:-1}"
+concurrency="${POSTHOG_EXPORT_CONCURRENCY:-1}"
+time_slices="${POSTHOG_EXPORT_TIME_SLICES:-1}"
+incremental="${POSTHOG_EXPORT_INCREMENTAL:-0}"
+hover_report="${POSTHOG_EXPORT_HOVER_REPORT:-0}"
+cache="${POSTHOG_EXPORT_CACHE:-0}"
+transport="${POSTHOG_EXPORT_TRANSPORT:-sync}"
+prometheus_dir="${POSTHOG_EXPORT_PROMETHEUS_DIR:-}"
 stamp="${POSTHOG_EXPORT_STAMP:-$(date -u +%Y%m%dT%H%M%SZ)}"
 
 # macOS-compatible "30 days ago" (UTC). If it fails, fall back to 2026-01-01.
@@ -81,26 +96,30 @@ echo "[posthog] exporting with after=${after} before=${before:-<none>} outdir=${
 echo "[posthog] run stamp: ${stamp}" >&2
 
 declare -a common_args
-common_args=(--after "${after}" --outdir "${outdir}" --format "${format}")
+common_args=(--after "${after}" --outdir "${outdir}" --format "${format}" --concurrency "${concurrency}" --time-slices "${time_slices}" --transport "${transport}")
 if [[ "${verbose}" == "1" ]]; then
   common_args+=(--verbose)
 fi
+if [[ "${incremental}" == "1" ]]; then
+  common_args+=(--incremental)
+fi
+if [[ "${hover_report}" == "1" ]]; then
+  common_args+=(--hover-report)
+fi
+if [[ "${cache}" == "1" ]]; then
+  common_args+=(--cache)
+fi
+
+if [[ -n "${before}" ]]; then
+  common_args+=(--before "${before}")
+fi
+if [[ -n "${prometheus_dir}" ]]; then
+  common_args+=(--prometheus-dir "${prometheus_dir}")
+fi
 
-declare -a scripts
-scripts=("${py_script_survey}" "${py_script_badges}")
-
-for script in "${scripts[@]}"; do
-  if [[ ! -f "${script}" ]]; then
-    echo "[posthog] skipping missing script: ${script}" >&2
-    continue
-  fi
-  echo "[posthog] running $(basename "${script}")" >&2
-  if [[ -n "${before}" ]]; then
-    POSTHOG_EXPORT_STAMP="${stamp}" "${py_bin}" "${script}" "${common_args[@]}" --before "${before}"
-  else
-    POSTHOG_EXPORT_STAMP="${stamp}" "${py_bin}" "${script}" "${common_args[@]}"
-  fi
-done
+# One fetch of the union of survey + badge events feeds every report.
+echo "[posthog] running $(basename "${py_script_all}")" >&2
+POSTHOG_EXPORT_STAMP="${stamp}" "${py_bin}" "${py_script_all}" "${common_args[@]}"
 
 echo "[posthog] all exports complete" >&2
 echo "[posthog] outputs written under: ${outdir}" >&2